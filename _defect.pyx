@@ -12,6 +12,12 @@
 from libcpp.vector cimport vector
 from libcpp.utility cimport pair
 from cython.operator cimport dereference as deref, preincrement as inc
+from cpython.pythread cimport (
+    PyThread_type_lock, PyThread_allocate_lock, PyThread_free_lock,
+    PyThread_acquire_lock, PyThread_release_lock, WAIT_LOCK,
+)
+
+import numpy as np
 
 # Q: Why are you declaring meaningful names like `column_t` and `identity_t` and then not using them?
 # A: They're just here for you, the reader.  I had every intention of using them, but as it turns
@@ -41,43 +47,191 @@ ctypedef unsigned uint
 ctypedef unsigned column_t
 ctypedef size_t   identity_t
 
-cdef extern from "defect/ext/xorbasis.h":
-    cdef cppclass _XorBasisBuilder:
-        _XorBasisBuilder()
+# Rows may also be given in CSR form as NumPy arrays, to avoid building a Python list per row:
+#  row ``i`` is ``columns[offsets[i]:offsets[i+1]]``, where ``columns`` has dtype ``np.uintc``
+#  and ``offsets`` has dtype ``np.intp``.  Identities are returned as arrays of ``np.uintp``.
+cdef vector[vector[uint]] _csr_rows(const uint[::1] columns, const Py_ssize_t[::1] offsets) except *:
+    cdef Py_ssize_t n = offsets.shape[0] - 1
+    cdef Py_ssize_t i
+    cdef vector[vector[uint]] rows
+    if n < 0:
+        raise ValueError('offsets must have at least one element')
+    if offsets[0] != 0 or offsets[n] != columns.shape[0]:
+        raise ValueError('offsets must start at 0 and end at len(columns)')
+    for i in range(n):
+        if offsets[i] > offsets[i+1]:
+            raise ValueError('offsets must be nondecreasing')
+
+    rows.resize(n)
+    for i in range(n):
+        if offsets[i] < offsets[i+1]:
+            rows[i].assign(&columns[offsets[i]], &columns[0] + offsets[i+1])
+    return rows
+
+cdef _id_array(const vector[size_t] & ids):
+    out = np.empty((ids.size(),), dtype=np.uintp)
+    cdef size_t[::1] view = out
+    cdef size_t i
+    for i in range(ids.size()):
+        view[i] = ids[i]
+    return out
+
+cdef extern from "defect/ext/xorbasis.h" nogil:
+    cdef cppclass XorBasisEngine:
+        XorBasisEngine* clone()
         size_t add(vector[uint])
         vector[size_t] add_many(vector[vector[uint]])
         pair[bint,size_t] add_if_linearly_independent(vector[uint])
         vector[vector[size_t]] get_zero_sums()
 #        void remove_from_each_zero_sum(vector[size_t])
         void remove_ids(vector[size_t])
+        vector[vector[uint]] get_row_columns()
+        vector[vector[size_t]] get_aug_identities()
+        vector[pair[size_t,vector[uint]]] get_original_rows()
+        size_t get_next_identity()
+        void set_state(vector[vector[uint]], vector[vector[size_t]], vector[pair[size_t,vector[uint]]], size_t) except +
 #        void remove_linearly_dependent_ids()
 #        bint has_linearly_dependent_rows()
 
+    cdef cppclass _XorBasisBuilder(XorBasisEngine):
+        _XorBasisBuilder()
+
+    cdef cppclass _PackedXorBasisBuilder(XorBasisEngine):
+        _PackedXorBasisBuilder()
+
 
 cdef class XorBasisBuilder:
-    cdef _XorBasisBuilder *thisptr
+    # The GIL is released around all work on the matrix.  Each instance has its own lock,
+    #  which is only ever acquired after releasing the GIL, so that a thread waiting on
+    #  one builder never stops the interpreter.
+    cdef XorBasisEngine *thisptr
+    cdef PyThread_type_lock lock
 
     def __cinit__(self):
         self.thisptr = new _XorBasisBuilder()
+        self.lock = PyThread_allocate_lock()
+        if self.lock == NULL:
+            raise MemoryError()
 
     def __dealloc__(self):
         del self.thisptr
+        if self.lock != NULL:
+            PyThread_free_lock(self.lock)
+
+    def copy(self):
+        ''' Get an independent copy of the basis. '''
+        cdef XorBasisBuilder result = type(self)()
+        cdef XorBasisEngine *ptr
+        with nogil:
+            PyThread_acquire_lock(self.lock, WAIT_LOCK)
+            ptr = self.thisptr.clone()
+            PyThread_release_lock(self.lock)
+        del result.thisptr
+        result.thisptr = ptr
+        return result
+
+    # Pickling support.  The state is the complete contents of the underlying matrix,
+    #  so that a restored builder continues exactly where this one left off.
+    def __getstate__(self):
+        cdef vector[vector[uint]] rows
+        cdef vector[vector[size_t]] augs
+        cdef vector[pair[size_t,vector[uint]]] originals
+        cdef size_t next_identity
+        with nogil:
+            PyThread_acquire_lock(self.lock, WAIT_LOCK)
+            rows = self.thisptr.get_row_columns()
+            augs = self.thisptr.get_aug_identities()
+            originals = self.thisptr.get_original_rows()
+            next_identity = self.thisptr.get_next_identity()
+            PyThread_release_lock(self.lock)
+        return {
+            'rows': rows,
+            'augs': augs,
+            'originals': originals,
+            'next_identity': next_identity,
+        }
+
+    def __setstate__(self, state):
+        cdef vector[vector[uint]] rows = [list(x) for x in state['rows']]
+        cdef vector[vector[size_t]] augs = [list(x) for x in state['augs']]
+        cdef vector[pair[size_t,vector[uint]]] originals = [(i, list(x)) for (i, x) in state['originals']]
+        cdef size_t next_identity = state['next_identity']
+        with nogil:
+            PyThread_acquire_lock(self.lock, WAIT_LOCK)
+            try:
+                self.thisptr.set_state(rows, augs, originals, next_identity)
+            finally:
+                PyThread_release_lock(self.lock)
+
+    def __reduce__(self):
+        return (type(self), (), self.__getstate__())
 
     def add(self, row):
         cdef vector[uint] vec = list(row)
-        return self.thisptr.add(vec)
+        cdef size_t id
+        with nogil:
+            PyThread_acquire_lock(self.lock, WAIT_LOCK)
+            id = self.thisptr.add(vec)
+            PyThread_release_lock(self.lock)
+        return id
 
     def add_many(self, it):
         cdef vector[vector[uint]] vec = list(list(x) for x in it)
-        return self.thisptr.add_many(vec)
+        cdef vector[size_t] ids
+        with nogil:
+            PyThread_acquire_lock(self.lock, WAIT_LOCK)
+            ids = self.thisptr.add_many(vec)
+            PyThread_release_lock(self.lock)
+        return ids
+
+    def add_many_csr(self, columns, offsets):
+        ''' ``add_many`` for rows in CSR form.  Returns an array of identities. '''
+        cdef vector[vector[uint]] rows = _csr_rows(columns, offsets)
+        cdef vector[size_t] ids
+        with nogil:
+            PyThread_acquire_lock(self.lock, WAIT_LOCK)
+            ids = self.thisptr.add_many(rows)
+            PyThread_release_lock(self.lock)
+        return _id_array(ids)
 
     def add_if_linearly_independent(self, row):
         cdef vector[uint] vec = list(row)
-        cdef pair[bint,size_t] p = self.thisptr.add_if_linearly_independent(vec)
+        cdef pair[bint,size_t] p
+        with nogil:
+            PyThread_acquire_lock(self.lock, WAIT_LOCK)
+            p = self.thisptr.add_if_linearly_independent(vec)
+            PyThread_release_lock(self.lock)
         return (bool(p.first), p.second)
 
+    def add_if_linearly_independent_csr(self, columns, offsets):
+        '''
+        ``add_if_linearly_independent`` for each row in CSR form, in order.
+
+        Returns a boolean array of successes and an array of identities (which, as usual,
+        are only meaningful where successful).
+        '''
+        cdef vector[vector[uint]] rows = _csr_rows(columns, offsets)
+        cdef vector[size_t] ids
+        cdef pair[bint,size_t] p
+        cdef size_t i
+        success = np.zeros((rows.size(),), dtype=np.uint8)
+        cdef unsigned char[::1] view = success
+        with nogil:
+            PyThread_acquire_lock(self.lock, WAIT_LOCK)
+            for i in range(rows.size()):
+                p = self.thisptr.add_if_linearly_independent(rows[i])
+                view[i] = p.first
+                ids.push_back(p.second)
+            PyThread_release_lock(self.lock)
+        return success.view(bool), _id_array(ids)
+
     def get_zero_sums(self):
-        return self.thisptr.get_zero_sums()
+        cdef vector[vector[size_t]] sums
+        with nogil:
+            PyThread_acquire_lock(self.lock, WAIT_LOCK)
+            sums = self.thisptr.get_zero_sums()
+            PyThread_release_lock(self.lock)
+        return sums
 
 #    def remove_from_each_zero_sum(self, ids):
 #        cdef vector[size_t] vec = list(ids)
@@ -88,7 +242,24 @@ cdef class XorBasisBuilder:
 
     def remove_ids(self, it):
         cdef vector[size_t] ids = list(it)
-        self.thisptr.remove_ids(ids)
+        with nogil:
+            PyThread_acquire_lock(self.lock, WAIT_LOCK)
+            self.thisptr.remove_ids(ids)
+            PyThread_release_lock(self.lock)
 
 #    def remove_linearly_dependent_ids(self):
 #        self.thisptr.remove_linearly_dependent_ids()
+
+
+cdef class PackedXorBasisBuilder(XorBasisBuilder):
+    '''
+    Identical to XorBasisBuilder, but stores the matrix as bit-packed rows.
+
+    This is considerably faster when the number of columns is modest (the cost of adding
+    two rows scales with the width of the matrix rather than with the number of ones),
+    but rows take memory in proportion to the span of their columns.
+    The two produce identical states from identical operations.
+    '''
+    def __cinit__(self):
+        del self.thisptr
+        self.thisptr = new _PackedXorBasisBuilder()
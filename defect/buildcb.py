@@ -5,7 +5,8 @@
 
 import sys
 
-from defect.graph.cyclebasis.builder import CycleBasisBuilder
+from defect.graph.cyclebasis.builder import CycleBasisBuilder, choose_engine
+import defect.graph.path as vpath
 
 __all__ = [
 	'main',
@@ -16,6 +17,7 @@ __all__ = [
 ]
 
 THOROUGH_DEFAULT = False
+BLOCK_SIZE_DEFAULT = 1000
 
 STAGE_PROVIDED = 10
 STAGE_FALLBACK = 20
@@ -37,11 +39,16 @@ def main(argv):
 #            If True, continue checking, and produce an error if more than len(fallback) cycles are found.
 #            (this may indicate a poorly-generated fallback cyclebasis, or the presence of nonexistent
 #             vertices/edges in the suggested cycles)
-def build_cyclebasis(cycles, fallback, thorough=THOROUGH_DEFAULT, progress_callback=lambda d:None):
+#
+# block_size - Number of cycles handed to the basis at a time.  Cycles are still accepted greedily
+#              in order, so this does not affect the result; but progress is only reported once per
+#              block.  (when thorough=False, blocks never hold more cycles than are still needed)
+def build_cyclebasis(cycles, fallback, thorough=THOROUGH_DEFAULT, progress_callback=lambda d:None,
+		block_size=BLOCK_SIZE_DEFAULT):
 	cycles = list(cycles)
 	fallback = list(fallback)
 
-	cbbuilder = CycleBasisBuilder()
+	cbbuilder = CycleBasisBuilder(engine=choose_engine(len(fallback), _count_edges(fallback)))
 
 	def emit_progress(*, stage_id, stage_length, stage_current):
 		progress_callback({
@@ -58,25 +65,34 @@ def build_cyclebasis(cycles, fallback, thorough=THOROUGH_DEFAULT, progress_callb
 			stage_length = len(lst),
 			stage_current = 0,
 		)
-		for i,cycle in enumerate(lst):
-
-			if cycle[0] != cycle[-1]:
-				cycle.append(cycle[0])
+		start = 0
+		while start < len(lst):
+			size = block_size
+			if not thorough:
+				# (a block this small cannot overshoot, so we stop exactly where checking
+				#  one cycle at a time would)
+				size = min(size, len(fallback) - len(cbbuilder.cycles))
+				if size <= 0:
+					break
+
+			block = lst[start:start+size]
+			start += len(block)
+
+			for cycle in block:
+				if cycle[0] != cycle[-1]:
+					cycle.append(cycle[0])
 
 			# Behold: The single line in this script which actually does anything
-			cbbuilder.add_if_independent(cycle)
+			cbbuilder.add_if_independent_many(block)
 
-			# this is done after checking the cycle and before exiting the loop so that
+			# this is done after checking the cycles and before exiting the loop so that
 			#  the last iteration looks like 30000/30000 (as opposed to 29999/30000)
 			emit_progress(
 				stage_id = stage,
 				stage_length = len(lst),
-				stage_current = i+1,
+				stage_current = start,
 			)
 
-			if (not thorough) and len(cbbuilder.cycles) >= len(fallback):
-				break
-
 			if len(cbbuilder.cycles) > len(fallback):
 				# Could be due to a bad fallback, or the suggested cycles might contain invalid edges;
 				# Make no assumptions.
@@ -88,6 +104,15 @@ def build_cyclebasis(cycles, fallback, thorough=THOROUGH_DEFAULT, progress_callb
 	assert len(cbbuilder.cycles) == len(fallback)
 	return cbbuilder.cycles
 
+# Number of distinct edges in a list of cycles (which may or may not repeat their first vertex)
+def _count_edges(cycles):
+	edges = set()
+	for cycle in cycles:
+		if cycle[0] != cycle[-1]:
+			cycle = cycle + cycle[:1]
+		edges.update(frozenset(e) for e in vpath.edges(cycle))
+	return len(edges)
+
 # Quick "frontend" for build_cyclebasis which reports incremental progress to stdout if verbose=True.
 def build_cyclebasis_terminal(cycles, fallback, thorough=THOROUGH_DEFAULT, verbose=False):
 	cycles = list(cycles)
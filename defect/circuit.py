@@ -1,6 +1,11 @@
 
+import copy
+import os
+import pickle
+
 import numpy as np
 from scipy import sparse
+from scipy.sparse import csgraph
 import scipy.sparse.linalg as spla
 
 import networkx as nx
@@ -8,18 +13,23 @@ import networkx as nx
 import defect.filetypes.internal as fileio
 import defect.graph.cyclebasis as gcb
 import defect.graph.path as vpath
-from defect.util import dict_inverse, edictget
+from defect.graph.connectivity import DecrementalConnectivity
+from defect.util import dict_inverse
 
 __all__ = [
 	'CircuitBuilder',
+	'CircuitArrays',
 	'MeshCurrentSolver',
+	'NodalCurrentSolver',
 	'compute_circuit_currents',
+	'compute_circuit_currents_batch',
 	'validate_circuit',
 	'save_circuit',
 	'load_circuit',
 	'circuit_path_voltage',
 	'circuit_path_resistance',
 	'circuit_edge_sign',
+	'reduce_circuit',
 ]
 
 # attribute names used internally by circuits
@@ -70,11 +80,17 @@ class CircuitBuilder():
 			g = nx.Graph()
 		self._g = _copy_graph_without_attributes(g)
 
+		# Components given in bulk, as lists ``(src, dst, resistance, voltage)``.
+		# These are applied on top of ``self._g`` in order, directly while building the
+		#  circuit, so that large circuits do not get built twice.  (see add_components)
+		self._pending = ([], [], [], [])
+
 	# class invariant:  Any edge on `self._g` which defines at least one edge property
 	#                   (source, voltage, resistance) will define all three.
 	# (however, an edge may have NO properties)
 
 	def add_node(self, s):
+		self._apply_pending()  # preserve the order of nodes
 		self._g.add_node(s)
 
 	def make_battery(self, s, t, voltage):
@@ -102,6 +118,12 @@ class CircuitBuilder():
 		The order of ``s`` and ``t`` are significant; ``voltage`` is interpreted
 		as ``Vt - Vs``, where ``(Vs,Vt)`` are the potential at ``s`` and ``t``.
 		'''
+		if self._pending[0]:
+			# must come after the pending components
+			for (lst, x) in zip(self._pending, (s, t, resistance, voltage)):
+				lst.append(x)
+			return
+
 		g = self._g
 		if not g.has_edge(s,t):
 			g.add_edge(s,t)
@@ -109,32 +131,82 @@ class CircuitBuilder():
 		g.edge[s][t]['_resistance'] = resistance
 		g.edge[s][t]['_source']     = s
 
+	def add_components(self, src, dst, resistance=0.0, voltage=0.0):
+		'''
+		Create or modify many edges at once.
+
+		This is equivalent to calling ``make_component(src[i], dst[i], ...)`` for each ``i``
+		in order, but much faster for large circuits.  ``src`` and ``dst`` are sequences of
+		nodes (such as NumPy arrays), while ``resistance`` and ``voltage`` may each be an
+		array of the same length or a scalar.
+
+		>>> builder = CircuitBuilder()
+		>>> builder.add_components(np.arange(3), np.arange(1, 4), resistance=np.array([1., 2., 3.]))
+		>>> builder.add_components([3], [0], voltage=5.0)
+		>>> circuit = builder.build()
+		>>> circuit.edge[1][2][EATTR_RESISTANCE], circuit.edge[0][3][EATTR_SOURCE]
+		(2.0, 3)
+		'''
+		src = _as_node_list(src)
+		dst = _as_node_list(dst)
+		if len(src) != len(dst):
+			raise ValueError('src and dst have different lengths ({} and {})'.format(len(src), len(dst)))
+
+		n = len(src)
+		resistance = np.broadcast_to(np.asarray(resistance, dtype=np.float64), (n,)).tolist()
+		voltage    = np.broadcast_to(np.asarray(voltage, dtype=np.float64), (n,)).tolist()
+
+		for (lst, x) in zip(self._pending, (src, dst, resistance, voltage)):
+			lst.extend(x)
+
+	def _apply_pending(self):
+		if not self._pending[0]:
+			return
+		self._g.add_edges_from(
+			(s, t, {'_voltage': v, '_resistance': r, '_source': s})
+			for (s, t, r, v) in zip(*self._pending)
+		)
+		self._pending = ([], [], [], [])
+
 	def build(self):
 		'''
 		Produce a ``circuit``.
 		'''
 		g = self._g
-		voltages    = nx.get_edge_attributes(g, '_voltage')
-		resistances = nx.get_edge_attributes(g, '_resistance')
-		sources     = nx.get_edge_attributes(g, '_source')
-
-		# class invariant of CircuitBuilder; no attribute ever appears without the other two
-		assert set(voltages) == set(resistances) == set(sources)
-
-		# this covers edges present in the initial graph (passed into the constructor)
-		# which were not addressed via make_resistor and friends
-		missing_edges = [e for e in g.edges() if (e not in voltages) and (e[::-1] not in voltages)]
-		for e in missing_edges:
-			voltages[e]    = self._DEFAULT_VOLTAGE
-			resistances[e] = self._DEFAULT_RESISTANCE
-			sources[e]     = e[0]
-
-		copy = _copy_graph_without_attributes(g)
-		nx.set_edge_attributes(copy, EATTR_VOLTAGE, voltages)
-		nx.set_edge_attributes(copy, EATTR_RESISTANCE, resistances)
-		nx.set_edge_attributes(copy, EATTR_SOURCE, sources)
-		assert validate_circuit(copy)
-		return copy
+
+		def circuit_attributes(s, t, attrs):
+			# class invariant of CircuitBuilder; no attribute ever appears without the other two
+			if '_source' in attrs:
+				return {
+					EATTR_VOLTAGE:    attrs['_voltage'],
+					EATTR_RESISTANCE: attrs['_resistance'],
+					EATTR_SOURCE:     attrs['_source'],
+				}
+
+			# this covers edges present in the initial graph (passed into the constructor)
+			# which were not addressed via make_resistor and friends
+			return {
+				EATTR_VOLTAGE:    self._DEFAULT_VOLTAGE,
+				EATTR_RESISTANCE: self._DEFAULT_RESISTANCE,
+				EATTR_SOURCE:     s,
+			}
+
+		# (a single pass over the edges, which matters for very large circuits)
+		circuit = type(g)()
+		circuit.add_nodes_from(g)
+		circuit.add_edges_from((s, t, circuit_attributes(s, t, attrs)) for (s, t, attrs) in g.edges_iter(data=True))
+		circuit.add_edges_from(
+			(s, t, {EATTR_VOLTAGE: v, EATTR_RESISTANCE: r, EATTR_SOURCE: s})
+			for (s, t, r, v) in zip(*self._pending)
+		)
+		assert validate_circuit(circuit)
+		return circuit
+
+# Sequence of nodes as a list, with NumPy scalars converted to Python scalars.
+def _as_node_list(nodes):
+	if isinstance(nodes, np.ndarray):
+		return nodes.tolist()
+	return list(nodes)
 
 def validate_circuit(circuit):
 	'''
@@ -147,19 +219,17 @@ def validate_circuit(circuit):
 	if circuit.is_directed() or circuit.is_multigraph():
 		raise ValueError('Circuit must be an undirected non-multigraph (nx.Graph())')
 
-	# Check for missing attributes...
+	# (a single pass over the edges, which matters for very large circuits)
 	eattrs = (EATTR_VOLTAGE, EATTR_RESISTANCE, EATTR_SOURCE)
-	for name in eattrs:
-		d = nx.get_edge_attributes(circuit, name)
-		d.update({(t,s):val for ((s,t),val) in d.items()}) # have both directions for easy lookup
+	for s, t, attrs in circuit.edges_iter(data=True):
+		# Check for missing attributes...
+		if any(name not in attrs for name in eattrs):
+			raise ValueError('There are missing edge attributes.  All edges must define: {}'.format(eattrs))
 
-		if any(e not in d for e in circuit.edges()):
-			raise ValueError('There are missing edge attributes.  All edges must define: {}'.format(expected_eattrs))
-
-	# Check for illegal attribute contents...
-	# The value of EATTR_SOURCE must be one of the edge's endpoints
-	if any(circuit.edge[s][t][EATTR_SOURCE] not in (s,t) for (s,t) in circuit.edges()):
-		raise ValiueError('An edge has an invalid "{}" attribute (it must equal one of the edge\'s endpoints)')
+		# Check for illegal attribute contents...
+		# The value of EATTR_SOURCE must be one of the edge's endpoints
+		if attrs[EATTR_SOURCE] not in (s,t):
+			raise ValueError('An edge has an invalid "{}" attribute (it must equal one of the edge\'s endpoints)'.format(EATTR_SOURCE))
 
 	return True
 
@@ -245,6 +315,253 @@ def copy_without_attributes(g):
 
 #------------------------------------------------------------
 
+class CircuitArrays:
+	'''
+	A compact, array-based representation of a circuit.
+
+	Nodes and edges are identified by integer ids.  ``nodes`` is the table of node labels
+	(the node with id ``i`` is ``nodes[i]``), and each edge ``e`` is described by
+	``src[e]`` (the endpoint that defines the sign of its voltage), ``dst[e]``,
+	``resistance[e]`` and ``voltage[e]``.  Adjacency is stored in CSR format.
+
+	Removing a node does not renumber anything; the node and its edges are simply
+	marked as dead (see ``node_alive`` and ``edge_alive``).  Ids thus remain valid for
+	the lifetime of the object.
+
+	>>> import networkx as nx
+	>>> builder = CircuitBuilder(nx.path_graph(3))
+	>>> builder.make_battery(2, 1, 5.0)
+	>>> builder.make_resistor(0, 1, 3.0)
+	>>> arrays = CircuitArrays.from_circuit(builder.build())
+	>>> e = arrays.edge_id(1, 2)
+	>>> arrays.nodes[arrays.src[e]], float(arrays.voltage[e])
+	(2, 5.0)
+	>>> arrays.edge_sign(e, 1)
+	-1.0
+	>>> sorted(arrays.neighbors(1))
+	[0, 2]
+	>>> arrays.remove_node(0).tolist()
+	[0]
+	>>> sorted(arrays.neighbors(1))
+	[2]
+	>>> sorted(arrays.to_circuit().edges())
+	[(1, 2)]
+	'''
+	def __init__(self, nodes, src, dst, resistance, voltage):
+		self.nodes = list(nodes)
+		self.node_ids = {v:i for (i,v) in enumerate(self.nodes)}
+
+		self.src = np.array(src, dtype=np.int32)
+		self.dst = np.array(dst, dtype=np.int32)
+		self.resistance = np.array(resistance, dtype=np.float64)
+		self.voltage = np.array(voltage, dtype=np.float64)
+
+		self.node_alive = np.ones((len(self.nodes),), dtype=bool)
+		self.edge_alive = np.ones((len(self.src),), dtype=bool)
+
+		# CSR adjacency;  the neighbors of node i are adj_nodes[adj_ptr[i]:adj_ptr[i+1]],
+		#  and adj_edges holds the corresponding edge ids.
+		ends   = np.concatenate([self.src, self.dst])
+		others = np.concatenate([self.dst, self.src])
+		edges  = np.concatenate([np.arange(len(self.src))] * 2).astype(np.int32)
+		order  = np.argsort(ends, kind='mergesort')
+		self.adj_ptr = np.zeros((len(self.nodes) + 1,), dtype=np.int64)
+		self.adj_ptr[1:] = np.cumsum(np.bincount(ends, minlength=len(self.nodes)))
+		self.adj_nodes = others[order]
+		self.adj_edges = edges[order]
+
+		self.__num_nodes = len(self.nodes)
+		self.__num_edges = len(self.src)
+		self.connectivity = DecrementalConnectivity(self.adj_ptr, self.adj_nodes, self.adj_edges)
+		self.__trackers = [self.connectivity]
+		self.__bridge_trackers = {}
+
+	@classmethod
+	def from_circuit(cls, circuit):
+		''' Build from a ``circuit`` (a ``networkx`` Graph). '''
+		nodes = list(circuit)
+		ids = {v:i for (i,v) in enumerate(nodes)}
+
+		src, dst, resistance, voltage = [], [], [], []
+		for s,t,attrs in circuit.edges_iter(data=True):
+			if attrs[EATTR_SOURCE] != s:
+				s,t = t,s
+			src.append(ids[s])
+			dst.append(ids[t])
+			resistance.append(attrs[EATTR_RESISTANCE])
+			voltage.append(attrs[EATTR_VOLTAGE])
+		return cls(nodes, src, dst, resistance, voltage)
+
+	def to_circuit(self):
+		''' Produce a ``circuit`` (a ``networkx`` Graph) from the living nodes and edges. '''
+		g = nx.Graph()
+		g.add_nodes_from(self.nodes[i] for i in np.flatnonzero(self.node_alive))
+		for e in np.flatnonzero(self.edge_alive):
+			s, t = self.nodes[self.src[e]], self.nodes[self.dst[e]]
+			g.add_edge(s, t, {
+				EATTR_SOURCE: s,
+				EATTR_RESISTANCE: float(self.resistance[e]),
+				EATTR_VOLTAGE: float(self.voltage[e]),
+			})
+		return g
+
+	def number_of_nodes(self): return self.__num_nodes
+	def number_of_edges(self): return self.__num_edges
+
+	def has_node(self, v):
+		return v in self.node_ids and bool(self.node_alive[self.node_ids[v]])
+
+	def has_edge(self, s, t):
+		return self.edge_id(s, t, default=None) is not None
+
+	def __incident(self, i):
+		# (neighbor ids, edge ids) of living edges at node id i
+		lo, hi = self.adj_ptr[i], self.adj_ptr[i+1]
+		alive = self.edge_alive[self.adj_edges[lo:hi]]
+		return self.adj_nodes[lo:hi][alive], self.adj_edges[lo:hi][alive]
+
+	def neighbors(self, v):
+		''' Get the labels of the living neighbors of a node. '''
+		if not self.has_node(v):
+			raise KeyError('No such node: {}'.format(repr(v)))
+		nbrs, _ = self.__incident(self.node_ids[v])
+		return [self.nodes[j] for j in nbrs]
+
+	def edge_id(self, s, t, **kw):
+		'''
+		Get the id of the living edge between two nodes.
+
+		It is a ``KeyError`` if no such edge exists, unless a ``default`` is supplied.
+		'''
+		if self.has_node(s) and self.has_node(t):
+			nbrs, edges = self.__incident(self.node_ids[s])
+			hits = edges[nbrs == self.node_ids[t]]
+			if len(hits):
+				return int(hits[0])
+
+		if 'default' in kw:
+			return kw['default']
+		raise KeyError('no such edge: {}'.format(repr((s,t))))
+
+	def find_edges(self, s_ids, t_ids):
+		'''
+		Vectorized form of ``edge_id``, taking arrays of node ids (not labels).
+
+		Returns an array of edge ids.  It is a ``KeyError`` if any of the edges does not exist.
+		'''
+		s_ids = np.asarray(s_ids, dtype=np.int64)
+		t_ids = np.asarray(t_ids, dtype=np.int64)
+		n = len(self.nodes)
+
+		# identify each living edge by a key that does not depend on direction
+		edges = self.edge_ids()
+		src, dst = self.src[edges].astype(np.int64), self.dst[edges].astype(np.int64)
+		keys = np.minimum(src, dst) * n + np.maximum(src, dst)
+		order = np.argsort(keys)
+		keys, edges = keys[order], edges[order]
+
+		queries = np.minimum(s_ids, t_ids) * n + np.maximum(s_ids, t_ids)
+		found = np.minimum(np.searchsorted(keys, queries), max(len(keys) - 1, 0))
+		if len(queries) and (len(keys) == 0 or np.any(keys[found] != queries)):
+			raise KeyError('no such edge among queried edges')
+		return edges[found]
+
+	def edge_sign(self, e, s):
+		'''
+		Sign of edge ``e`` when traveled starting from the node labeled ``s``.
+
+		This is ``+1.0`` when ``s`` is the edge's source (see ``circuit_edge_sign``).
+		'''
+		i = self.node_ids[s]
+		if i == self.src[e]: return +1.0
+		if i == self.dst[e]: return -1.0
+		raise ValueError('source not in endpoints')
+
+	def edge_ids(self):
+		''' Ids of all living edges. '''
+		return np.flatnonzero(self.edge_alive)
+
+	def fork(self):
+		'''
+		Get an independent copy, which may be modified separately.
+
+		The node table and adjacency structure (which are never modified) are shared,
+		while the state of the nodes and edges is copied.
+		'''
+		result = copy.copy(self)
+		result.resistance = self.resistance.copy()
+		result.node_alive = self.node_alive.copy()
+		result.edge_alive = self.edge_alive.copy()
+
+		trackers = {id(x): x.copy() for x in self.__trackers}
+		result.connectivity = trackers[id(self.connectivity)]
+		result.__trackers = [trackers[id(x)] for x in self.__trackers]
+		result.__bridge_trackers = {e: trackers[id(x)] for (e, x) in self.__bridge_trackers.items()}
+		return result
+
+	def edge_endpoints(self, e):
+		''' Labels ``(s,t)`` of an edge, with ``s`` being its source. '''
+		return (self.nodes[self.src[e]], self.nodes[self.dst[e]])
+
+	def cycle_rank(self):
+		'''
+		Dimension of the cycle space (``E - V + C``, with ``C`` connected components).
+
+		This is maintained incrementally as nodes are removed.
+		'''
+		return self.number_of_edges() - self.number_of_nodes() + self.connectivity.component_count()
+
+	def compute_cycle_rank(self):
+		''' Compute the dimension of the cycle space from scratch. (for debugging) '''
+		alive = self.edge_alive
+		n = len(self.nodes)
+		adj = sparse.csr_matrix((np.ones(np.count_nonzero(alive)), (self.src[alive], self.dst[alive])), shape=(n,n))
+		ncomps, _ = csgraph.connected_components(adj, directed=False)
+		# dead nodes are isolated, and each counts as a component
+		ncomps -= len(self.nodes) - np.count_nonzero(self.node_alive)
+		return np.count_nonzero(self.edge_alive) - np.count_nonzero(self.node_alive) + ncomps
+
+	def remove_node(self, v):
+		''' Remove a node and its edges.  Returns the ids of the removed edges. '''
+		if not self.has_node(v):
+			raise KeyError('No such node: {}'.format(repr(v)))
+		i = self.node_ids[v]
+		_, edges = self.__incident(i)
+		self.node_alive[i] = False
+		self.edge_alive[edges] = False
+
+		self.__num_nodes -= 1
+		self.__num_edges -= len(edges)
+		for tracker in self.__trackers:
+			tracker.remove_node(i)
+		return edges
+
+	def track_connectivity(self, ignored_edges=()):
+		'''
+		Get a ``DecrementalConnectivity`` for the current state of the circuit, minus some edges.
+
+		It is kept up to date as nodes are removed.  (``self.connectivity`` is one of these,
+		created with no ignored edges)
+		'''
+		tracker = DecrementalConnectivity(self.adj_ptr, self.adj_nodes, self.adj_edges,
+			self.node_alive, self.edge_alive, ignored_edges)
+		self.__trackers.append(tracker)
+		return tracker
+
+	def has_alternate_path(self, s, t):
+		'''
+		Determine whether the nodes of an edge remain connected without that edge.
+
+		Each edge queried this way gets a ``track_connectivity`` of its own, so that later
+		queries take constant time.
+		'''
+		e = self.edge_id(s, t)
+		if e not in self.__bridge_trackers:
+			self.__bridge_trackers[e] = self.track_connectivity([e])
+		return self.__bridge_trackers[e].connected(self.src[e], self.dst[e])
+
+#------------------------------------------------------------
+
 class cached_property:
 	'''
 	A member function decorator which provides a clean way to defer computation.
@@ -274,12 +591,16 @@ class cached_property:
 	>>> foo.x.get()
 	3
 	>>> foo.x.invalidate()  # force recomputation
+	>>> foo.x.is_cached()
+	False
 	>>> foo.x.get()
 	computing!!!
 	10
+	>>> foo.x.is_cached()
+	True
 	'''
 	def __init__(self, func):
-		self.member   = self.__generate_member_name()
+		self.member   = self.__generate_member_name(func)
 		self.sentinel = object()
 		self.func     = func
 
@@ -289,9 +610,10 @@ class cached_property:
 	def __set__(self, obj, value):
 		self.put(obj, value)
 
-	def __generate_member_name(self):
-		# FIXME I imagine this doesn't play well with serialization
-		return '_cached__{}'.format(id(self))
+	def __generate_member_name(self, func):
+		# Derived from the qualified name (rather than e.g. ``id(self)``), so that the
+		#  cached values of a pickled object still belong to the right properties.
+		return '_cached__{}'.format(func.__qualname__)
 
 	def get(self, obj):
 		'''
@@ -321,7 +643,16 @@ class cached_property:
 		'''
 		Delete the cached value, causing it to be recomputed on the next ``get()``.
 		'''
-		setattr(obj, self.member, self.sentinel)
+		obj.__dict__.pop(self.member, None)
+
+	def is_cached(self, obj):
+		'''
+		Determine whether a value is currently stored (so that ``get()`` will not compute).
+
+		This is useful for updates which are only worth applying to a value that already
+		exists; if there is no value, the next ``get()`` will compute it from scratch anyways.
+		'''
+		return getattr(obj, self.member, self.sentinel) is not self.sentinel
 
 # a cached_property bound to an instance
 class bound_cached_property:
@@ -334,6 +665,7 @@ class bound_cached_property:
 	def get(self):        return self.prop.get(self.obj)
 	def put(self, value): self.prop.put(self.obj, value)
 	def invalidate(self): self.prop.invalidate(self.obj)
+	def is_cached(self):  return self.prop.is_cached(self.obj)
 
 #------------------------------------------------------------
 # Needless to say, computing the currents of a circuit could very easily be provided via a
@@ -362,65 +694,254 @@ class MeshCurrentSolver:
 	Computes the currents in a circuit, and provides efficient
 	methods for computing new currents in response to various
 	modifications to the graph.
+
+	Additional named voltage sources may be supplied through ``sources``, as a dict
+	of ``name: (s, t, voltage)`` (with the same meaning as in ``make_battery``) for
+	existing edges ``(s,t)``.  For each source, the currents are also computed for the
+	circuit as driven by that source alone; in these solutions, the voltages of all
+	other edges are taken to be zero, and the edges of the other named sources are left
+	open (so that an inactive source of zero resistance does not short the circuit).
+	All of them are solved at once, sharing the factorization used for the circuit's own
+	voltages (see ``get_source_current``).
+
+	With ``debug=True``, incrementally maintained data is regularly
+	checked against a computation from scratch.
 	'''
-	def __init__(self, circuit, cyclebasis, cbupdater=None):
+
+	# Resistance changes are applied to the last factorization of the resistance matrix as
+	#  a low rank correction (see ``LowRankUpdatedSolver``), until this many edges have been
+	#  modified; beyond that point, it becomes cheaper to just factorize again.
+	DEFAULT_MAX_UPDATE_RANK = 32
+
+	# Values for ``method``, which selects how the mesh equations are solved.
+	METHOD_DIRECT = 'direct' # sparse LU factorization
+	METHOD_CG     = 'cg'     # preconditioned conjugate gradient, warm-started from the last solution
+	METHODS = (METHOD_DIRECT, METHOD_CG)
+
+	# Number of random projections used by approximate effective resistance queries.
+	# (the relative error is typically on the order of ``sqrt(2 / dimension)``)
+	DEFAULT_PROJECTION_DIMENSION = 128
+
+	def __init__(self, circuit, cyclebasis, cbupdater=None, *,
+			max_update_rank=DEFAULT_MAX_UPDATE_RANK, method=METHOD_DIRECT, cg_options=None, sources=None, debug=False):
 		if cbupdater is None:
 			cbupdater = gcb.dummy_cbupdater()
+		if method not in self.METHODS:
+			raise ValueError('unknown method: {}'.format(repr(method)))
 
 		validate_circuit(circuit)
 
-		self.__g = circuit.copy()
+		self.__arrays = CircuitArrays.from_circuit(circuit)
 		self.__cbupdater = cbupdater
+		self.__max_update_rank = max_update_rank
+		self.__method = method
+		self.__cg_options = dict(cg_options or {}) # see PreconditionedCGSolver
+		self.__debug = debug # enables expensive consistency checks
+
+		# named sources, as (edge id, voltage in the direction of the edge's source)
+		self.__source_names = list(sources or {})
+		self.__source_index = {name:k for (k,name) in enumerate(self.__source_names)}
+		self.__sources = []
+		for name in self.__source_names:
+			s, t, voltage = sources[name]
+			e = self.__arrays.edge_id(s, t)
+			self.__sources.append((e, self.__arrays.edge_sign(e, s) * voltage))
+
+		# Solution from the most recent solve, used as the initial guess for METHOD_CG.
+		# (only meaningful for as long as the cyclebasis doesn't change)
+		self.__warm_start = None
+		self.__source_warm_start = None
+		self.__last_iterations = None
 
 		self.__cbupdater.init(cyclebasis)
 
 		# Invalidate everything
 		self.__cyclebasis.invalidate()
-		self.__cycles_from_edge.invalidate()
+		self.__cycle_incidence.invalidate()
 		self.__voltage_vector.invalidate()
-		self.__resistance_matrix.invalidate()
+		self.__source_voltages.invalidate()
+		self.__resistance_pattern.invalidate()
+		self.__solve_rows.invalidate()
+		self.__solve_pattern.invalidate()
+		self.__linear_solver.invalidate()
+		self.__resistance_solver.invalidate()
 		self.__cycle_currents.invalidate()
+		self.__source_currents.invalidate()
+		self.__spanning_forest.invalidate()
 
 	def delete_node(self, v):
 		'''
 		Removes a vertex and all associated edges from the circuit.
 		'''
-		if not self.__g.has_node(v):
-			raise KeyError('No such node: {}'.format(repr(v)))
-
 		# update in-place
-		self.__g.remove_node(v)
-		self.__cbupdater.remove_vertex(self.__g, v)
-
-		self.__cyclebasis.invalidate()
-		self.__cycles_from_edge.invalidate()
-		self.__voltage_vector.invalidate()
-		self.__resistance_matrix.invalidate()
+		removed_edges = self.__arrays.remove_node(v)
+		change = self.__cbupdater.remove_vertex(self.__arrays, v)
+
+		# Deleting a node that is not on any solved cycle leaves the solutions intact.
+		# (they only need to be rearranged, if cycles are moved to new rows)
+		old_currents = old_source_currents = old_source_responses = None
+		if change is not None and self.__solve_rows.is_cached():
+			incidence, rows = self.__cycle_incidence.get(), self.__solve_rows.get()
+			if not any(is_solved_edge(incidence, rows, e) for e in removed_edges):
+				if self.__cycle_currents.is_cached():
+					old_currents = self.__cycle_currents.get()
+				if self.__source_currents.is_cached():
+					old_source_currents = self.__source_currents.get()
+					old_source_responses = self.__source_warm_start
+
+		self.__source_voltages.invalidate()
+		self.__solve_rows.invalidate()
+		self.__solve_pattern.invalidate()
+		self.__linear_solver.invalidate()
+		self.__resistance_solver.invalidate()
 		self.__cycle_currents.invalidate()
+		self.__source_currents.invalidate()
+		self.__spanning_forest.invalidate()
+		self.__warm_start = None
+		self.__source_warm_start = None
+
+		if change is None or not self.__cycle_incidence.is_cached():
+			self.__cyclebasis.invalidate()
+			self.__cycle_incidence.invalidate()
+			self.__voltage_vector.invalidate()
+			self.__resistance_pattern.invalidate()
+			return
+
+		# Only the cycles reported by the cbupdater have changed; patch the corresponding
+		#  rows of the incidence matrix and voltage vector (and rows/columns of R).
+		removed, added = change
+		cycles_by_id = self.__cbupdater.get_cyclebasis_by_id()
+
+		table = self.__cyclebasis.get()
+		changed, moves = table.replace(removed, [(i, cycles_by_id[i]) for i in added])
+		self.__check_rank(table)
+
+		if old_currents is not None:
+			currents = patch_cycle_currents(old_currents, len(table), changed, moves)
+			self.__cycle_currents.put(currents)
+			self.__warm_start = currents
+			self.__note_reused_solution()
+
+		if old_source_currents is not None:
+			currents = patch_cycle_currents(old_source_currents, len(table), changed, moves)
+			self.__source_currents.put(currents)
+		if old_source_responses is not None:
+			self.__source_warm_start = patch_cycle_currents(old_source_responses, len(table), changed, moves)
+
+		incidence, edges = patch_cycle_incidence(self.__arrays, self.__cycle_incidence.get(), table, changed)
+		self.__cycle_incidence.put(incidence)
+
+		if self.__voltage_vector.is_cached():
+			self.__voltage_vector.put(patch_voltage_vector(self.__arrays, self.__voltage_vector.get(), table, changed))
+
+		if self.__resistance_pattern.is_cached():
+			self.__resistance_pattern.put(self.__resistance_pattern.get().patched(incidence, edges))
 
 	def multiply_edge_resistance(self, s, t, factor):
 		'''
 		Multiplies the resistance of an edge by a scalar factor.
 		'''
-		self.__g.edge[s][t][EATTR_RESISTANCE] *= factor
-
-		self.__cyclebasis       # still valid!
-		self.__cycles_from_edge # still valid!
-		self.__voltage_vector   # still valid!
-		self.__resistance_matrix.invalidate()
-		self.__cycle_currents.invalidate()
+		e = self.__arrays.edge_id(s, t)
+		self.__set_edge_resistance(e, self.__arrays.resistance[e] * factor)
 
 	def assign_edge_resistance(self, s, t, value):
 		'''
 		Assigns a value to the resistance of an edge.
 		'''
-		self.__g.edge[s][t][EATTR_RESISTANCE] = value
+		self.__set_edge_resistance(self.__arrays.edge_id(s, t), value)
+
+	def fork(self):
+		'''
+		Create an independent solver in the same state.
+
+		The two solvers may then be modified separately.  Data which is never modified in
+		place (such as the factorization of the resistance matrix, the incidence matrix and
+		the latest solution) is shared between them, while the cbupdater copies its state
+		once either side deletes a node.
+		'''
+		result = copy.copy(self)
+		result.__arrays = self.__arrays.fork()
+		result.__cbupdater = self.__cbupdater.fork()
+
+		# things which are modified in place
+		if self.__cyclebasis.is_cached():
+			result.__cyclebasis.put(self.__cyclebasis.get().copy())
+
+		if self.__linear_solver.is_cached():
+			result.__linear_solver.put(self.__linear_solver.get().fork(result.__arrays.resistance))
+		if self.__resistance_solver.is_cached():
+			if self.__shares_resistance_solver():
+				result.__resistance_solver.put(result.__linear_solver.get())
+			else:
+				result.__resistance_solver.put(self.__resistance_solver.get().fork(result.__arrays.resistance))
+		return result
+
+	def save_state(self, path):
+		'''
+		Write the complete state of the solver to a file, to be restored by ``load_state``.
 
-		self.__cyclebasis       # still valid!
-		self.__cycles_from_edge # still valid!
-		self.__voltage_vector   # still valid!
-		self.__resistance_matrix.invalidate()
+		Everything is saved except for the linear solvers (whose factorizations cannot be
+		serialized); these are recomputed the next time a solve is needed.
+		'''
+		state = copy.copy(self)
+		state.__linear_solver.invalidate()
+		state.__resistance_solver.invalidate()
+		with open(path, 'wb') as f:
+			pickle.dump(state, f, pickle.HIGHEST_PROTOCOL)
+
+	@classmethod
+	def load_state(cls, path):
+		'''
+		Read a solver written by ``save_state``.
+		'''
+		with open(path, 'rb') as f:
+			solver = pickle.load(f)
+		if not isinstance(solver, cls):
+			raise TypeError('{} does not contain a {}'.format(repr(path), cls.__name__))
+		return solver
+
+	def __set_edge_resistance(self, e, value):
+		# NOTE: the resistance array is shared with the linear solver (if any); updating
+		#       it in place is all that is needed to keep its matrix up to date.
+		delta = value - self.__arrays.resistance[e]
+		self.__arrays.resistance[e] = value
+
+		self.__cyclebasis         # still valid!
+		self.__cycle_incidence    # still valid!
+		self.__voltage_vector     # still valid!
+		self.__source_voltages    # still valid!
+		self.__resistance_pattern # still valid!
+		self.__solve_rows         # still valid!
+		self.__solve_pattern      # still valid!
+		self.__spanning_forest    # still valid!
+
+		# the solver for effective resistances covers every row, including this edge's
+		if self.__resistance_solver.is_cached() and not self.__shares_resistance_solver():
+			solver = self.__resistance_solver.get()
+			indices, signs = compute_edge_update_vector(self.__cycle_incidence.get(), e)
+			solver.add_update(e, indices, signs, delta)
+			if solver.rank() > self.__max_update_rank:
+				self.__resistance_solver.invalidate()
+
+		# an edge outside of the solved rows carries no current, before or after
+		if self.__solve_rows.is_cached():
+			if not is_solved_edge(self.__cycle_incidence.get(), self.__solve_rows.get(), e):
+				self.__note_reused_solution()
+				return
 		self.__cycle_currents.invalidate()
+		self.__source_currents.invalidate()
+
+		# update in-place (if there is anything to update)
+		if self.__linear_solver.is_cached():
+			solver = self.__linear_solver.get()
+			indices, signs = compute_edge_update_vector(self.__cycle_incidence.get(), e)
+			indices, signs = restrict_update_vector(self.__solve_rows.get(), indices, signs)
+			solver.add_update(e, indices, signs, delta)
+
+			if solver.rank() > self.__max_update_rank:
+				if self.__shares_resistance_solver():
+					self.__resistance_solver.invalidate()
+				self.__linear_solver.invalidate()
 
 	# FIXME: Ick. This is here so that the node_deletion module can do what it needs.
 	#             I don't want to expose the graph directly, nor do I want to make
@@ -430,54 +951,161 @@ class MeshCurrentSolver:
 		'''
 		Get the immediate neighbors of a node.
 		'''
-		return self.__g.neighbors(v)
+		return self.__arrays.neighbors(v)
 
 	def node_exists(self, v):
 		'''
 		Determine if a node exists in the circuit. (Boolean)
 		'''
-		return self.__g.has_node(v)
+		return self.__arrays.has_node(v)
 
 	def circuit(self):
 		'''
 		Get a copy of the current state of the circuit.
 		'''
-		return self.__g.copy()
+		return self.__arrays.to_circuit()
+
+	def has_alternate_path(self, s, t):
+		'''
+		Determine whether ``s`` and ``t`` are connected by any path besides the edge ``(s,t)``.
+
+		When this is ``False``, no current can flow through the edge.  The answer is
+		maintained through node deletions, and takes constant time after the first query.
+		'''
+		return self.__arrays.has_alternate_path(s, t)
 
 	@cached_property
 	def __cyclebasis(self):
-		cb = self.__cbupdater.get_cyclebasis()
+		cb = CycleTable(self.__cbupdater.get_cyclebasis_by_id().items())
+		self.__check_rank(cb)
+		return cb
 
+	def __check_rank(self, cb):
 		# NOTE: this test is here because it is one of the only few paths that code
 		#  reliably passes through where the current state of the modified cyclebasis
 		#  and graph are both available.
 
 		# FIXME: whatever happened to validate_cyclebasis?
-		if len(cb) != len(nx.cycle_basis(self.__g)):
+		rank = self.__arrays.cycle_rank()
+		if self.__debug:
+			assert rank == self.__arrays.compute_cycle_rank()
+
+		if len(cb) != rank:
 
 			# FIXME: This is an error (rather than assertion) due to an unresolved issue
 			#  with the builder updater algorithm;  I CANNOT say with confidence that
 			#  this will not occur. -_-
-			raise RuntimeError('Cyclebasis has incorrect rank ({}, need {}).'.format(
-				len(cb),len(nx.cycle_basis(self.__g))))
-
-		return cb
+			raise RuntimeError('Cyclebasis has incorrect rank ({}, need {}).'.format(len(cb), rank))
 
 	@cached_property
-	def __cycles_from_edge(self):
-		return compute_cycles_from_edge(self.__g, self.__cyclebasis.get())
+	def __cycle_incidence(self):
+		return compute_cycle_incidence(self.__arrays, self.__cyclebasis.get())
 
 	@cached_property
 	def __voltage_vector(self):
-		return compute_voltage_vector(self.__g, self.__cyclebasis.get())
+		return compute_voltage_vector(self.__arrays, self.__cycle_incidence.get())
+
+	# One column per named source.
+	@cached_property
+	def __source_voltages(self):
+		return compute_source_voltage_matrix(self.__cycle_incidence.get(), self.__sources)
+
+	@cached_property
+	def __resistance_pattern(self):
+		return ResistanceMatrixPattern.from_incidence(self.__cycle_incidence.get())
+
+	# The rows of the mesh equations that are actually solved, for any of the right
+	#  hand sides. (see compute_solve_rows)
+	@cached_property
+	def __solve_rows(self):
+		emf = np.column_stack([self.__voltage_vector.get(), self.__source_voltages.get()])
+		return compute_solve_rows(self.__cycle_incidence.get(), emf)
+
+	@cached_property
+	def __solve_pattern(self):
+		return self.__resistance_pattern.get().restricted(self.__solve_rows.get())
 
 	@cached_property
-	def __resistance_matrix(self):
-		return compute_resistance_matrix(self.__g, self.__cyclebasis.get(), self.__cycles_from_edge.get())
+	def __linear_solver(self):
+		return self.__make_linear_solver(self.__solve_pattern.get())
+
+	# Effective resistances need every row of the mesh equations; most of the time, these
+	#  are all solved anyway, and the same solver is used for both.
+	@cached_property
+	def __resistance_solver(self):
+		if len(self.__solve_rows.get()) == len(self.__cyclebasis.get()):
+			return self.__linear_solver.get()
+		return self.__make_linear_solver(self.__resistance_pattern.get())
+
+	def __shares_resistance_solver(self):
+		return (self.__resistance_solver.is_cached() and self.__linear_solver.is_cached()
+			and self.__resistance_solver.get() is self.__linear_solver.get())
+
+	def __make_linear_solver(self, pattern):
+		if self.__method == self.METHOD_CG:
+			# NOTE: this shares the resistance array, which is updated in-place
+			return PreconditionedCGSolver(pattern, self.__arrays.resistance, **self.__cg_options)
+
+		solve = factorize_resistance_matrix(pattern, self.__arrays.resistance)
+		return LowRankUpdatedSolver(solve, pattern.size)
 
 	@cached_property
 	def __cycle_currents(self):
-		return compute_cycle_currents(self.__resistance_matrix.get(), self.__voltage_vector.get(), self.__cyclebasis.get())
+		solver = self.__linear_solver.get()
+		currents = compute_cycle_currents(solver, self.__voltage_vector.get(), self.__solve_rows.get(), self.__warm_start)
+		self.__warm_start = currents
+		self.__last_iterations = getattr(solver, 'iterations', None)
+		return currents
+
+	# One column per named source.
+	# The response to a unit voltage on each source's edge is solved for (rather than the
+	#  source voltages themselves), as it also serves to open that edge in the solutions
+	#  for all of the other sources.
+	@cached_property
+	def __source_currents(self):
+		solver = self.__linear_solver.get()
+		edges = [e for (e,_) in self.__sources]
+		units = compute_source_voltage_matrix(self.__cycle_incidence.get(), [(e, 1.) for e in edges])
+		responses = compute_cycle_currents(solver, units, self.__solve_rows.get(), self.__source_warm_start)
+		self.__source_warm_start = responses
+
+		voltages = np.array([voltage for (_,voltage) in self.__sources])
+		return open_other_sources(responses * voltages, responses, units, np.zeros(len(edges)), edges)
+
+	@cached_property
+	def __spanning_forest(self):
+		return SpanningForest(self.__arrays)
+
+	def last_iteration_count(self):
+		'''
+		Get the number of iterations used to compute the current solution.
+
+		This is ``None`` unless an iterative method (``METHOD_CG``) is in use, and zero if
+		the previous solution was found to still be valid after a modification.
+		'''
+		return self.__last_iterations
+
+	def __note_reused_solution(self):
+		if self.__last_iterations is not None:
+			self.__last_iterations = 0
+
+	def get_edges(self):
+		'''
+		Get a list of all edges ``(s,t)``, in the order used by ``get_all_currents_array``.
+
+		Each edge is oriented so that ``s`` is the source of its voltage.  The order is stable;
+		deleting nodes only removes edges from the list, without reordering the rest.
+		'''
+		return [self.__arrays.edge_endpoints(e) for e in self.__arrays.edge_ids()]
+
+	def get_all_currents_array(self):
+		'''
+		Compute all currents in the circuit, as an array.
+
+		Element ``i`` of the returned array is the current flowing from ``s`` to ``t``, where
+		``(s,t) = self.get_edges()[i]``.
+		'''
+		return compute_edge_currents_array(self.__arrays, self.__cycle_currents.get(), self.__cycle_incidence.get())
 
 	def get_all_currents(self):
 		'''
@@ -487,11 +1115,7 @@ class MeshCurrentSolver:
 		is the (signed) current that flows from ``s`` to ``t``. It is guaranteed that
 		``d[s,t] == -(d[t,s])``.
 		'''
-		# NOTE: of course, the guarantee that d[s,t] == -d[t,s] is written under the assumption
-		#       that d[s,t] is not NaN
-		d = compute_all_edge_currents(self.__g, self.__cycle_currents.get(), self.__cycles_from_edge.get())
-		assert all(d[t,s] == -d[s,t] for s,t in d)
-		return d
+		return edge_currents_dict(self.get_edges(), self.get_all_currents_array())
 
 	def get_current(self, s, t):
 		'''
@@ -499,9 +1123,78 @@ class MeshCurrentSolver:
 
 		It is a ``KeyError`` if no such edge exists in the graph.
 		'''
-		if not self.__g.has_edge(s,t):
-			raise KeyError('no such edge: {}'.format(repr((s,t))))
-		return compute_single_edge_current(self.__g, self.__cycle_currents.get(), self.__cycles_from_edge.get(), s, t)
+		e = self.__arrays.edge_id(s, t)
+		current = compute_edge_current(self.__cycle_currents.get(), self.__cycle_incidence.get(), e)
+		return self.__arrays.edge_sign(e, s) * current
+
+	def get_effective_resistance(self, s, t):
+		'''
+		Compute the effective resistance between two nodes.
+
+		This is the resistance of the circuit as seen by a current source connected to
+		``s`` and ``t`` (ignoring all voltages), or ``inf`` if they are not connected.
+		It is a ``KeyError`` if either node does not exist.
+		'''
+		return float(self.get_effective_resistances([(s, t)])[0])
+
+	def get_effective_resistances(self, pairs, *, approximate=False,
+			dimension=DEFAULT_PROJECTION_DIMENSION, seed=None):
+		'''
+		Compute the effective resistances between many pairs of nodes, as an array.
+
+		These are computed from the current factorization of the mesh equations, with one
+		right hand side per pair.  With ``approximate=True``, the nodes are instead embedded
+		into ``dimension`` random projections (with a cost of ``dimension`` right hand sides,
+		no matter how many pairs there are), and each resistance is approximated by the
+		squared distance between the embedded nodes.  ``seed`` seeds the projections.
+		'''
+		pairs = [(self.__node_id(s), self.__node_id(t)) for (s,t) in pairs]
+		if not pairs:
+			return np.zeros((0,))
+
+		forest = self.__spanning_forest.get()
+		solver = self.__resistance_solver.get()
+		if approximate:
+			rng = np.random.RandomState(seed)
+			embedding = compute_resistance_embedding(self.__arrays, self.__cycle_incidence.get(),
+				solver, forest, dimension, rng)
+			return embedded_effective_resistances(embedding, forest, pairs)
+		return compute_effective_resistances(self.__arrays, self.__cycle_incidence.get(), solver, forest, pairs)
+
+	def __node_id(self, v):
+		if not self.__arrays.has_node(v):
+			raise KeyError('No such node: {}'.format(repr(v)))
+		return self.__arrays.node_ids[v]
+
+	def source_names(self):
+		'''
+		Get the names of the voltage sources given to the constructor, in order.
+		'''
+		return list(self.__source_names)
+
+	def get_all_source_currents_array(self):
+		'''
+		Compute all currents in the circuit under each of the named sources, as an array.
+
+		Element ``[i,k]`` of the returned array is the current flowing from ``s`` to ``t``
+		when the circuit is driven by the source ``self.source_names()[k]`` alone, where
+		``(s,t) = self.get_edges()[i]``.
+		'''
+		currents = self.__source_currents.get()
+		return compute_edge_currents_array(self.__arrays, currents, self.__cycle_incidence.get())
+
+	def get_source_current(self, name, s, t):
+		'''
+		Compute signed current flowing from ``s`` to ``t`` when the circuit is driven by
+		the named source alone.
+
+		All named sources are solved together the first time this is called after a
+		modification.  It is a ``KeyError`` if no such edge or source exists.
+		'''
+		k = self.__source_index[name]
+		e = self.__arrays.edge_id(s, t)
+		current = compute_edge_current(self.__source_currents.get()[:,k], self.__cycle_incidence.get(), e)
+		return self.__arrays.edge_sign(e, s) * current
 
 #------------------------------------------------------------
 
@@ -510,62 +1203,1328 @@ class MeshCurrentSolver:
 # These are laid out as free functions so that all data dependencies are clearly
 #  spelled out in the arguments.
 
-def compute_cycles_from_edge(g, cyclebasis):
-	cycles_from_edge = {e:[] for e in g.edges()}
+# Edges are identified by their ids in a ``CircuitArrays``.
 
-	for pathI, path in enumerate(cyclebasis):
-		for e in vpath.edges(path):
-			sign = circuit_edge_sign(g, *e)
+def compute_cycle_incidence(arrays, cyclebasis):
+	'''
+	Build the signed incidence matrix ``C`` between cycles and edges.
 
-			ecycles = edictget(cycles_from_edge, e)
-			ecycles.append((pathI, sign))
-	return cycles_from_edge
+	``C[i,e]`` is ``+1`` if cycle ``i`` travels edge ``e`` in the direction of its voltage,
+	``-1`` if it travels it backwards, and ``0`` if it does not use the edge.  The matrix
+	is returned in CSC format, with one column per edge id (living or not).
+	'''
+	lengths = np.array([len(path) for path in cyclebasis], dtype=np.int64)
+	ids = np.fromiter((arrays.node_ids[v] for path in cyclebasis for v in path),
+		dtype=np.int64, count=lengths.sum())
+
+	# consecutive pairs of vertices, excluding those that straddle two paths
+	is_step = np.ones((len(ids),), dtype=bool)
+	is_step[np.cumsum(lengths) - 1] = False
+	s_ids, t_ids = ids[:-1][is_step[:-1]], ids[1:][is_step[:-1]]
+
+	edges = arrays.find_edges(s_ids, t_ids)
+	signs = np.where(arrays.src[edges] == s_ids, 1.0, -1.0)
+	rows  = np.repeat(np.arange(len(cyclebasis)), np.maximum(lengths - 1, 0))
+
+	shape = (len(cyclebasis), len(arrays.src))
+	return sparse.csc_matrix((signs, (rows, edges)), shape=shape)
+
+def compute_voltage_vector(arrays, incidence):
+	return incidence.dot(arrays.voltage)
+
+def compute_source_voltage_matrix(incidence, sources):
+	# Voltage vectors for a list of single-edge sources ``(edge id, voltage)``, as columns.
+	# (a source whose edge no longer belongs to any cycle has a column of zeros)
+	result = np.zeros((incidence.shape[0], len(sources)))
+	for k, (e, voltage) in enumerate(sources):
+		indices, signs = compute_edge_update_vector(incidence, e)
+		result[indices, k] = signs * voltage
+	return result
 
-def compute_voltage_vector(g, cyclebasis):
-	return np.array([circuit_path_voltage(g, path) for path in cyclebasis])
+def open_other_sources(solutions, responses, constraints, slack, edges):
+	# Solutions for each named source alone, with the edges of all other sources open.
+	#
+	# Column ``k`` of ``solutions`` is driven by source ``k`` with every edge still in place.
+	#  The edge of each source ``j`` has a slack term in the right hand side, whose solution
+	#  per unit is ``responses[:,j]``; that edge is open once the slack ``x_j`` satisfies
+	#  ``constraints[:,j].dot(solution) == slack[j] * x_j``.  The slack terms for all of the
+	#  open edges are found together, by least squares (as the system is singular if, e.g.,
+	#  two open edges are in series).
+	# ``edges`` identifies the edge of each source (or is None if the edge is gone), so that
+	#  sources which share the active source's edge are not opened.
+	at_y = constraints.T.dot(solutions)
+	at_z = constraints.T.dot(responses)
+	result = np.array(solutions, dtype=float)
+	for k in range(len(edges)):
+		others = [j for (j,e) in enumerate(edges) if e is not None and e != edges[k]]
+		if not others:
+			continue
+		lhs = at_z[np.ix_(others, others)] - np.diag(slack[others])
+		x = np.linalg.lstsq(lhs, -at_y[others, k], rcond=None)[0]
+		result[:,k] += responses[:, others].dot(x)
+	return result
 
-def compute_resistance_matrix(g, cyclebasis, cycles_from_edge):
-	# Build components of resistance matrix, in coo (COOrdinate format) sparse format
-	R_vals = []
-	R_rows = []
-	R_cols = []
-	for e in g.edges():
-		s,t = e
-		resistance = g.edge[s][t][EATTR_RESISTANCE]
+class CycleTable:
+	'''
+	The cycles of a cyclebasis, in the order used for rows of the mesh equations.
+
+	Each cycle has an identity (as assigned by a cbupdater).  When cycles are replaced,
+	the remaining cycles keep their rows wherever possible, so that only a few rows of
+	the mesh equations need to be recomputed.
+	'''
+	def __init__(self, items):
+		items = list(items)
+		self.ids    = [i for (i,_) in items]
+		self.cycles = [c for (_,c) in items]
+		self.rows   = {i:row for (row,i) in enumerate(self.ids)}
+
+	def __len__(self):  return len(self.cycles)
+	def __iter__(self): return iter(self.cycles)
+
+	def copy(self):
+		return CycleTable(zip(self.ids, self.cycles))
+
+	def replace(self, removed, added):
+		'''
+		Remove the cycles with the identities in ``removed``, and add the ``(identity, cycle)``
+		pairs in ``added``.
+
+		Returns a sorted array of the rows whose cycle has changed (rows beyond the new
+		length are not included), and a list of ``(old_row, new_row)`` for each cycle
+		that was already present but moved to a new row.
+		'''
+		free = sorted(self.rows.pop(i) for i in removed)
+		changed = []
+		moves = []
+		added_ids = set(i for (i,_) in added)
+
+		# new cycles take the place of old ones...
+		for i, cycle in added:
+			if free:
+				row = free.pop(0)
+				self.ids[row], self.cycles[row] = i, cycle
+			else:
+				row = len(self.ids)
+				self.ids.append(i)
+				self.cycles.append(cycle)
+			self.rows[i] = row
+			changed.append(row)
+
+		# ...and any remaining holes are filled with cycles from the end
+		free = set(free)
+		while free:
+			last = len(self.ids) - 1
+			if last not in free:
+				row = min(free)
+				self.ids[row], self.cycles[row] = self.ids[last], self.cycles[last]
+				self.rows[self.ids[row]] = row
+				changed.append(row)
+				free.remove(row)
+				if self.ids[row] not in added_ids:
+					moves.append((last, row))
+			else:
+				free.remove(last)
+			self.ids.pop()
+			self.cycles.pop()
+
+		return np.array(sorted(set(changed)), dtype=int), moves
+
+def patch_cycle_incidence(arrays, incidence, cyclebasis, changed):
+	# Produce the incidence matrix for a cyclebasis (a CycleTable) in which only the
+	#  ``changed`` rows have changed (aside from possibly being truncated or extended).
+	# Also returns the edges whose columns were affected.
+	old = incidence.tocoo()
+	size = len(cyclebasis)
+
+	stale = np.zeros((max(incidence.shape[0], size),), dtype=bool)
+	stale[changed] = True
+	stale[size:] = True
+	keep = ~stale[old.row]
+
+	fresh = compute_cycle_incidence(arrays, [cyclebasis.cycles[i] for i in changed]).tocoo()
+
+	rows = np.concatenate([old.row[keep], changed[fresh.row]])
+	cols = np.concatenate([old.col[keep], fresh.col])
+	data = np.concatenate([old.data[keep], fresh.data])
+	result = sparse.csc_matrix((data, (rows, cols)), shape=(size, incidence.shape[1]))
+
+	edges = np.unique(np.concatenate([old.col[~keep], fresh.col]))
+	return result, edges
+
+def patch_cycle_currents(currents, size, changed, moves):
+	# Rearrange cycle currents (a vector, or a matrix with one column per right hand side)
+	#  after CycleTable.replace; the cycles that were removed and added must have carried
+	#  no current.
+	result = np.zeros((size,) + currents.shape[1:])
+	n = min(size, len(currents))
+	result[:n] = currents[:n]
+	result[changed] = 0.
+	for old, new in moves:
+		result[new] = currents[old]
+	return result
+
+def patch_voltage_vector(arrays, v_vec, cyclebasis, changed):
+	# Produce the voltage vector for a cyclebasis in which only the ``changed`` rows have changed.
+	result = np.zeros((len(cyclebasis),))
+	n = min(len(result), len(v_vec))
+	result[:n] = v_vec[:n]
+	fresh = compute_cycle_incidence(arrays, [cyclebasis.cycles[i] for i in changed])
+	result[changed] = compute_voltage_vector(arrays, fresh)
+	return result
+
+def compute_resistance_matrix(arrays, incidence):
+	return incidence.dot(sparse.diags(arrays.resistance)).dot(incidence.T).tocsc()
+
+class ResistanceMatrixPattern:
+	'''
+	The fixed sparsity structure of a mesh resistance matrix.
+
+	The resistance matrix is ``R = C diag(r) C.T``, where ``C`` is the cycle incidence matrix
+	(see ``compute_cycle_incidence``).  For as long as the cyclebasis does not change, its
+	nonzero pattern does not depend on the resistances ``r``.  This object records, for
+	each stored element of ``R``, the edges which contribute to it (and with what sign), so
+	that the numerical values can be refreshed in place for a new vector of resistances.
+
+	``R`` is stored in CSC format under a symmetric permutation (so that ``matrix()[i,j]``
+	is ``R[perm[i],perm[j]]``).  The permutation starts out as the identity; it is meant to
+	be replaced (once) via ``set_permutation`` with a fill-reducing ordering.
+	'''
+	def __init__(self, size, terms):
+		# (see compute_resistance_terms for ``terms``)
+		self.size = size
+		self.__rows, self.__cols, self.__terms_edge, self.__terms_sign = terms
+
+		self.perm = None
+		self.__set_layout(np.arange(self.size))
+
+	@classmethod
+	def from_incidence(cls, incidence):
+		''' Get the pattern of ``R`` for a cycle incidence matrix. '''
+		return cls(incidence.shape[0], compute_resistance_terms(incidence))
 
-		ecycles = edictget(cycles_from_edge, e)
+	def restricted(self, rows):
+		'''
+		Get the pattern of the submatrix made of the given (sorted) rows and columns.
+
+		The rows must form a union of blocks of ``R`` (i.e. no term may link one of the given
+		rows to any row outside of them).  The result has no permutation, unless it is simply
+		this pattern.
+		'''
+		if len(rows) == self.size:
+			return self
 
-		# generate terms corresponding to this edge, which are +r between cycles that cross the
-		#  edge in the same direction, and -r between cycles that cross in opposite directions
-		for (row, row_sign) in ecycles:
-			R_rows.extend([row]*len(ecycles))
-			R_cols.extend([col for (col,_) in ecycles])
-			R_vals.extend([row_sign * col_sign * resistance for (_,col_sign) in ecycles])
-			assert len(R_vals) == len(R_rows) == len(R_cols)
+		index = np.full((self.size,), -1, dtype=int)
+		index[rows] = np.arange(len(rows))
 
-	return sparse.coo_matrix((R_vals, (R_rows, R_cols)), shape=(len(cyclebasis),)*2)
+		keep = index[self.__rows] >= 0
+		assert np.all(keep == (index[self.__cols] >= 0))
+		terms = (index[self.__rows[keep]], index[self.__cols[keep]], self.__terms_edge[keep], self.__terms_sign[keep])
+		return ResistanceMatrixPattern(len(rows), terms)
+
+	def patched(self, incidence, edges):
+		'''
+		Get the pattern for a modified incidence matrix, whose columns differ only for ``edges``.
+
+		Terms contributed by other edges are reused.  The result has no permutation.
+		'''
+		keep = ~np.isin(self.__terms_edge, edges)
+		new_terms = compute_resistance_terms(incidence, edges)
+		old_terms = (self.__rows, self.__cols, self.__terms_edge, self.__terms_sign)
+		terms = tuple(np.concatenate([old[keep], new]) for (old, new) in zip(old_terms, new_terms))
+		return ResistanceMatrixPattern(incidence.shape[0], terms)
+
+	def __set_layout(self, perm):
+		n = self.size
+		inverse = np.empty_like(perm)
+		inverse[perm] = np.arange(n)
+
+		# CSC stores elements sorted by column, then row.
+		keys = inverse[self.__cols] * n + inverse[self.__rows]
+		keys, self.__terms_position = np.unique(keys, return_inverse=True)
+
+		indices = keys % n
+		indptr = np.zeros((n+1,), dtype=int)
+		indptr[1:] = np.cumsum(np.bincount(keys // n, minlength=n))
+
+		self.__matrix = sparse.csc_matrix((np.zeros(len(keys)), indices, indptr), shape=(n,n))
+
+	def has_permutation(self):
+		return self.perm is not None
+
+	def set_permutation(self, perm):
+		''' Reorganize the stored matrix for a new symmetric permutation. '''
+		self.perm = np.array(perm, dtype=int)
+		self.__set_layout(self.perm)
+
+	def matrix(self, resistances):
+		'''
+		Get the (permuted) resistance matrix for an array of edge resistances, indexed
+		by edge id.
+
+		For efficiency, the returned matrix is owned by the pattern and will be overwritten
+		by the next call.  Make a copy if it needs to be kept around.
+		'''
+		values = self.__terms_sign * np.asarray(resistances)[self.__terms_edge]
+		self.__matrix.data[:] = np.bincount(self.__terms_position, weights=values,
+			minlength=self.__matrix.nnz)
+		return self.__matrix
+
+def compute_resistance_terms(incidence, edges=None):
+	# Generate terms for each edge, which are +r between cycles that cross the edge
+	#  in the same direction, and -r between cycles that cross in opposite directions.
+	# (i.e. every pair of stored elements in a column of the incidence matrix)
+	# Returns arrays (rows, cols, terms_edge, terms_sign).
+	incidence = sparse.csc_matrix(incidence)
+	if edges is None:
+		edges = np.arange(incidence.shape[1])
+	edges = np.asarray(edges, dtype=int)
+
+	starts = incidence.indptr[edges]
+	counts = incidence.indptr[edges + 1] - starts
+	nterms = counts**2
+	which  = np.repeat(np.arange(len(edges)), nterms)
+
+	k = counts[which]
+	offset = np.arange(nterms.sum()) - np.repeat(np.cumsum(nterms) - nterms, nterms)
+	first  = starts[which] + offset // k
+	second = starts[which] + offset % k
+
+	rows = incidence.indices[first].astype(int)
+	cols = incidence.indices[second].astype(int)
+	signs = incidence.data[first] * incidence.data[second]
+	return rows, cols, edges[which], signs
+
+# SuperLU options for factorizing a resistance matrix, which is symmetric positive definite;
+#  taking pivots from the diagonal keeps the factorization faithful to the chosen ordering.
+_SPLU_SYMMETRIC_OPTIONS = {
+	'diag_pivot_thresh': 0.1,
+	'options': {'SymmetricMode': True},
+}
+
+def factorize_resistance_matrix(pattern, resistances):
+	''' Factorize a resistance matrix, returning a function that solves ``R x = b``. '''
+	# special case for an empty matrix (which SuperLU does not support)
+	if pattern.size == 0:
+		return lambda b: np.array(b, dtype=float)
+
+	# The first factorization picks a fill-reducing ordering, which is saved in the pattern.
+	if not pattern.has_permutation():
+		lu = spla.splu(pattern.matrix(resistances), permc_spec='MMD_AT_PLUS_A', **_SPLU_SYMMETRIC_OPTIONS)
+
+		# the ordering of columns used by SuperLU is the inverse of perm_c
+		perm = np.empty_like(lu.perm_c)
+		perm[lu.perm_c] = np.arange(pattern.size)
+		pattern.set_permutation(perm)
+		return lu.solve
+
+	# Later factorizations reuse it.
+	lu = spla.splu(pattern.matrix(resistances), permc_spec='NATURAL', **_SPLU_SYMMETRIC_OPTIONS)
+	perm = pattern.perm
+	def solve(b):
+		x = np.empty_like(b, dtype=float)
+		x[perm] = lu.solve(np.asarray(b, dtype=float)[perm])
+		return x
+	return solve
+
+def compute_edge_update_vector(incidence, e):
+	# the column ``u`` such that changing the edge's resistance by ``dr`` changes the
+	#  resistance matrix by ``dr * u * u.T``  (as a sparse vector: indices, values)
+	lo, hi = incidence.indptr[e], incidence.indptr[e+1]
+	return incidence.indices[lo:hi], incidence.data[lo:hi]
+
+def compute_solve_rows(incidence, v_vec):
+	# Rows of the mesh equations that can have a nonzero solution.
+	#
+	# Cycles which share an edge are coupled in R; R is thus block diagonal over the
+	#  connected components of the graph in which cycles are linked by their edges.
+	#  (these correspond to the biconnected components of the circuit)
+	# Any such block whose cycles have no EMF has a solution of zero, and is left out.
+	# (``v_vec`` may also be a matrix, in which case a block is kept if it has EMF in any column)
+	n_cycles, n_edges = incidence.shape
+	coo = incidence.tocoo()
+	links = sparse.coo_matrix((np.ones(coo.nnz), (coo.row, n_cycles + coo.col)),
+		shape=(n_cycles + n_edges,)*2)
+	_, labels = csgraph.connected_components(links, directed=False)
+
+	labels = labels[:n_cycles]
+	emf = np.asarray(v_vec) != 0
+	if emf.ndim == 2:
+		emf = np.any(emf, axis=1)
+	driven = np.unique(labels[emf])
+	return np.flatnonzero(np.isin(labels, driven))
+
+def is_solved_edge(incidence, rows, e):
+	# Is the edge used by any cycle that is solved for?
+	indices, signs = compute_edge_update_vector(incidence, e)
+	return len(restrict_update_vector(rows, indices, signs)[0]) > 0
+
+def restrict_update_vector(rows, indices, values):
+	# Express a sparse vector in the numbering of the solved rows, dropping anything else.
+	# (``rows`` must be sorted)
+	positions = np.minimum(np.searchsorted(rows, indices), max(len(rows) - 1, 0))
+	solved = (rows[positions] == indices) if len(rows) else np.zeros(len(indices), dtype=bool)
+	return positions[solved], values[solved]
+
+def compute_cycle_currents(linear_solver, v_vec, rows, initial_guess=None):
+	# Solve for the given rows, leaving all others at zero.
+	# (``v_vec`` may also be a matrix, with one right hand side per column)
+	currents = np.zeros_like(v_vec, dtype=float)
 
-def compute_cycle_currents(r_mat, v_vec, cyclebasis):
 	# special case for no cycles (which otherwise makes a singular matrix)
-	if len(cyclebasis) == 0:
-		return np.array([], dtype=v_vec.dtype)
+	if len(rows) == 0:
+		return currents
+
+	if initial_guess is not None:
+		initial_guess = initial_guess[rows]
+	currents[rows] = linear_solver.solve(v_vec[rows], initial_guess).reshape(currents[rows].shape)
+	return currents
+
+class LowRankUpdatedSolver:
+	'''
+	Solves linear systems for a matrix that undergoes a series of small modifications.
+
+	The constructor takes a function which solves systems for the original matrix (e.g. the
+	output of ``spla.factorized``), along with its dimension.  Modifications of the form
+	``A += delta * u * u.T`` (for a sparse column vector ``u``) may then be registered through
+	``add_update``, and ``solve`` will account for them through the Sherman-Morrison-Woodbury
+	formula, at a cost of one solve per modification against the original factorization.
+
+	Updates are identified by keys; adding another update under an existing key accumulates
+	into the previous one (the vector ``u`` is assumed to be the same).  The number of distinct
+	keys is reported by ``rank()``, so that the owner can decide when it is time to start over
+	with a fresh factorization.
+
+	>>> a = sparse.csc_matrix(np.diag([2., 4., 8.]))
+	>>> solver = LowRankUpdatedSolver(spla.factorized(a), 3)
+	>>> solver.add_update('x', np.array([0, 2]), np.array([1., -1.]), 3.)
+	>>> x = solver.solve(np.array([1., 1., 1.]))
+	>>> updated = a.toarray() + 3. * np.array([[1,0,-1],[0,0,0],[-1,0,1]])
+	>>> np.allclose(updated.dot(x), [1., 1., 1.])
+	True
+	>>> solver.rank()
+	1
+	'''
+	def __init__(self, base_solve, size):
+		self.__size = size
+		self.__base_solve = base_solve
+
+		self.__keys   = []
+		self.__deltas = []
+		self.__us     = [] # (indices, values) of each update vector
+		self.__ainv_us = [] # A^-1 u, for each update vector
+
+	def rank(self):
+		''' Get the number of distinct update vectors. '''
+		return len(self.__keys)
+
+	def fork(self, resistances=None):
+		'''
+		Get a solver which can be updated independently of this one.
+
+		The factorization of the original matrix is shared.  (``resistances`` exists for
+		compatibility with ``PreconditionedCGSolver``, and is ignored)
+		'''
+		result = copy.copy(self)
+		result.__keys = list(self.__keys)
+		result.__deltas = list(self.__deltas)
+		result.__us = list(self.__us)
+		result.__ainv_us = list(self.__ainv_us)
+		return result
+
+	def add_update(self, key, indices, values, delta):
+		'''
+		Register the change ``A += delta * u * u.T``.
+
+		``u`` is a sparse vector described by the arrays ``indices`` and ``values``.
+		'''
+		if len(indices) == 0:
+			return # nothing to update
+
+		if key in self.__keys:
+			self.__deltas[self.__keys.index(key)] += delta
+			return
+
+		u = np.zeros((self.__size,))
+		u[indices] = values
+		self.__keys.append(key)
+		self.__deltas.append(delta)
+		self.__us.append((np.asarray(indices), np.asarray(values)))
+		self.__ainv_us.append(self.__base_solve(u))
+
+	def solve(self, b, initial_guess=None):
+		'''
+		Solve ``A x = b`` for the current (updated) matrix.
+
+		``b`` may also be a matrix, with one right hand side per column.
+		``initial_guess`` exists for compatibility with iterative solvers, and is ignored.
+		'''
+		y = self.__base_solve(b)
+		if self.rank() == 0:
+			return y
+
+		# Woodbury:  x = y - Z (I + D Uᵀ Z)⁻¹ D Uᵀ y,  where Z = A⁻¹ U, D = diag(delta)
+		z = np.column_stack(self.__ainv_us)
+		d = np.array(self.__deltas)
+		ut_z = np.array([vals.dot(z[idx]) for (idx, vals) in self.__us])
+		ut_y = np.array([vals.dot(y[idx]) for (idx, vals) in self.__us])
+
+		capacitance = np.eye(self.rank()) + d[:,None] * ut_z
+		return y - z.dot(np.linalg.solve(capacitance, (d * ut_y.T).T))
+
+class PreconditionedCGSolver:
+	'''
+	Solves systems for a resistance matrix by the preconditioned conjugate gradient method.
+
+	This is an iterative alternative to ``LowRankUpdatedSolver`` with the same interface.
+	Rather than tracking modifications to the matrix, it reads the matrix from the
+	``ResistanceMatrixPattern`` on each solve, using the ``resistances`` array that it was
+	constructed with (which is expected to be updated in place).  ``add_update`` is only
+	used to learn which parts of the preconditioner must be refreshed, so ``rank()`` is
+	always zero.
+
+	Iteration stops once the residual is below ``tol`` times the norm of the right hand
+	side.  The number of iterations used by the last solve is stored in ``iterations``.
+	(a matrix right hand side is solved one column at a time, and the total is stored)
+	'''
+	DEFAULT_TOL = 1e-10
+	DEFAULT_BLOCK_SIZE = 128
+
+	def __init__(self, pattern, resistances, *, tol=DEFAULT_TOL, block_size=DEFAULT_BLOCK_SIZE, maxiter=None):
+		self.__pattern = pattern
+		self.__resistances = resistances
+		self.__tol = tol
+		self.__maxiter = maxiter
+		self.__stale = set() # indices (in the pattern's ordering) of modified rows
+		self.iterations = None
+
+		self.__preconditioner = BlockJacobiPreconditioner(self.__matrix(), block_size)
+
+	def __matrix(self):
+		return self.__pattern.matrix(self.__resistances)
+
+	def __layout(self):
+		# maps indices in the original ordering to the pattern's ordering
+		perm = self.__pattern.perm
+		return slice(None) if perm is None else perm
+
+	def rank(self):
+		''' Always zero; updates are absorbed into the matrix as they occur. '''
+		return 0
+
+	def fork(self, resistances):
+		'''
+		Get a solver which can be updated independently of this one, for a copy of the
+		resistance array.  (the pattern is shared)
+		'''
+		result = copy.copy(self)
+		result.__resistances = resistances
+		result.__stale = set(self.__stale)
+		result.__preconditioner = self.__preconditioner.copy()
+		return result
+
+	def add_update(self, key, indices, values, delta):
+		''' Record that the matrix has been modified in the given rows and columns. '''
+		perm = self.__pattern.perm
+		if perm is not None:
+			inverse = np.empty_like(perm)
+			inverse[perm] = np.arange(len(perm))
+			indices = inverse[indices]
+		self.__stale.update(int(i) for i in indices)
+
+	def solve(self, b, initial_guess=None):
+		''' Solve ``A x = b``, starting the iteration from ``initial_guess`` if provided. '''
+		b = np.asarray(b, dtype=float)
+		if b.ndim == 2:
+			guesses = [None] * b.shape[1] if initial_guess is None else np.asarray(initial_guess).T
+			columns, iterations = [], 0
+			for column, guess in zip(b.T, guesses):
+				columns.append(self.solve(column, guess))
+				iterations += self.iterations
+			self.iterations = iterations
+			return np.column_stack(columns).reshape(b.shape)
+
+		mat = self.__matrix()
+		if self.__stale:
+			self.__preconditioner.refresh(mat, sorted(self.__stale))
+			self.__stale = set()
+
+		perm = self.__layout()
+		x0 = None if initial_guess is None else np.asarray(initial_guess, dtype=float)[perm]
+
+		y, self.iterations = preconditioned_cg(mat, b[perm], self.__preconditioner,
+			x0=x0, tol=self.__tol, maxiter=self.__maxiter)
+
+		x = np.empty_like(y)
+		x[perm] = y
+		return x
+
+class BlockJacobiPreconditioner:
+	'''
+	A block Jacobi preconditioner for a symmetric positive definite matrix.
+
+	The rows are reordered to reduce the bandwidth of the matrix (so that nearby cycles
+	tend to be numbered consecutively), and divided into blocks of ``block_size``.
+	The inverse of each diagonal block is stored densely; calling the preconditioner on
+	a vector applies all of them.  Individual blocks can be recomputed with ``refresh``
+	when the matrix is modified.
+	'''
+	def __init__(self, mat, block_size):
+		from scipy.sparse.csgraph import reverse_cuthill_mckee
+
+		n = mat.shape[0]
+		nblocks = -(-n // block_size)
+		self.__block_size = block_size
+
+		if n == 0:
+			order = np.array([], dtype=int)
+		else:
+			order = reverse_cuthill_mckee(sparse.csr_matrix(mat), symmetric_mode=True)
+
+		# position of each row within the sequence of blocks (which is padded out to a
+		#  multiple of block_size, using rows of the identity)
+		self.__slot = np.empty((n,), dtype=int)
+		self.__slot[order] = np.arange(n)
+		self.__rows_of_slot = np.full((nblocks * block_size,), -1, dtype=int)
+		self.__rows_of_slot[self.__slot] = np.arange(n)
+
+		# gather the elements inside the diagonal blocks
+		coo = sparse.coo_matrix(mat)
+		row_slot, col_slot = self.__slot[coo.row], self.__slot[coo.col]
+		keep = (row_slot // block_size) == (col_slot // block_size)
+
+		dense = np.zeros((nblocks, block_size, block_size))
+		dense[:, range(block_size), range(block_size)] = 1.
+		dense.reshape(-1, block_size)[self.__slot, self.__slot % block_size] = 0.
+		np.add.at(dense, (row_slot[keep] // block_size, row_slot[keep] % block_size, col_slot[keep] % block_size), coo.data[keep])
+
+		self.__inverses = np.linalg.inv(dense)
+
+	def copy(self):
+		result = copy.copy(self)
+		result.__inverses = self.__inverses.copy()
+		return result
+
+	def refresh(self, mat, rows):
+		''' Recompute the blocks containing the given rows from the matrix. '''
+		bs = self.__block_size
+		for block in np.unique(self.__slot[rows] // bs):
+			block_rows = self.__rows_of_slot[block*bs:(block+1)*bs]
+			valid = block_rows >= 0
+
+			dense = np.eye(bs)
+			members = block_rows[valid]
+			dense[np.ix_(valid, valid)] = mat[members][:, members].toarray()
+			self.__inverses[block] = np.linalg.inv(dense)
+
+	def __call__(self, r):
+		padded = np.zeros((self.__inverses.shape[0] * self.__block_size,))
+		padded[self.__slot] = r
+		padded = padded.reshape(self.__inverses.shape[:2])
+		z = np.einsum('bij,bj->bi', self.__inverses, padded).reshape(-1)
+		return z[self.__slot]
+
+def preconditioned_cg(mat, b, preconditioner, *, x0=None, tol, maxiter=None):
+	'''
+	Solve ``mat x = b`` by the preconditioned conjugate gradient method.
+
+	Returns ``(x, iterations)``.  ``mat`` must be symmetric positive definite.
+
+	>>> mat = sparse.csr_matrix([[4., 1.], [1., 3.]])
+	>>> x, iterations = preconditioned_cg(mat, np.array([1., 2.]), lambda r: r, tol=1e-12)
+	>>> np.allclose(mat.dot(x), [1., 2.])
+	True
+	>>> iterations <= 2
+	True
+	>>> preconditioned_cg(mat, np.array([1., 2.]), lambda r: r, x0=x, tol=1e-12)[1]
+	0
+	>>> preconditioned_cg(mat, np.zeros(2), lambda r: r, x0=x, tol=1e-12)[0].tolist()
+	[0.0, 0.0]
+	'''
+	if maxiter is None:
+		maxiter = 10 * len(b)
+
+	# (the relative tolerance below can't be met for b = 0, except by the exact solution)
+	if not np.any(b):
+		return np.zeros_like(b), 0
+
+	x = np.zeros_like(b) if x0 is None else np.array(x0)
+	r = b - mat.dot(x)
+
+	threshold = tol * np.linalg.norm(b)
+	if np.linalg.norm(r) <= threshold:
+		return x, 0
+
+	z = preconditioner(r)
+	p = z.copy()
+	rz = r.dot(z)
+	for iteration in range(1, maxiter + 1):
+		q = mat.dot(p)
+		alpha = rz / p.dot(q)
+		x += alpha * p
+		r -= alpha * q
+		if np.linalg.norm(r) <= threshold:
+			return x, iteration
+
+		z = preconditioner(r)
+		rz, old_rz = r.dot(z), rz
+		p = z + (rz / old_rz) * p
+
+	raise RuntimeError('conjugate gradient did not converge in {} iterations'.format(maxiter))
+
+def compute_edge_current(cycle_currents, incidence, e):
+	# current flowing from the edge's source
+	indices, signs = compute_edge_update_vector(incidence, e)
+	return float(signs.dot(cycle_currents[indices]))
+
+def compute_edge_currents_array(arrays, cycle_currents, incidence):
+	# currents of the living edges (in order of edge id), each flowing from its source
+	return incidence.T.dot(cycle_currents)[arrays.edge_ids()]
+
+class SpanningForest:
+	'''
+	A breadth-first spanning forest of the living part of a circuit.
+
+	Vertices are identified by node id.  For each living vertex ``v`` that is not a root,
+	``parent[v]`` is the next vertex on the way to its root, connected by the edge
+	``parent_edge[v]`` (both are ``-1`` otherwise).  ``root[v]`` identifies the tree, and
+	``levels[d]`` holds the vertices at depth ``d``.
+
+	>>> g = nx.Graph()
+	>>> g.add_path('abcd')
+	>>> arrays = CircuitArrays.from_circuit(CircuitBuilder(g).build())
+	>>> forest = SpanningForest(arrays)
+	>>> a, d = arrays.node_ids['a'], arrays.node_ids['d']
+	>>> edges, signs = forest.path(a, d)
+	>>> len(edges)
+	3
+	>>> _ = arrays.remove_node('b')
+	>>> SpanningForest(arrays).path(a, d) is None
+	True
+	'''
+	def __init__(self, arrays):
+		n = len(arrays.nodes)
+		self.parent = np.full((n,), -1, dtype=np.int64)
+		self.parent_edge = np.full((n,), -1, dtype=np.int64)
+		self.root = np.full((n,), -1, dtype=np.int64)
+		self.__src = arrays.src
+
+		rows = np.repeat(np.arange(n), np.diff(arrays.adj_ptr))
+		alive = arrays.edge_alive[arrays.adj_edges]
+		adj = sparse.csr_matrix((np.ones(np.count_nonzero(alive)), (rows[alive], arrays.adj_nodes[alive])), shape=(n,n))
+		_, labels = csgraph.connected_components(adj, directed=False)
+
+		# one root per component of living nodes
+		living = np.flatnonzero(arrays.node_alive)
+		_, first = np.unique(labels[living], return_index=True)
+		frontier = living[first]
+		self.root[frontier] = frontier
+		self.levels = []
+
+		# all trees are grown at once, one level at a time
+		while len(frontier):
+			self.levels.append(frontier)
+			lo, hi = adj.indptr[frontier], adj.indptr[frontier + 1]
+			positions = np.repeat(hi - np.cumsum(hi - lo), hi - lo) + np.arange(np.sum(hi - lo))
+			parents = np.repeat(frontier, hi - lo)
+			children = adj.indices[positions]
+
+			fresh = self.root[children] < 0
+			children, first = np.unique(children[fresh], return_index=True)
+			parents = parents[fresh][first]
+
+			self.parent[children] = parents
+			self.parent_edge[children] = arrays.find_edges(children, parents)
+			self.root[children] = self.root[parents]
+			frontier = children
+
+		self.depth = np.full((n,), -1, dtype=np.int64)
+		for d, level in enumerate(self.levels):
+			self.depth[level] = d
+
+	def parent_sign(self, vs):
+		''' Signs of the parent edges of the given vertices, for flow towards the root. '''
+		return np.where(self.__src[self.parent_edge[vs]] == vs, 1., -1.)
+
+	def path(self, a, b):
+		'''
+		Get the path in the forest between two vertices, for a flow from ``a`` to ``b``.
+
+		The result is a pair of arrays ``(edges, signs)``, where each sign is ``+1`` if the
+		flow leaves the edge's source.  ``None`` is returned if there is no path.
+		'''
+		if self.root[a] != self.root[b]:
+			return None
+
+		ups, downs = [], [] # vertices whose parent edge is crossed upwards/downwards
+		while a != b:
+			if self.depth[a] >= self.depth[b]:
+				ups.append(a)
+				a = self.parent[a]
+			else:
+				downs.append(b)
+				b = self.parent[b]
+
+		vs = np.array(ups + downs, dtype=np.int64)
+		signs = self.parent_sign(vs)
+		signs[len(ups):] *= -1.
+		return self.parent_edge[vs], signs
+
+	def accumulate(self, columns):
+		'''
+		Sum columns indexed by edge along every vertex's path to its root.
+
+		Returns ``z`` such that ``z[:,v]`` is the sum of ``sign * columns[:,e]`` over the
+		edges of that path (signed as in ``path``).
+		'''
+		z = np.zeros((columns.shape[0], len(self.parent)))
+		for level in self.levels[1:]:
+			z[:, level] = z[:, self.parent[level]] + columns[:, self.parent_edge[level]] * self.parent_sign(level)
+		return z
+
+def compute_effective_resistances(arrays, incidence, linear_solver, forest, pairs, chunk_size=64):
+	# Effective resistances for node id pairs, using a solver for the full mesh equations.
+	#
+	# A unit current from ``a`` to ``b`` can be routed along any path ``p``; the actual flow
+	#  is ``p + Cᵀ i``, for the cycle currents ``i`` that minimize the dissipated power.
+	# This gives  ``R i = -C diag(r) p``, and a power (i.e. resistance) of
+	#   ``pᵀ diag(r) p - wᵀ R⁻¹ w``, where ``w = C diag(r) p``.
+	result = np.full((len(pairs),), np.inf)
+	n_edges = len(arrays.src)
+	for start in range(0, len(pairs), chunk_size):
+		indices, rows, cols, vals = [], [], [], []
+		for k, (a, b) in enumerate(pairs[start:start+chunk_size], start=start):
+			path = forest.path(a, b)
+			if path is None:
+				continue # disconnected
+			indices.append(k)
+			rows.extend(path[0])
+			cols.extend([len(indices) - 1] * len(path[0]))
+			vals.extend(path[1])
+
+		if not indices:
+			continue
+		paths = sparse.csc_matrix((vals, (rows, cols)), shape=(n_edges, len(indices)))
+		weighted = sparse.diags(arrays.resistance).dot(paths)
+		w = incidence.dot(weighted).toarray()
+		x = linear_solver.solve(w).reshape(w.shape) if len(w) else w
+
+		power = np.asarray(paths.multiply(weighted).sum(axis=0)).reshape(-1) - np.einsum('ij,ij->j', w, x)
+		result[indices] = np.maximum(power, 0.)
+	return result
+
+def compute_resistance_embedding(arrays, incidence, linear_solver, forest, dimension, rng):
+	# Embedding of the nodes in which squared distances approximate effective resistances.
+	#
+	# The resistance between ``a`` and ``b`` is ``|diag(√r) Π p|²`` (see above), where the
+	#  projection ``Π = I - Cᵀ R⁻¹ C diag(r)`` maps any path ``p`` from ``a`` to ``b`` to
+	#  the actual flow.  Multiplying by a random matrix ``Q`` of ±1/√k approximately preserves
+	#  this norm (Johnson-Lindenstrauss); so ``G = Q diag(√r) Π`` is computed with ``k``
+	#  solves, and each node is embedded as ``G`` applied to its path to the root.
+	n_edges = len(arrays.src)
+	q = rng.choice([-1., 1.], size=(dimension, n_edges)) / np.sqrt(dimension)
+	y = q * np.sqrt(arrays.resistance)
+	w = incidence.dot(y.T)
+	x = linear_solver.solve(w).reshape(w.shape) if len(w) else w
+	g = y - incidence.T.dot(x).T * arrays.resistance
+	return forest.accumulate(g)
+
+def embedded_effective_resistances(embedding, forest, pairs):
+	pairs = np.array(pairs, dtype=np.int64).reshape((-1, 2))
+	a, b = pairs[:,0], pairs[:,1]
+	diff = embedding[:, a] - embedding[:, b]
+	return np.where(forest.root[a] == forest.root[b], np.sum(diff * diff, axis=0), np.inf)
+
+def edge_currents_dict(edges, currents):
+	# dict view of edge currents (as produced by ``get_all_currents_array``), in both directions
+	# NOTE: the guarantee that d[s,t] == -d[t,s] holds so long as d[s,t] is not NaN
+	currents = currents.tolist()
+	result = dict(zip(edges, currents))
+	result.update(zip(((t,s) for (s,t) in edges), (-x for x in currents)))
+	return result
+
+#------------------------------------------------------------
+# NodalCurrentSolver follows the same design as MeshCurrentSolver (see above), but solves
+#  for node potentials instead of cycle currents.  Its main appeal is that it has no need
+#  for a cyclebasis at all; the price is a larger (and indefinite) linear system.
+
+class NodalCurrentSolver:
+	'''
+	Computes currents in a circuit via (modified) nodal analysis.
+
+	Provides the same interface as ``MeshCurrentSolver``, but does not require a
+	cyclebasis.  Resistive components are represented as conductances (with any
+	voltage turned into a Norton equivalent current source), while components with
+	zero resistance are treated as ideal voltage sources which constrain the difference
+	in potential between their endpoints.
+
+	Named ``sources`` are supported as in ``MeshCurrentSolver``.
+	'''
+
+	DEFAULT_MAX_UPDATE_RANK = MeshCurrentSolver.DEFAULT_MAX_UPDATE_RANK
+
+	def __init__(self, circuit, *, max_update_rank=DEFAULT_MAX_UPDATE_RANK, sources=None):
+		validate_circuit(circuit)
+
+		self.__g = circuit.copy()
+		self.__max_update_rank = max_update_rank
+
+		self.__sources = dict(sources or {})
+		self.__source_names = list(self.__sources)
+		for (s, t, _) in self.__sources.values():
+			if not self.__g.has_edge(s, t):
+				raise KeyError('no such edge: {}'.format(repr((s,t))))
+
+		# used to answer connectivity queries, and to compute currents for all edges at once
+		self.__topology = CircuitArrays.from_circuit(circuit)
+
+		# Invalidate everything
+		self.__layout.invalidate()
+		self.__system_matrix.invalidate()
+		self.__source_vector.invalidate()
+		self.__source_matrix.invalidate()
+		self.__linear_solver.invalidate()
+		self.__solution.invalidate()
+		self.__source_solutions.invalidate()
+
+	def delete_node(self, v):
+		'''
+		Removes a vertex and all associated edges from the circuit.
+		'''
+		if not self.__g.has_node(v):
+			raise KeyError('No such node: {}'.format(repr(v)))
+
+		# update in-place
+		self.__g.remove_node(v)
+		self.__topology.remove_node(v)
+
+		# NOTE: there is no cyclebasis to fix; the only thing that changes is the set of rows
+		#       and columns in the system (and, if a component is split, the grounded nodes).
+		self.__layout.invalidate()
+		self.__system_matrix.invalidate()
+		self.__source_vector.invalidate()
+		self.__source_matrix.invalidate()
+		self.__linear_solver.invalidate()
+		self.__solution.invalidate()
+		self.__source_solutions.invalidate()
+
+	def multiply_edge_resistance(self, s, t, factor):
+		'''
+		Multiplies the resistance of an edge by a scalar factor.
+		'''
+		old = self.__g.edge[s][t][EATTR_RESISTANCE]
+		self.__set_edge_resistance(s, t, old * factor)
+
+	def assign_edge_resistance(self, s, t, value):
+		'''
+		Assigns a value to the resistance of an edge.
+		'''
+		self.__set_edge_resistance(s, t, value)
 
-	solver = spla.factorized(r_mat.tocsc())
-	return solver(v_vec).reshape([len(cyclebasis)])
+	def fork(self):
+		'''
+		Create an independent solver in the same state.  (see ``MeshCurrentSolver.fork``)
+		'''
+		result = copy.copy(self)
+		result.__g = self.__g.copy()
+		result.__topology = self.__topology.fork()
+
+		# things which are modified in place
+		if self.__source_vector.is_cached():
+			result.__source_vector.put(self.__source_vector.get().copy())
+		if self.__linear_solver.is_cached():
+			result.__linear_solver.put(self.__linear_solver.get().fork())
+		return result
+
+	def __set_edge_resistance(self, s, t, value):
+		attrs = self.__g.edge[s][t]
+		old = attrs[EATTR_RESISTANCE]
+		attrs[EATTR_RESISTANCE] = value
+		self.__topology.resistance[self.__topology.edge_id(s, t)] = value
+
+		# An edge switching between resistor and ideal source changes the shape of the system.
+		if (old == 0.) != (value == 0.):
+			self.__layout.invalidate()
+			self.__system_matrix.invalidate()
+			self.__source_vector.invalidate()
+			self.__source_matrix.invalidate()
+			self.__linear_solver.invalidate()
+			self.__solution.invalidate()
+			self.__source_solutions.invalidate()
+			return
+
+		if old == value == 0.:
+			return # nothing to do!
+
+		self.__layout         # still valid!
+		self.__system_matrix.invalidate()
+		self.__solution.invalidate()
+
+		# NOTE: for simplicity, these are not updated in place (there are usually few sources)
+		self.__source_matrix.invalidate()
+		self.__source_solutions.invalidate()
+
+		# update in-place (if there is anything to update)
+		src = attrs[EATTR_SOURCE]
+		dest = t if src == s else s
+		if self.__source_vector.is_cached():
+			update_nodal_source_vector(self.__source_vector.get(), self.__layout.get(),
+				src, dest, attrs[EATTR_VOLTAGE], old, value)
+
+		if self.__linear_solver.is_cached():
+			solver = self.__linear_solver.get()
+			indices, signs = compute_nodal_update_vector(self.__layout.get(), src, dest)
+			solver.add_update(frozenset([s,t]), indices, signs, 1./value - 1./old)
+
+			if solver.rank() > self.__max_update_rank:
+				self.__linear_solver.invalidate()
+
+	def node_neighbors(self, v):
+		'''
+		Get the immediate neighbors of a node.
+		'''
+		return self.__g.neighbors(v)
 
-def compute_single_edge_current(g, cycle_currents, cycles_from_edge, s, t):
-	ecycles = edictget(cycles_from_edge, (s,t))
-	esign   = circuit_edge_sign(g, s, t)
-	return esign * sum(cycle_currents[i] * csign for i, csign in ecycles)
+	def node_exists(self, v):
+		'''
+		Determine if a node exists in the circuit. (Boolean)
+		'''
+		return self.__g.has_node(v)
+
+	def circuit(self):
+		'''
+		Get a copy of the current state of the circuit.
+		'''
+		return self.__g.copy()
+
+	def has_alternate_path(self, s, t):
+		'''
+		Determine whether ``s`` and ``t`` are connected by any path besides the edge ``(s,t)``.
+
+		When this is ``False``, no current can flow through the edge.  The answer is
+		maintained through node deletions, and takes constant time after the first query.
+		'''
+		return self.__topology.has_alternate_path(s, t)
+
+	@cached_property
+	def __layout(self):
+		return NodalLayout(self.__g)
+
+	@cached_property
+	def __system_matrix(self):
+		return compute_nodal_system_matrix(self.__g, self.__layout.get())
+
+	@cached_property
+	def __source_vector(self):
+		return compute_nodal_source_vector(self.__g, self.__layout.get())
+
+	# One column per named source.
+	@cached_property
+	def __source_matrix(self):
+		sources = [self.__sources[name] for name in self.__source_names]
+		return compute_nodal_source_matrix(self.__g, self.__layout.get(), sources)
+
+	@cached_property
+	def __linear_solver(self):
+		size = self.__layout.get().size
+		return LowRankUpdatedSolver(factorize_nodal_system(self.__system_matrix.get()), size)
+
+	@cached_property
+	def __solution(self):
+		return self.__linear_solver.get().solve(self.__source_vector.get())
+
+	# One column per named source, with the edges of the other sources open.
+	@cached_property
+	def __source_solutions(self):
+		sources = [self.__sources[name] for name in self.__source_names]
+		mat = self.__source_matrix.get()
+		slack_rhs, constraints, slack = compute_nodal_opening_terms(self.__g, self.__layout.get(), sources)
+
+		rhs = np.column_stack([mat, slack_rhs])
+		solutions = self.__linear_solver.get().solve(rhs).reshape(rhs.shape)
+		return open_other_sources(solutions[:, :len(sources)], solutions[:, len(sources):],
+			constraints, slack, [self.__source_edge(name) for name in self.__source_names])
+
+	def __source_edge(self, name):
+		s, t, _ = self.__sources[name]
+		return frozenset([s,t]) if self.__g.has_edge(s,t) else None
+
+	# Edges ``(s,t)`` which are left open while the named source is active.
+	def __open_edges(self, name):
+		active = self.__source_edge(name)
+		result = []
+		for other in self.__source_names:
+			s, t, _ = self.__sources[other]
+			if self.__source_edge(other) not in (None, active):
+				result.append((s,t))
+		return result
+
+	def get_edges(self):
+		'''
+		Get a list of all edges ``(s,t)``, in the order used by ``get_all_currents_array``.
+
+		Each edge is oriented so that ``s`` is the source of its voltage.  The order is stable;
+		deleting nodes only removes edges from the list, without reordering the rest.
+		'''
+		return [self.__topology.edge_endpoints(e) for e in self.__topology.edge_ids()]
+
+	def get_all_currents_array(self):
+		'''
+		Compute all currents in the circuit, as an array.
+
+		Element ``i`` of the returned array is the current flowing from ``s`` to ``t``, where
+		``(s,t) = self.get_edges()[i]``.
+		'''
+		arrays = self.__topology
+		voltage = arrays.voltage[arrays.edge_ids()]
+		return compute_nodal_edge_currents_array(arrays, self.__layout.get(), self.__solution.get(), voltage)
+
+	def get_all_currents(self):
+		'''
+		Compute all currents in the circuit.
+
+		The return value is a dict ``d`` such that ``d[s,t]`` (for an existing edge ``(s,t)``)
+		is the (signed) current that flows from ``s`` to ``t``. It is guaranteed that
+		``d[s,t] == -(d[t,s])``.
+		'''
+		return edge_currents_dict(self.get_edges(), self.get_all_currents_array())
+
+	def get_current(self, s, t):
+		'''
+		Compute signed current current flowing from ``s`` to ``t``.
+
+		It is a ``KeyError`` if no such edge exists in the graph.
+		'''
+		if not self.__g.has_edge(s,t):
+			raise KeyError('no such edge: {}'.format(repr((s,t))))
+		return compute_nodal_edge_current(self.__g, self.__layout.get(), self.__solution.get(), s, t)
+
+	def source_names(self):
+		'''
+		Get the names of the voltage sources given to the constructor, in order.
+		'''
+		return list(self.__source_names)
+
+	def get_all_source_currents_array(self):
+		'''
+		Compute all currents in the circuit under each of the named sources, as an array.
+
+		Element ``[i,k]`` of the returned array is the current flowing from ``s`` to ``t``
+		when the circuit is driven by the source ``self.source_names()[k]`` alone, where
+		``(s,t) = self.get_edges()[i]``.
+		'''
+		arrays = self.__topology
+		edges = arrays.edge_ids()
+
+		# the only edge with a voltage is the source itself
+		voltage = np.zeros((len(edges), len(self.__source_names)))
+		for k, name in enumerate(self.__source_names):
+			source_s, source_t, source_voltage = self.__sources[name]
+			e = arrays.edge_id(source_s, source_t, default=None)
+			if e is not None:
+				voltage[np.searchsorted(edges, e), k] = arrays.edge_sign(e, source_s) * source_voltage
+
+		currents = compute_nodal_edge_currents_array(arrays, self.__layout.get(),
+			self.__source_solutions.get(), voltage)
+
+		# (an open resistor still has a potential difference across it)
+		for k, name in enumerate(self.__source_names):
+			for (s,t) in self.__open_edges(name):
+				currents[np.searchsorted(edges, arrays.edge_id(s, t)), k] = 0.
+		return currents
+
+	def get_source_current(self, name, s, t):
+		'''
+		Compute signed current flowing from ``s`` to ``t`` when the circuit is driven by
+		the named source alone.
+
+		It is a ``KeyError`` if no such edge or source exists.
+		'''
+		source_s, source_t, source_voltage = self.__sources[name]
+		if not self.__g.has_edge(s,t):
+			raise KeyError('no such edge: {}'.format(repr((s,t))))
+
+		if frozenset([s,t]) in map(frozenset, self.__open_edges(name)):
+			return 0.
+
+		# the only edge with a voltage is the source itself
+		voltage = 0.
+		if set((s,t)) == set((source_s, source_t)):
+			voltage = circuit_edge_sign(self.__g, source_s, source_t) * source_voltage
+
+		solution = self.__source_solutions.get()[:, self.__source_names.index(name)]
+		return compute_nodal_edge_current(self.__g, self.__layout.get(), solution, s, t, voltage=voltage)
+
+#------------------------------------------------------------
+
+# Functions which actually compute stuff for NodalCurrentSolver.
+
+class NodalLayout:
+	'''
+	Assigns rows of the modified nodal analysis system to nodes and ideal sources.
+
+	One node in each connected component is grounded (fixed at zero potential) and has no
+	row; without this, the system would be singular.  The remaining nodes are followed by
+	one row for the current through each ideal voltage source (edge of zero resistance).
+	'''
+	def __init__(self, g):
+		self.grounded = set(min(comp, key=repr) for comp in nx.connected_components(g))
+
+		nodes = [v for v in g if v not in self.grounded]
+		self.node_count = len(nodes)
+		self.node_indices = {v:i for (i,v) in enumerate(nodes)}
+
+		ideal = [(s,t) for (s,t) in g.edges() if g.edge[s][t][EATTR_RESISTANCE] == 0.]
+		self.source_indices = {}
+		for i,(s,t) in enumerate(ideal, start=self.node_count):
+			self.source_indices[s,t] = i
+			self.source_indices[t,s] = i
+
+		self.size = self.node_count + len(ideal)
+
+def compute_nodal_system_matrix(g, layout):
+	idx = layout.node_indices
+	rows, cols, vals = [], [], []
+	def put(i, j, x):
+		if i is not None and j is not None:
+			rows.append(i); cols.append(j); vals.append(x)
 
-def compute_all_edge_currents(g, cycle_currents, cycles_from_edge):
-	result = {}
 	for s,t in g.edges():
-		result[s,t] = compute_single_edge_current(g, cycle_currents, cycles_from_edge, s, t)
+		a, b = idx.get(s), idx.get(t) # None for grounded nodes
+		resistance = g.edge[s][t][EATTR_RESISTANCE]
 
-	result.update({(t,s):-value for (s,t),value in result.items()})
+		if resistance == 0.:
+			# current through the source leaves s and enters t;  the matching row
+			#  constrains the potential difference across it
+			k = layout.source_indices[s,t]
+			sign = circuit_edge_sign(g, s, t)
+			for i,x in [(a, sign), (b, -sign)]:
+				put(i, k, x)
+				put(k, i, x)
+		else:
+			conductance = 1. / resistance
+			put(a, a, conductance)
+			put(b, b, conductance)
+			put(a, b, -conductance)
+			put(b, a, -conductance)
+
+	return sparse.coo_matrix((vals, (rows, cols)), shape=(layout.size,)*2)
+
+def compute_nodal_source_vector(g, layout):
+	result = np.zeros((layout.size,))
+	for s,t in g.edges():
+		add_nodal_emf(result, g, layout, s, t, g.edge[s][t][EATTR_VOLTAGE])
 	return result
 
+def compute_nodal_source_matrix(g, layout, sources):
+	# One column for each source ``(s, t, voltage)`` acting alone (see ``make_battery``).
+	# (a source whose edge no longer exists has a column of zeros)
+	result = np.zeros((layout.size, len(sources)))
+	for k, (s, t, voltage) in enumerate(sources):
+		if g.has_edge(s, t):
+			add_nodal_emf(result[:,k], g, layout, s, t, circuit_edge_sign(g, s, t) * voltage)
+	return result
+
+def compute_nodal_opening_terms(g, layout, sources):
+	# The terms used by ``open_other_sources`` to open the edge of each source ``(s, t, voltage)``:
+	#  columns of slack for the right hand side, columns of constraints, and slack coefficients.
+	# A resistor is opened by injecting the current that it carries back into its endpoints,
+	#  while an ideal source is opened by releasing the row of its constraint and holding its
+	#  current at zero.  (a source whose edge no longer exists has columns of zeros)
+	slack_rhs = np.zeros((layout.size, len(sources)))
+	constraints = np.zeros((layout.size, len(sources)))
+	slack = np.zeros((len(sources),))
+	for k, (s, t, _) in enumerate(sources):
+		if not g.has_edge(s, t):
+			continue
+		attrs = g.edge[s][t]
+		if attrs[EATTR_RESISTANCE] == 0.:
+			i = layout.source_indices[s,t]
+			slack_rhs[i,k] = constraints[i,k] = 1.
+		else:
+			src  = attrs[EATTR_SOURCE]
+			dest = t if src == s else s
+			indices, signs = compute_nodal_update_vector(layout, src, dest)
+			slack_rhs[indices,k] = signs
+			constraints[indices,k] = signs / attrs[EATTR_RESISTANCE]
+			slack[k] = 1.
+	return slack_rhs, constraints, slack
+
+def add_nodal_emf(vec, g, layout, s, t, voltage):
+	# Add the voltage of an edge (directed away from its source) to a source vector.
+	attrs = g.edge[s][t]
+	src  = attrs[EATTR_SOURCE]
+	dest = t if src == s else s
+	if attrs[EATTR_RESISTANCE] == 0.:
+		# potential rises by the voltage from src to dest
+		vec[layout.source_indices[s,t]] = -voltage
+	else:
+		update_nodal_source_vector(vec, layout, src, dest, voltage, None, attrs[EATTR_RESISTANCE])
+
+def update_nodal_source_vector(vec, layout, src, dest, voltage, old_resistance, new_resistance):
+	# Norton equivalent:  a current of V/r is pushed out of src and into dest
+	old = 0. if old_resistance is None else voltage / old_resistance
+	delta = voltage / new_resistance - old
+	if src in layout.node_indices:  vec[layout.node_indices[src]]  -= delta
+	if dest in layout.node_indices: vec[layout.node_indices[dest]] += delta
+
+def compute_nodal_update_vector(layout, s, t):
+	# the vector ``u`` such that changing an edge's conductance by ``dg`` changes the
+	#  system matrix by ``dg * u * u.T``  (as a sparse vector: indices, values)
+	pairs = [(layout.node_indices[v], x) for (v,x) in [(s, 1.), (t, -1.)] if v in layout.node_indices]
+	indices = np.array([i for (i,_) in pairs], dtype=int)
+	signs   = np.array([x for (_,x) in pairs], dtype=float)
+	return indices, signs
+
+def factorize_nodal_system(mat):
+	# special case for an empty matrix (which SuperLU does not support)
+	if mat.shape[0] == 0:
+		return lambda b: np.array(b, dtype=float)
+	return spla.factorized(sparse.csc_matrix(mat))
+
+def compute_nodal_edge_current(g, layout, solution, s, t, voltage=None):
+	# (``voltage`` overrides the edge's own voltage, e.g. for the solution of a named source)
+	attrs = g.edge[s][t]
+	if voltage is None:
+		voltage = attrs[EATTR_VOLTAGE]
+	esign = circuit_edge_sign(g, s, t)
+	if attrs[EATTR_RESISTANCE] == 0.:
+		return esign * solution[layout.source_indices[s,t]]
+
+	def potential(v):
+		i = layout.node_indices.get(v)
+		return 0. if i is None else solution[i]
+
+	src  = attrs[EATTR_SOURCE]
+	dest = t if src == s else s
+	current = (potential(src) - potential(dest) + voltage) / attrs[EATTR_RESISTANCE]
+	return esign * current
+
+def compute_nodal_edge_currents_array(arrays, layout, solution, voltage):
+	# currents of the living edges (in order of edge id), each flowing from its source.
+	# ``solution`` may hold several solutions as columns, in which case ``voltage`` (the voltage
+	#  of each living edge) has a matching column for each.
+	edges = arrays.edge_ids()
+	src, dst = arrays.src[edges], arrays.dst[edges]
+	resistance = arrays.resistance[edges]
+
+	# potentials of all nodes (zero for grounded and dead nodes)
+	ids = np.array([arrays.node_ids[v] for v in layout.node_indices], dtype=np.int64)
+	rows = np.array(list(layout.node_indices.values()), dtype=np.int64)
+	potential = np.zeros((len(arrays.nodes),) + solution.shape[1:])
+	potential[ids] = solution[rows]
+
+	ideal = resistance == 0.
+	divisor = np.where(ideal, 1., resistance)
+	if solution.ndim > 1:
+		divisor = divisor[:, None]
+	currents = (potential[src] - potential[dst] + voltage) / divisor
+
+	# ideal sources carry a current of their own in the solution
+	for j in np.flatnonzero(ideal):
+		s, t = arrays.edge_endpoints(edges[j])
+		currents[j] = solution[layout.source_indices[s,t]]
+	return currents
+
 #------------------------------------------------------------
 
 # more ergonomic than MeshCurrentSolver when there's no need to update the graph
@@ -577,12 +2536,22 @@ def compute_circuit_currents(circuit, cyclebasis=None):
 	is the (signed) current that flows from ``s`` to ``t``. It is guaranteed that
 	``d[s,t] == -(d[t,s])``.
 
-	If no cyclebasis is provided, one will be automatically generated.  For large graphs,
+	If no cyclebasis is provided, the circuit is first simplified by ``reduce_circuit``,
+	and a cyclebasis is automatically generated for what remains.  For large graphs,
 	however, the computation time can be significantly reduced by providing a custom
 	cyclebasis with a small total edge count.
+
+	NOTE: A provided cyclebasis describes the circuit as given, so in that case the
+	circuit is solved as is, with no reduction at all.  The same goes for
+	``MeshCurrentSolver`` (and thus the trial runner), which must keep every node
+	around so that it can be deleted.  Large circuits with a provided cyclebasis get no
+	benefit from ``reduce_circuit``, unless the caller reduces the circuit first and
+	provides a cyclebasis for the reduced circuit.
 	'''
 	if cyclebasis is None:
-		cyclebasis = gcb.last_resort(circuit)
+		reduction = reduce_circuit(circuit)
+		d = compute_circuit_currents(reduction.circuit, gcb.last_resort(reduction.circuit))
+		return reduction.expand_currents(d)
 
 	solver = MeshCurrentSolver(circuit, cyclebasis, gcb.dummy_cbupdater())
 
@@ -590,6 +2559,230 @@ def compute_circuit_currents(circuit, cyclebasis=None):
 	assert all(d[t,s] == -d[s,t] for s,t in d)
 	return d
 
+def compute_circuit_currents_batch(items, *, processes=None, max_in_flight=None):
+	'''
+	Computes the currents of many independent circuits in worker processes.
+
+	Each item is a circuit, the path of a circuit file (see ``load_circuit``), or a pair
+	``(circuit, cyclebasis)`` of either of these with a cyclebasis (possibly ``None``) for
+	``compute_circuit_currents``.  Paths are read by the workers.
+
+	This is a generator of ``(index, currents)`` pairs, where ``index`` is the position of
+	the item in ``items``, and ``currents`` is what ``compute_circuit_currents`` returns for
+	it.  Results are produced in order of completion.  At most ``max_in_flight`` items
+	(default: twice the number of processes) are taken from ``items`` before their results
+	have been consumed, so that ``items`` may be a lazy sequence of arbitrary length.
+	An exception raised for an item is raised again when its result would be produced.
+	'''
+	import concurrent.futures as cf
+
+	if processes is None:
+		processes = os.cpu_count() or 1
+	if max_in_flight is None:
+		max_in_flight = 2 * processes
+	if max_in_flight < 1:
+		raise ValueError('max_in_flight must be at least 1')
+
+	items = enumerate(items)
+	with cf.ProcessPoolExecutor(processes) as pool:
+		pending = set()
+		exhausted = False
+		while pending or not exhausted:
+			while not exhausted and len(pending) < max_in_flight:
+				try:
+					index, item = next(items)
+				except StopIteration:
+					exhausted = True
+					break
+
+				if isinstance(item, tuple):
+					circuit, cyclebasis = item
+				else:
+					circuit, cyclebasis = item, None
+				pending.add(pool.submit(_compute_circuit_currents_job, index, circuit, cyclebasis))
+
+			if not pending:
+				break
+
+			done, pending = cf.wait(pending, return_when=cf.FIRST_COMPLETED)
+			for future in done:
+				yield future.result()
+
+# worker for compute_circuit_currents_batch
+def _compute_circuit_currents_job(index, circuit, cyclebasis):
+	if isinstance(circuit, str):
+		circuit = load_circuit(circuit)
+	return index, compute_circuit_currents(circuit, cyclebasis)
+
+#------------------------------------------------------------
+# Series-parallel reduction
+
+def reduce_circuit(circuit, keep=()):
+	'''
+	Simplify a circuit by collapsing series chains and parallel edges.
+
+	Returns a ``SeriesParallelReduction``, whose ``circuit`` is equivalent to the input
+	as seen from the nodes that remain.  Nodes are eliminated as follows (except for those
+	in ``keep``, which are never eliminated):
+
+	* A node with one neighbor is removed along with its edge, which carries no current.
+	* A node with two neighbors ``a`` and ``b`` is removed, and its two edges are replaced
+	  by a single edge in series.  If ``a`` and ``b`` were already connected, that edge
+	  is combined in parallel with the new one (unless either has zero resistance, in
+	  which case the node is left alone).
+
+	The currents of the original circuit can be recovered from those of the reduced
+	circuit through ``expand_currents``.
+
+	>>> g = nx.Graph()
+	>>> g.add_path('abcd')
+	>>> g.add_path('axd')
+	>>> builder = CircuitBuilder(g)
+	>>> builder.make_battery('a', 'b', 3.0)
+	>>> for s,t in ['bc', 'cd', 'ax', 'xd']:
+	...     builder.make_resistor(s, t, 1.0)
+	>>> reduction = reduce_circuit(builder.build(), keep=['a', 'b'])
+	>>> sorted(reduction.circuit.nodes()) # 'c' stays, as nothing is parallel to a battery
+	['a', 'b', 'c']
+	>>> currents = reduction.expand_currents(compute_circuit_currents(reduction.circuit))
+	>>> float(currents['a','b']), float(currents['x','d'])
+	(0.75, -0.75)
+	'''
+	validate_circuit(circuit)
+	keep = set(keep)
+
+	g = _copy_graph_without_attributes(circuit)
+	for s,t in circuit.edges():
+		attrs = circuit.edge[s][t]
+		src = attrs[EATTR_SOURCE]
+		dest = t if src == s else s
+		branch = _Branch(_Branch.LEAF, (src, dest), attrs[EATTR_RESISTANCE], attrs[EATTR_VOLTAGE])
+		g.edge[s][t]['branch'] = (branch, src)
+
+	def oriented(u, w):
+		# the branch on an edge, and its sign when traversed from u to w
+		branch, start = g.edge[u][w]['branch']
+		return branch, (1. if start == u else -1.)
+
+	dead = [] # branches that carry no current
+	queue = [v for v in g if v not in keep]
+	while queue:
+		v = queue.pop()
+		if v in keep or not g.has_node(v):
+			continue
+
+		neighbors = g.neighbors(v)
+		if len(neighbors) > 2:
+			continue
+
+		if len(neighbors) == 1:
+			dead.append(oriented(v, neighbors[0])[0])
+
+		elif len(neighbors) == 2:
+			a, b = neighbors
+			branch = _Branch.series([oriented(a, v), oriented(v, b)])
+			if g.has_edge(a, b):
+				other, sign = oriented(a, b)
+				if branch.resistance == 0. or other.resistance == 0.:
+					continue # no parallel equivalent
+				branch = _Branch.parallel([(branch, 1.), (other, sign)])
+			g.add_edge(a, b, branch=(branch, a))
+
+		g.remove_node(v)
+		queue.extend(neighbors)
+
+	builder = CircuitBuilder(g)
+	branches = []
+	for s,t in g.edges():
+		branch, start = g.edge[s][t]['branch']
+		end = t if start == s else s
+		builder.make_component(start, end, resistance=branch.resistance, voltage=branch.voltage)
+		branches.append(((start, end), branch))
+	for v in g:
+		builder.add_node(v)
+
+	return SeriesParallelReduction(builder.build(), branches, dead)
+
+class SeriesParallelReduction:
+	'''
+	The result of ``reduce_circuit``.
+
+	``circuit`` is the reduced circuit.  Each of its edges stands for a series-parallel
+	combination of edges in the original circuit.
+	'''
+	def __init__(self, circuit, branches, dead):
+		self.circuit = circuit
+		self.__branches = branches # ((s,t), _Branch), oriented from the source of each edge
+		self.__dead = dead
+
+	def expand_currents(self, currents):
+		'''
+		Compute the currents of the original circuit from those of the reduced circuit.
+
+		``currents`` is a dict such as the output of ``compute_circuit_currents`` (only one
+		direction of each edge is needed).  The output is in the same format, for the edges
+		of the original circuit.
+		'''
+		result = {}
+		for (s,t), branch in self.__branches:
+			current = currents[s,t] if (s,t) in currents else -currents[t,s]
+			branch.expand(current, result)
+
+		# NOTE: a dead branch may still have current circulating inside of it
+		for branch in self.__dead:
+			branch.expand(0., result)
+
+		result.update({(t,s):-x for ((s,t),x) in list(result.items())})
+		return result
+
+class _Branch:
+	# A series-parallel combination of edges from an original circuit, oriented so that
+	#  ``voltage`` and currents are positive from its first to its last node.
+	# ``parts`` is a list of ``(branch, sign)`` (where ``sign`` is negative for any part
+	#  that runs the other way), or a single edge ``(src, dest)`` for a LEAF.
+	LEAF, SERIES, PARALLEL = range(3)
+
+	def __init__(self, kind, parts, resistance, voltage):
+		self.kind = kind
+		self.parts = parts
+		self.resistance = resistance
+		self.voltage = voltage
+
+	@classmethod
+	def series(cls, parts):
+		flat = []
+		for branch, sign in parts:
+			if branch.kind == cls.SERIES:
+				flat.extend((child, sign * inner) for (child, inner) in branch.parts)
+			else:
+				flat.append((branch, sign))
+		resistance = sum(branch.resistance for (branch, _) in flat)
+		voltage = sum(sign * branch.voltage for (branch, sign) in flat)
+		return cls(cls.SERIES, flat, resistance, voltage)
+
+	@classmethod
+	def parallel(cls, parts):
+		# Thevenin equivalent of branches connected across the same two nodes
+		conductance = sum(1. / branch.resistance for (branch, _) in parts)
+		current = sum(sign * branch.voltage / branch.resistance for (branch, sign) in parts)
+		return cls(cls.PARALLEL, parts, 1. / conductance, current / conductance)
+
+	def expand(self, current, out):
+		# Write the currents of the original edges into ``out``, given the current through
+		#  this branch.  (iterative, as long chains produce deeply nested branches)
+		stack = [(self, current)]
+		while stack:
+			branch, current = stack.pop()
+			if branch.kind == _Branch.LEAF:
+				out[branch.parts] = current
+			elif branch.kind == _Branch.SERIES:
+				stack.extend((child, sign * current) for (child, sign) in branch.parts)
+			else:
+				# all parts see the same drop in potential  (current = (drop + V) / R)
+				drop = current * branch.resistance - branch.voltage
+				for child, sign in branch.parts:
+					stack.append((child, sign * (drop + sign * child.voltage) / child.resistance))
+
 #------------------------------------------------------------
 
 def _copy_graph_without_attributes(g):
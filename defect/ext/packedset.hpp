@@ -0,0 +1,125 @@
+#pragma once
+
+#include <algorithm> // minmax_element
+#include <cstddef>
+#include <cstdint>
+#include <vector>
+
+// A long binary vector, represented as packed 64-bit words.
+//
+// Only the words between the first and last nonzero words are stored, so the memory
+//  used is proportional to the span of the set bits rather than to the full width.
+// XOR is a loop over words, and the least element (the "leading one") is found with
+//  a count of trailing zeros.
+class PackedSet
+{
+public:
+	typedef uint64_t word_t;
+	static const size_t WORD_BITS = 64;
+
+private:
+	size_t offset;             // index of the first stored word
+	std::vector<word_t> words; // first and last words are nonzero (or there are none)
+
+public:
+	PackedSet()
+	: offset(0)
+	, words()
+	{ }
+
+	// (an element listed twice cancels out)
+	template <typename Range>
+	explicit PackedSet(const Range & r)
+	: PackedSet()
+	{
+		if (r.begin() == r.end())
+			return;
+
+		auto bounds = std::minmax_element(r.begin(), r.end());
+		offset = *bounds.first / WORD_BITS;
+		words.assign(*bounds.second / WORD_BITS - offset + 1, 0);
+		for (auto x : r)
+			words[x / WORD_BITS - offset] ^= word_t(1) << (x % WORD_BITS);
+		trim();
+	}
+
+	bool empty() const { return words.empty(); }
+
+	// WARNING: Undefined behavior on empty set
+	size_t front() const {
+		return offset * WORD_BITS + __builtin_ctzll(words.front());
+	}
+
+	bool contains(size_t x) const {
+		size_t w = x / WORD_BITS;
+		if (w < offset || w >= offset + words.size())
+			return false;
+		return (words[w - offset] >> (x % WORD_BITS)) & 1u;
+	}
+
+	bool operator==(const PackedSet & other) const {
+		return offset == other.offset && words == other.words;
+	}
+
+	PackedSet & operator^=(const PackedSet & other)
+	{
+		if (other.empty())
+			return *this;
+		if (empty())
+			return *this = other;
+
+		size_t lo = std::min(offset, other.offset);
+		size_t hi = std::max(offset + words.size(), other.offset + other.words.size());
+		if (lo < offset || hi > offset + words.size()) {
+			std::vector<word_t> grown(hi - lo, 0);
+			std::copy(words.cbegin(), words.cend(), grown.begin() + (offset - lo));
+			words.swap(grown);
+			offset = lo;
+		}
+
+		word_t * dest = words.data() + (other.offset - offset);
+		for (size_t i = 0; i < other.words.size(); i++)
+			dest[i] ^= other.words[i];
+
+		trim();
+		return *this;
+	}
+
+	// Elements in descending order (the order used by MinVecSet).
+	template <typename T>
+	std::vector<T> elements() const {
+		std::vector<T> result;
+		for (size_t i = words.size(); i --> 0 ;) {
+			word_t word = words[i];
+			while (word) {
+				size_t bit = WORD_BITS - 1 - __builtin_clzll(word);
+				result.push_back(T((offset + i) * WORD_BITS + bit));
+				word &= ~(word_t(1) << bit);
+			}
+		}
+		return result;
+	}
+
+private:
+	// Drop zero words from both ends.
+	void trim()
+	{
+		size_t start = 0;
+		while (start < words.size() && words[start] == 0)
+			start++;
+
+		if (start == words.size()) {
+			words.clear();
+			offset = 0;
+			return;
+		}
+
+		size_t stop = words.size();
+		while (words[stop-1] == 0)
+			stop--;
+
+		words.erase(words.begin() + stop, words.end());
+		words.erase(words.begin(), words.begin() + start);
+		offset += start;
+	}
+};
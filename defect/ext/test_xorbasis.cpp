@@ -131,12 +131,124 @@ void test_xorbasis_remove_ids(int n) {
 	assert(before == after);
 }
 
+// Removing vectors should leave a valid basis for the remaining vectors (with zero sums),
+//  in which every row is the sum of the original rows named by its aug.
+void test_xorbasis_remove_ids_ref(int n) {
+	_XorBasisBuilder xorb;
+	RowV originals = random_matrix(3*n, 2*n); // more rows than columns, for zero sums
+	vector<identity_t> remaining = xorb.add_many(originals);
+
+	for (int round = 0; round < 3; round++) {
+		vector<identity_t> removed, kept;
+		for (auto id : remaining)
+			(rand() % 4 ? kept : removed).push_back(id);
+		xorb.remove_ids(removed);
+		remaining = kept;
+
+		_XorBasisBuilder fresh;
+		RowV kept_rows;
+		for (auto id : kept)
+			kept_rows.push_back(originals[id]);
+		fresh.add_many(kept_rows);
+
+		const RowV & rows = xorb.get_rows();
+		const AugV & augs = xorb.get_augs();
+		assert(is_ref(rows));
+		assert(rows.size() == kept.size());
+		assert(ref_rank(rows) == ref_rank(fresh.get_rows()));
+		assert(xorb.get_zero_sums().size() == fresh.get_zero_sums().size());
+
+		for (size_t i = 0; i < rows.size(); i++) {
+			assert(!augs[i].empty());
+			Row sum;
+			for (auto id : augs[i]) {
+				assert(std::find(kept.begin(), kept.end(), id) != kept.end());
+				sum ^= originals[id];
+			}
+			assert(sum == rows[i]);
+		}
+	}
+}
+
+// A dependent row given to add_if_linearly_independent consumes no identity, so the
+//  next row gets the identity it would have had, and no zero sum is left behind.
+template <typename Builder>
+void test_rejected_identity() {
+	Builder xorb;
+	assert(xorb.add(R{1, 2}) == 0u);
+	assert(xorb.add(R{2, 3}) == 1u);
+
+	auto rejected = xorb.add_if_linearly_independent(R{1, 3});
+	assert(!rejected.first);
+	assert(xorb.get_next_identity() == 2u);
+	assert(xorb.get_original_rows().size() == 2u);
+
+	auto accepted = xorb.add_if_linearly_independent(R{4});
+	assert(accepted == make_pair(true, identity_t(2)));
+	assert(xorb.get_zero_sums().empty());
+
+	// an unconditional add of a dependent row does use an identity
+	assert(xorb.add(R{1, 3}) == 3u);
+	assert(xorb.get_zero_sums() == (vector<vector<identity_t>>{ A{3, 1, 0} }));
+}
+
+vector<column_t> random_columns (size_t n) {
+	Row row = random_row(n);
+	return { row.cbegin(), row.cend() };
+}
+
+// The packed engine must reproduce the sparse engine's state exactly.
+void test_packed_matches_sparse(int n) {
+	_XorBasisBuilder sparse;
+	_PackedXorBasisBuilder packed;
+	vector<identity_t> remaining;
+
+	for (int step = 0; step < 6*n; step++) {
+		// (wide enough that rows span several words)
+		vector<column_t> columns = random_columns(3*n);
+		switch (rand() % 4) {
+		case 0:
+		case 1: {
+			identity_t id = sparse.add(columns);
+			assert(packed.add(columns) == id);
+			remaining.push_back(id);
+			break;
+		}
+		case 2: {
+			auto result = sparse.add_if_linearly_independent(columns);
+			assert(packed.add_if_linearly_independent(columns) == result);
+			if (result.first)
+				remaining.push_back(result.second);
+			break;
+		}
+		case 3: {
+			vector<identity_t> removed, kept;
+			for (auto id : remaining)
+				(rand() % 3 ? kept : removed).push_back(id);
+			sparse.remove_ids(removed);
+			packed.remove_ids(removed);
+			remaining = kept;
+			break;
+		}
+		}
+
+		assert(sparse.get_row_columns() == packed.get_row_columns());
+		assert(sparse.get_aug_identities() == packed.get_aug_identities());
+		assert(sparse.get_original_rows() == packed.get_original_rows());
+		assert(sparse.get_zero_sums() == packed.get_zero_sums());
+	}
+}
+
 int main(int argc, char * argv[]) {
 	srand(time(NULL));
 	test_rref_fixed();
 	test_rref_idempotent();
 	test_rref_insert_order();
 	//test_xorbasis_remove_ids(40); // does not apply when _XorBasisBuilder does REF
+	test_xorbasis_remove_ids_ref(40);
+	test_rejected_identity<_XorBasisBuilder>();
+	test_rejected_identity<_PackedXorBasisBuilder>();
+	test_packed_matches_sparse(40);
 
 	return 0;
 }
@@ -11,6 +11,8 @@
 #include <stdexcept>
 #include <sstream>
 #include <iostream>
+#include <limits>
+#include <functional>
 
 #include "defect/ext/vectorset.hpp"
 #include "defect/ext/xorbasis.h"
@@ -33,16 +35,20 @@ using namespace std;
 
 //------------------------------------------------------------------------------
 
-bool is_ref(const RowV & rows);
+template <typename RowT>
+bool is_ref(const vector<RowT> & rows);
 bool is_rref(const RowV & rows);
 
 //------------------------------------------------------------------------------
 
 // Helper methods for working with rows
+// (these accept any of the set types supported by _BasicXorBasisBuilder)
 
-bool is_zero(const Row & row) { return row.empty(); }
+template <typename RowT>
+bool is_zero(const RowT & row) { return row.empty(); }
 
-column_t leading_column(const Row & row) { return row.back(); }
+template <typename RowT>
+column_t leading_column(const RowT & row) { return least_element(row); }
 
 bool is_zero(const pair<Row,Aug> & rowaug) { return is_zero(rowaug.first); }
 
@@ -123,7 +129,8 @@ make_priority_queue(It start, It stop, F func)
 }
 
 // Computes rank for rows in REF or RREF form
-size_t ref_rank(const RowV & rows) {
+template <typename RowT>
+size_t ref_rank(const vector<RowT> & rows) {
 	size_t i = rows.size();
 	while (i > 0 && is_zero(rows[i-1]))
 		i--;
@@ -260,7 +267,8 @@ pair<RowV, AugV> transform_to_rref(const RowV & in_rows, const AugV & in_augs)
 // Adds rows from an REF matrix to the given row until it is either empty, or has
 //  a leading 1 different from any other row in the matrix.
 // Returns an index to where the row may be inserted to preserve REF.
-size_t ref_reduce_row_inplace(const RowV & ref_rows, const AugV & ref_augs, Row & row, Aug & aug)
+template <typename RowT, typename AugT>
+size_t ref_reduce_row_inplace(const vector<RowT> & ref_rows, const vector<AugT> & ref_augs, RowT & row, AugT & aug)
 {
 	assert(is_ref(ref_rows));
 
@@ -273,7 +281,7 @@ size_t ref_reduce_row_inplace(const RowV & ref_rows, const AugV & ref_augs, Row
 			return ref_rows.size(); // no conflict possible. belongs at end
 
 		// find where the row *would* belong
-		it = std::lower_bound(it, stop, row, ref_order_less<Row>);
+		it = std::lower_bound(it, stop, row, ref_order_less<RowT>);
 
 		if (it == stop)
 			return it - ref_rows.cbegin(); // no conflict (leading one is too large)
@@ -384,7 +392,8 @@ void ref_fix_leading_one(RowV & ref_rows, AugV & ref_augs, size_t i)
 }
 
 // Insert an arbitrary row, maintaining REF.  Returns the insertion index.
-size_t ref_insert(RowV & ref_rows, AugV & ref_augs, Row row, Aug aug) {
+template <typename RowT, typename AugT>
+size_t ref_insert(vector<RowT> & ref_rows, vector<AugT> & ref_augs, RowT row, AugT aug) {
 	assert(is_ref(ref_rows));
 
 	size_t i = ref_reduce_row_inplace(ref_rows, ref_augs, row, aug);
@@ -434,7 +443,8 @@ void rref_insert_bunch(RowV & rref_rows, AugV & rref_augs, RowV new_rows, AugV n
 	assert(is_rref(rref_rows));
 }
 
-bool is_ref(const RowV & rows) {
+template <typename RowT>
+bool is_ref(const vector<RowT> & rows) {
 	size_t nnz = ref_rank(rows);
 	for (size_t i=0; i < rows.size(); i++)
 		if (is_zero(rows[i]) != (i >= nnz))
@@ -486,46 +496,92 @@ void ref_cleanup_completely_empty_rows(RowV & rows, AugV & augs)
 	assert(is_ref(rows));
 }
 
+// For an REF matrix, the index of the nonempty row with the given leading column.
+template <typename RowT>
+size_t ref_find_leading_column(const vector<RowT> & ref_rows, column_t lead)
+{
+	auto stop = ref_rows.cbegin() + ref_rank(ref_rows);
+	auto it = std::lower_bound(ref_rows.cbegin(), stop, lead,
+		[](const RowT & row, column_t c) { return leading_column(row) < c; });
+
+	assert(it != stop && leading_column(*it) == lead);
+	return it - ref_rows.cbegin();
+}
+
+template <typename Row, typename Aug>
+void _BasicXorBasisBuilder<Row,Aug>::index_row(size_t i)
+{
+	if (is_zero(rows[i]))
+		return;
+	for (auto id : set_elements<identity_t>(augs[i]))
+		leads_by_identity[id].insert(leading_column(rows[i]));
+}
+
+template <typename Row, typename Aug>
+void _BasicXorBasisBuilder<Row,Aug>::unindex_row(size_t i)
+{
+	if (is_zero(rows[i]))
+		return;
+	for (auto id : set_elements<identity_t>(augs[i])) {
+		auto it = leads_by_identity.find(id);
+		assert(it != leads_by_identity.end());
+		it->second.erase(leading_column(rows[i]));
+		if (it->second.empty())
+			leads_by_identity.erase(it);
+	}
+}
+
+// Insert an arbitrary row, maintaining REF and the index.  Returns the insertion index.
+template <typename Row, typename Aug>
+size_t _BasicXorBasisBuilder<Row,Aug>::insert_indexed(Row row, Aug aug)
+{
+	size_t i = ref_insert(rows, augs, std::move(row), std::move(aug));
+	index_row(i);
+	return i;
+}
+
 // TODO  do I even need this method to begin with?
-identity_t _XorBasisBuilder::add(Row row)
+template <typename Row, typename Aug>
+identity_t _BasicXorBasisBuilder<Row,Aug>::add(Row row)
 {
 	auto id = assign_identity(row);
 	Aug aug = original_aug(id);
-	ref_insert(rows, augs, std::move(row), std::move(aug));
+	insert_indexed(std::move(row), std::move(aug));
 	return id;
 }
 
-std::vector<identity_t> _XorBasisBuilder::add_many(RowV added_rows)
+template <typename Row, typename Aug>
+std::vector<identity_t> _BasicXorBasisBuilder<Row,Aug>::add_many(RowV added_rows)
 {
-	AugV added_augs;
 	vector<identity_t> ids;
 	for (auto & row : added_rows) {
 		auto id = assign_identity(row);
-
-		added_augs.push_back(original_aug(id));
 		ids.push_back(id);
-	}
 
-	ref_insert_bunch(rows, augs, std::move(added_rows), std::move(added_augs));
-	return std::move(ids);
+		// (see ref_insert_bunch)
+		insert_indexed(std::move(row), original_aug(id));
+	}
+	return ids;
 }
 
-vector<vector<identity_t>> _XorBasisBuilder::get_zero_sums() const
+template <typename Row, typename Aug>
+vector<vector<identity_t>> _BasicXorBasisBuilder<Row,Aug>::get_zero_sums() const
 {
 	vector<vector<identity_t>> result;
 	for (size_t i=ref_rank(rows); i<rows.size(); i++) {
 		// class invariant (no method leaves behind any completely empty rows in the matrix)
 		assert(!augs[i].empty());
 
-		result.emplace_back(augs[i].cbegin(), augs[i].cend());
+		result.push_back(set_elements<identity_t>(augs[i]));
 	}
 	return result;
 }
 
 // TODO
-// void _XorBasisBuilder::remove_from_each_zero_sum(std::vector<identity_t>);
+// void _BasicXorBasisBuilder<Row,Aug>::remove_from_each_zero_sum(std::vector<identity_t>);
 
-std::pair<bool, identity_t> _XorBasisBuilder::add_if_linearly_independent(Row row)
+template <typename Row, typename Aug>
+std::pair<bool, identity_t> _BasicXorBasisBuilder<Row,Aug>::add_if_linearly_independent(Row row)
 {
 	auto id = assign_identity(row);
 	Aug aug = original_aug(id);
@@ -534,10 +590,15 @@ std::pair<bool, identity_t> _XorBasisBuilder::add_if_linearly_independent(Row ro
 	size_t index = ref_reduce_row_inplace(rows, augs, row, aug);
 
 	if (is_zero(row)) {
+		// The identity was never used, so it is given out again.  (this way, identities
+		//  and thus the span of the augs only grow with the rows actually added)
+		originals.erase(id);
+		next_identity--;
 		return { false, 0 };
 	} else {
 		rows.insert(rows.begin() + index, std::move(row));
 		augs.insert(augs.begin() + index, std::move(aug));
+		index_row(index);
 
 		// NOTE: if we were trying to maintain RREF instead of REF, we'd also have to
 		//       fix conflicts with the new leading one at this point
@@ -548,37 +609,174 @@ std::pair<bool, identity_t> _XorBasisBuilder::add_if_linearly_independent(Row ro
 	assert(false);
 }
 
-void _XorBasisBuilder::remove_ids(Aug ids)
+template <typename Row, typename Aug>
+void _BasicXorBasisBuilder<Row,Aug>::remove_ids(const vector<identity_t> & ids)
 {
 	// Use the augmented matrix to identify rows that "contain" these rows, and
 	//  cancel them out (as though the rows were never inserted to begin with!)
-	// Brute force method
-	for (auto id: ids) {
-		const Row & removed_row = originals[id];
-		Aug         removed_aug = original_aug(id);
-		for (size_t i=0; i<rows.size(); ++i) {
-			if (augs[i].contains(id)) {
-				rows[i] ^= removed_row;
-				augs[i] ^= removed_aug;
+	//
+	// Only those rows are touched.  They are taken out of the matrix (what remains is
+	//  still in REF), cleaned of the removed rows, and inserted back.
+	size_t old_size = rows.size();
+	size_t rank = ref_rank(rows);
+
+	// Nonempty rows are found through the index.  Zero rows (which only exist when there
+	//  are zero sums) are all taken out, as they may need to be reduced against each other.
+	std::set<column_t> leads;
+	for (auto id : ids) {
+		auto it = leads_by_identity.find(id);
+		if (it != leads_by_identity.end())
+			leads.insert(it->second.cbegin(), it->second.cend());
+	}
+
+	vector<bool> taken(rows.size(), false);
+	for (column_t lead : leads)
+		taken[ref_find_leading_column(rows, lead)] = true;
+	for (size_t i = rank; i < rows.size(); i++)
+		taken[i] = true;
+
+	RowV taken_rows;
+	AugV taken_augs;
+	size_t kept = 0;
+	for (size_t i = 0; i < rows.size(); i++) {
+		if (taken[i]) {
+			unindex_row(i);
+			taken_rows.push_back(std::move(rows[i]));
+			taken_augs.push_back(std::move(augs[i]));
+		} else {
+			if (kept != i) {
+				rows[kept] = std::move(rows[i]);
+				augs[kept] = std::move(augs[i]);
 			}
+			kept++;
 		}
 	}
+	rows.resize(kept);
+	augs.resize(kept);
+	assert(is_ref(rows));
 
-	// ouch
-	std::tie(rows,augs) = transform_to_ref(std::move(rows), std::move(augs));
+	for (size_t k = 0; k < taken_rows.size(); k++) {
+		for (auto id : ids) {
+			if (taken_augs[k].contains(id)) {
+				taken_rows[k] ^= originals[id];
+				taken_augs[k] ^= original_aug(id);
+			}
+		}
+	}
 
-	// There should be precisely this many rows that are *completely*
-	//  empty (both row and aug).  Clean them out.
-	size_t old_size = rows.size();
-	size_t removed_count = ids.size();
+	for (auto id : ids) {
+		originals.erase(id);
+		leads_by_identity.erase(id);
+	}
 
-	ref_cleanup_completely_empty_rows(rows, augs);
-	assert(rows.size() == old_size - removed_count);
+	// Put the rows back.  The zero sums that remain are reduced against each other, so
+	//  that any that became redundant (i.e. completely empty) are discarded.
+	AugV zero_sums;
+	for (size_t k = 0; k < taken_rows.size(); k++) {
+		Row & row = taken_rows[k];
+		Aug & aug = taken_augs[k];
+
+		size_t i = ref_reduce_row_inplace(rows, augs, row, aug);
+		if (is_zero(row)) {
+			zero_sums.push_back(std::move(aug));
+		} else {
+			rows.insert(rows.begin() + i, std::move(row));
+			augs.insert(augs.begin() + i, std::move(aug));
+			index_row(i);
+		}
+	}
+
+	std::map<identity_t, size_t> pivots; // least identity -> index in rows
+	for (auto & aug : zero_sums) {
+		while (!aug.empty()) {
+			auto it = pivots.find(least_element(aug));
+			if (it == pivots.end()) {
+				pivots.emplace(least_element(aug), rows.size());
+				rows.emplace_back();
+				augs.push_back(std::move(aug));
+				break;
+			}
+			aug ^= augs[it->second];
+		}
+	}
+
+	assert(is_ref(rows));
+	assert(rows.size() == old_size - ids.size());
+}
+
+template <typename Row, typename Aug>
+vector<vector<column_t>> _BasicXorBasisBuilder<Row,Aug>::get_row_columns() const
+{
+	vector<vector<column_t>> result;
+	for (auto & row : rows)
+		result.push_back(set_elements<column_t>(row));
+	return result;
+}
+
+template <typename Row, typename Aug>
+vector<vector<identity_t>> _BasicXorBasisBuilder<Row,Aug>::get_aug_identities() const
+{
+	vector<vector<identity_t>> result;
+	for (auto & aug : augs)
+		result.push_back(set_elements<identity_t>(aug));
+	return result;
+}
+
+template <typename Row, typename Aug>
+vector<pair<identity_t, vector<column_t>>> _BasicXorBasisBuilder<Row,Aug>::get_original_rows() const
+{
+	vector<pair<identity_t, vector<column_t>>> result;
+	for (auto & kv : originals)
+		result.emplace_back(kv.first, set_elements<column_t>(kv.second));
+	return result;
+}
+
+template <typename Row, typename Aug>
+void _BasicXorBasisBuilder<Row,Aug>::set_state(
+	const vector<vector<column_t>> & new_rows,
+	const vector<vector<identity_t>> & new_augs,
+	const vector<pair<identity_t, vector<column_t>>> & new_originals,
+	identity_t new_next_identity)
+{
+	if (new_rows.size() != new_augs.size())
+		throw invalid_argument("XorBasisBuilder state has unequal numbers of rows and augs");
+
+	RowV tmp_rows;
+	AugV tmp_augs;
+	for (auto & row : new_rows)
+		tmp_rows.emplace_back(row);
+	for (auto & aug : new_augs)
+		tmp_augs.emplace_back(aug);
+
+	if (!is_ref(tmp_rows))
+		throw invalid_argument("XorBasisBuilder state is not in row echelon form");
+
+	std::map<identity_t, Row> tmp_originals;
+	for (auto & kv : new_originals) {
+		if (kv.first >= new_next_identity)
+			throw invalid_argument("XorBasisBuilder state has an identity that was never assigned");
+		tmp_originals.insert(make_pair(kv.first, Row {kv.second}));
+	}
+
+	rows = std::move(tmp_rows);
+	augs = std::move(tmp_augs);
+	originals = std::move(tmp_originals);
+	next_identity = new_next_identity;
+
+	leads_by_identity.clear();
+	for (size_t i = 0; i < rows.size(); i++)
+		index_row(i);
 }
 
 // TODO  do I even need this method to begin with?
-void _XorBasisBuilder::remove_zero_rows() {
+template <typename Row, typename Aug>
+void _BasicXorBasisBuilder<Row,Aug>::remove_zero_rows() {
 	size_t rank = ref_rank(rows);
 	rows.resize(rank);
 	augs.resize(rank);
 }
+
+//------------------------------------------------------------------------------
+
+template class _BasicXorBasisBuilder<Row, Aug>;
+template class _BasicXorBasisBuilder<PackedSet, PackedSet>;
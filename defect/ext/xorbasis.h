@@ -2,10 +2,12 @@
 #pragma once
 
 #include <map>
+#include <set>
 #include <utility> // pair
 #include <vector>
 
 #include "defect/ext/vectorset.hpp"
+#include "defect/ext/packedset.hpp"
 
 //------------------------------------------------------------------------------
 
@@ -22,26 +24,68 @@ typedef std::vector<RowAug> RowAugV;
 
 //------------------------------------------------------------------------------
 
-// anonymous namespace to avoid redefinition by multiple object files that include the header
-// (TODO: is this a legitimate reason to use one?)
-namespace {
+//------------------------------------------------------------------------------
 
-	RowV into_row_v(const std::vector<std::vector<column_t>> & rows) {
-		RowV result;
-		for (auto & e : rows) {
-			result.emplace_back(e);
-		}
-		return result;
-	}
+// The set types used for rows and augs are interchangeable, as long as they offer
+//  empty(), contains(), ^= and the two functions below.
+
+// The least element of a nonempty set.  (for a row, its leading column)
+template <typename T>
+T least_element(const MinVecSet<T> & set) { return set.back(); }
+
+inline size_t least_element(const PackedSet & set) { return set.front(); }
+
+// The elements of a set, in descending order.
+template <typename T, typename U, typename Comp>
+std::vector<T> set_elements(const VectorSet<U,Comp> & set) { return { set.cbegin(), set.cend() }; }
 
-}
+template <typename T>
+std::vector<T> set_elements(const PackedSet & set) { return set.elements<T>(); }
 
 //------------------------------------------------------------------------------
 
-// The class primarily exported from this module. (with an underscore, so that
-//  the bare name may be given to a python wrapper class)
-class _XorBasisBuilder
+// The interface shared by every instantiation of _BasicXorBasisBuilder, so that the
+//  python wrapper can own either one.
+class XorBasisEngine
 {
+public:
+	virtual ~XorBasisEngine() { }
+
+	virtual XorBasisEngine * clone() const = 0;
+
+	virtual identity_t add(const std::vector<column_t> &) = 0;
+	virtual std::vector<identity_t> add_many(const std::vector<std::vector<column_t>> &) = 0;
+	virtual std::pair<bool, identity_t> add_if_linearly_independent(const std::vector<column_t> &) = 0;
+	virtual void remove_ids(const std::vector<identity_t> &) = 0;
+	virtual std::vector<std::vector<identity_t>> get_zero_sums() const = 0;
+
+	// The complete state of the builder in plain containers, for serialization.
+	// A builder given these values through set_state() is identical to this one,
+	//  whatever set types either of them uses.
+	virtual std::vector<std::vector<column_t>> get_row_columns() const = 0;
+	virtual std::vector<std::vector<identity_t>> get_aug_identities() const = 0;
+	virtual std::vector<std::pair<identity_t, std::vector<column_t>>> get_original_rows() const = 0;
+	virtual identity_t get_next_identity() const = 0;
+
+	virtual void set_state(
+		const std::vector<std::vector<column_t>> & rows,
+		const std::vector<std::vector<identity_t>> & augs,
+		const std::vector<std::pair<identity_t, std::vector<column_t>>> & originals,
+		identity_t next_identity) = 0;
+};
+
+// The class primarily exported from this module, templated over the set types of the
+//  rows and of the augmented portion.  (with an underscore, so that the bare name may
+//  be given to a python wrapper class)
+// Every instantiation performs the same operations in the same order, so they produce
+//  identical states from identical operations.
+template <typename Row, typename Aug>
+class _BasicXorBasisBuilder : public XorBasisEngine
+{
+public:
+	typedef std::vector<Row> RowV;
+	typedef std::vector<Aug> AugV;
+
 private:
 	RowV rows; // Matrix
 	AugV augs; // Augmented portion
@@ -49,6 +93,15 @@ private:
 	identity_t next_identity = 0;
 	std::map<identity_t, Row> originals; // Original rows
 
+	// For each identity, the leading columns of the nonempty rows whose augs contain it.
+	// (in REF, a nonempty row is uniquely identified by its leading column, and unlike
+	//  its index, this does not change when other rows are inserted)
+	std::map<identity_t, std::set<column_t>> leads_by_identity;
+
+	void index_row(size_t i);
+	void unindex_row(size_t i);
+	size_t insert_indexed(Row row, Aug aug);
+
 	// Every row that is used with the matrix gets assigned an unique identity.
 	// It also gets a 1 in the corresponding column of its augmented half.
 	identity_t assign_identity(Row row) {
@@ -58,54 +111,56 @@ private:
 	}
 
 	const Row & original_row(identity_t id) { return originals[id]; }
-	Aug         original_aug(identity_t id) { return {std::vector<identity_t>{id}}; }
-	RowAug      original_rowaug(identity_t id) { return { original_row(id), original_aug(id) }; }
+	Aug         original_aug(identity_t id) { return Aug {std::vector<identity_t>{id}}; }
 
 public:
 
-	_XorBasisBuilder()
+	_BasicXorBasisBuilder()
 	: rows() // a matrix maintained in rref form
 	, augs()
 	, next_identity(0)
 	, originals()
+	, leads_by_identity()
 	{ }
 
+	XorBasisEngine * clone() const override { return new _BasicXorBasisBuilder(*this); }
+
 	// Unconditionally add a vector to the basis.  Returns its newly assigned identity.
 	// (possibly causing a linearly dependent group to emerge)
 	identity_t add(Row);
 
-	template <typename ColumnRange>
-	identity_t add(const ColumnRange & e) { return add(Row {e}); }
+	identity_t add(const std::vector<column_t> & e) override { return add(Row {e}); }
 
 	// Unconditionally add many vectors to the basis.  Returns their newly assigned identities.
 	// (possibly causing linearly dependent groups to emerge)
 	std::vector<identity_t> add_many(RowV);
 
-	template <typename ColumnRangeRange>
-	std::vector<identity_t> add_many(const ColumnRangeRange & r) { return add_many(into_row_v(r)); }
+	std::vector<identity_t> add_many(const std::vector<std::vector<column_t>> & r) override {
+		RowV added;
+		for (auto & e : r)
+			added.emplace_back(e);
+		return add_many(std::move(added));
+	}
 
 	// Add a vector to the basis, but only if it is not linearly dependent with vectors
 	//  already in the basis.  Returns (success, id).
-	// Note: the value of id is only meaningful if success is true.
+	// Note: the value of id is only meaningful if success is true.  (on failure, no
+	//       identity is consumed)
 	std::pair<bool, identity_t> add_if_linearly_independent(Row);
 
-	template <typename ColumnRange>
-	std::pair<bool, identity_t> add_if_linearly_independent(const ColumnRange & e) {
+	std::pair<bool, identity_t> add_if_linearly_independent(const std::vector<column_t> & e) override {
 		return add_if_linearly_independent(Row {e});
 	}
 
 	// Removes the specified vectors from the basis.  The resulting state of the basis will be
 	//   as though the vectors were never added in the first place.
-	void remove_ids(Aug);
-
-	template <typename IdentityRange>
-	void remove_ids(const IdentityRange & e) { return remove_ids(Aug {e}); }
+	void remove_ids(const std::vector<identity_t> &) override;
 
 	// Returns a list of lists of ids, each of which represent previously-inserted vectors
 	//  that sum to zero.
 	// The ordering of the returned lists is guaranteed to remain fixed for as long as the
 	//  basis is not modified. (this is for use together with remove_from_each_zero_sum())
-	std::vector<std::vector<identity_t>> get_zero_sums() const;
+	std::vector<std::vector<identity_t>> get_zero_sums() const override;
 
 	// Removes the specified vectors from the basis, provided that:
 	//   * One is provided from every list returned by get_zero_sums(), IN ORDER.
@@ -117,6 +172,24 @@ public:
 	const RowV & get_rows() const { return rows; }
 	const AugV & get_augs() const { return augs; }
 
+	std::vector<std::vector<column_t>> get_row_columns() const override;
+	std::vector<std::vector<identity_t>> get_aug_identities() const override;
+	std::vector<std::pair<identity_t, std::vector<column_t>>> get_original_rows() const override;
+	identity_t get_next_identity() const override { return next_identity; }
+
+	void set_state(
+		const std::vector<std::vector<column_t>> & rows,
+		const std::vector<std::vector<identity_t>> & augs,
+		const std::vector<std::pair<identity_t, std::vector<column_t>>> & originals,
+		identity_t next_identity) override;
+
 	void remove_zero_rows();
 };
 
+// Rows as sorted lists of columns.  Memory and the cost of adding two rows scale with
+//  the number of ones.
+typedef _BasicXorBasisBuilder<Row, Aug> _XorBasisBuilder;
+
+// Rows as bit-packed words.  Adding two rows is a short loop over words, but memory
+//  scales with the span of the columns.
+typedef _BasicXorBasisBuilder<PackedSet, PackedSet> _PackedXorBasisBuilder;
@@ -0,0 +1,170 @@
+
+# Connectivity of a graph that only ever loses vertices.
+
+import copy
+
+import numpy as np
+from scipy import sparse
+from scipy.sparse import csgraph
+
+__all__ = [
+	'DecrementalConnectivity',
+]
+
+class DecrementalConnectivity:
+	'''
+	Tracks the connected components of a graph as vertices are deleted.
+
+	The graph is given by an adjacency structure in CSR format over integer vertex ids
+	(the neighbors of ``i`` are ``adj_nodes[adj_ptr[i]:adj_ptr[i+1]]``, connected by the
+	edges ``adj_edges[...]``), optionally together with boolean masks of the living vertices
+	and edges (which are copied).  Edges listed in ``ignored_edges`` are treated as absent.
+	The adjacency arrays are shared and must not be modified.
+
+	Each deletion that may split a component is resolved by a breadth-first search from
+	each of the deleted vertex's neighbors, run in lockstep.  Searches that meet are merged,
+	and the process stops as soon as at most one search is still running; any search that
+	ran out of vertices has found a new component.  The cost is thus proportional to the
+	size of every piece except the largest, which in a large and well-connected graph is
+	usually tiny.
+
+	>>> # a path 0-1-2-3
+	>>> ptr   = np.array([0, 1, 3, 5, 6])
+	>>> nodes = np.array([1, 0, 2, 1, 3, 2])
+	>>> edges = np.array([0, 0, 1, 1, 2, 2])
+	>>> conn = DecrementalConnectivity(ptr, nodes, edges)
+	>>> conn.component_count()
+	1
+	>>> conn.remove_node(1)
+	>>> conn.component_count(), conn.connected(0, 2), conn.connected(2, 3)
+	(2, False, True)
+	>>> DecrementalConnectivity(ptr, nodes, edges, ignored_edges=[2]).connected(2, 3)
+	False
+	'''
+	def __init__(self, adj_ptr, adj_nodes, adj_edges, node_alive=None, edge_alive=None, ignored_edges=()):
+		n = len(adj_ptr) - 1
+		if node_alive is None:
+			node_alive = np.ones((n,), dtype=bool)
+		if edge_alive is None:
+			edge_alive = np.ones((np.max(adj_edges, initial=-1) + 1,), dtype=bool)
+
+		self.__adj_ptr = adj_ptr
+		self.__adj_nodes = adj_nodes
+		self.__adj_edges = adj_edges
+		self.__node_alive = np.array(node_alive, dtype=bool)
+		self.__edge_alive = np.array(edge_alive, dtype=bool)
+		self.__edge_alive[np.asarray(ignored_edges, dtype=int)] = False
+
+		rows = np.repeat(np.arange(n), np.diff(adj_ptr))
+		alive = self.__edge_alive[adj_edges]
+		adj = sparse.csr_matrix((np.ones(np.count_nonzero(alive)), (rows[alive], adj_nodes[alive])), shape=(n,n))
+		ncomps, self.__labels = csgraph.connected_components(adj, directed=False)
+		self.__labels[~self.__node_alive] = -1
+
+		self.__next_label = ncomps
+		self.__count = len(np.unique(self.__labels[self.__node_alive]))
+
+	def copy(self):
+		''' Get an independent copy.  (the adjacency arrays remain shared) '''
+		result = copy.copy(self)
+		result.__node_alive = self.__node_alive.copy()
+		result.__edge_alive = self.__edge_alive.copy()
+		result.__labels = self.__labels.copy()
+		return result
+
+	def component_count(self):
+		''' Number of connected components among the living vertices. '''
+		return self.__count
+
+	def connected(self, i, j):
+		''' Determine whether two living vertices are connected. '''
+		return bool(self.__labels[i] == self.__labels[j])
+
+	def component_label(self, i):
+		'''
+		An identifier for the component of a living vertex.
+
+		Labels are only meaningful when compared with each other at the same point in time.
+		'''
+		return self.__labels[i]
+
+	def remove_node(self, i):
+		''' Delete the vertex ``i`` and its edges. '''
+		assert self.__node_alive[i]
+		neighbors = sorted(set(self.__living_neighbors(i)))
+
+		lo, hi = self.__adj_ptr[i], self.__adj_ptr[i+1]
+		self.__edge_alive[self.__adj_edges[lo:hi]] = False
+		self.__node_alive[i] = False
+
+		old_label = self.__labels[i]
+		self.__labels[i] = -1
+
+		if not neighbors:
+			self.__count -= 1 # it was a component by itself
+			return
+
+		pieces = self.__split_pieces(neighbors)
+
+		# one piece keeps the old label; the others are new components
+		for piece in pieces[1:]:
+			self.__labels[piece] = self.__next_label
+			self.__next_label += 1
+		self.__count += len(pieces) - 1
+		assert all(self.__labels[j] == self.__labels[piece[0]] for piece in pieces for j in piece)
+		assert len(pieces) == 1 or all(self.__labels[piece[0]] != old_label for piece in pieces[1:])
+
+	def __split_pieces(self, starts):
+		# Returns a list of lists of vertices, one per component found among the starting
+		#  vertices.  The first list is incomplete (it is the piece that is too large to
+		#  bother exploring fully), and the rest are complete.
+		parent = list(range(len(starts))) # union-find over searches
+		def find(a):
+			while parent[a] != a:
+				parent[a] = parent[parent[a]]
+				a = parent[a]
+			return a
+
+		owner = {v: k for (k, v) in enumerate(starts)}
+		queues = {k: [v] for (k, v) in enumerate(starts)}
+		cursors = {k: 0 for k in queues}
+		finished = []
+
+		while len(queues) > 1:
+			for k in list(queues):
+				if k not in queues:
+					continue # merged into another search during this round
+
+				queue = queues[k]
+				if cursors[k] == len(queue):
+					finished.append(k)
+					del queues[k]
+					if len(queues) <= 1:
+						break
+					continue
+
+				v = queue[cursors[k]]
+				cursors[k] += 1
+				for j in self.__living_neighbors(v):
+					other = owner.get(j)
+					if other is None:
+						owner[j] = k
+						queue.append(j)
+					elif find(other) != k:
+						# two searches met; fold the other search into this one
+						other = find(other)
+						parent[other] = k
+						queue.extend(queues[other][cursors[other]:])
+						del queues[other]
+						del cursors[other]
+
+		members = {}
+		for v, k in owner.items():
+			members.setdefault(find(k), []).append(v)
+
+		return [members[k] for k in list(queues) + finished]
+
+	def __living_neighbors(self, v):
+		lo, hi = self.__adj_ptr[v], self.__adj_ptr[v+1]
+		alive = self.__edge_alive[self.__adj_edges[lo:hi]]
+		return self.__adj_nodes[lo:hi][alive].tolist()
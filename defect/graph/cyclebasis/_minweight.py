@@ -0,0 +1,148 @@
+
+# Cycle bases of short cycles for arbitrary graphs, after Horton's algorithm.
+#
+# Horton's algorithm generates a set of candidate cycles guaranteed to contain a minimum
+#  weight cycle basis, and then greedily takes the shortest candidates that are linearly
+#  independent of those already taken (which is exactly what CycleBasisBuilder is for).
+#
+# The full candidate set has a cycle for every vertex and edge, which is far too many for
+#  large circuits.  Instead, candidates are generated in rounds of increasing length (most
+#  circuits of interest are lattices, where the first round suffices).  If a limit is placed
+#  on the length, any part of the cycle space that the candidates fail to span is filled in
+#  by nx.cycle_basis.
+
+import heapq
+
+import networkx as nx
+
+from defect.graph.cyclebasis.builder import CycleBasisBuilder, choose_engine
+import defect.graph.path as vpath
+
+__all__ = [
+	'minimum_weight_cycle_basis',
+]
+
+BLOCK_SIZE = 1000
+FIRST_ROUND_MAX_LENGTH = 8
+
+def minimum_weight_cycle_basis(g, max_length=None, overlap_penalty=0.):
+	rank = g.number_of_edges() - g.number_of_nodes() + nx.number_connected_components(g)
+	builder = CycleBasisBuilder(engine=choose_engine(rank, g.number_of_edges()))
+
+	# each round adds the candidates with lengths in (lower, upper]
+	lower, upper = 0, FIRST_ROUND_MAX_LENGTH
+	while len(builder.cycles) < rank:
+		if max_length is not None:
+			upper = min(upper, max_length)
+		if upper >= g.number_of_nodes():
+			upper = None # no cycle is any longer
+
+		candidates = [c for c in horton_candidates(g, upper) if len(c) - 1 > lower]
+		candidates.sort(key=len) # (stable)
+		if overlap_penalty:
+			add_by_overlap(builder, candidates, rank, overlap_penalty)
+		else:
+			add_in_order(builder, candidates, rank)
+
+		if upper is None or upper == max_length:
+			break
+		lower, upper = upper, 2 * upper
+
+	if len(builder.cycles) < rank:
+		assert max_length is not None, "Horton's candidates failed to span the cycle space"
+		fallback = nx.cycle_basis(g)
+		for cycle in fallback:
+			cycle.append(cycle[0])
+		add_in_order(builder, fallback, rank)
+
+	assert len(builder.cycles) == rank
+	return list(builder.cycles)
+
+# Yields Horton's candidate cycles with at most ``max_length`` edges (or all of them, if
+#  ``max_length`` is None):  For each root, and each edge (x,y) outside the root's BFS tree,
+#  the cycle formed by the edge and the tree paths to x and y, if those paths meet only at
+#  the root.  Each cycle is produced once, as a vertex list with its first vertex repeated.
+def horton_candidates(g, max_length=None):
+	seen = set()
+	for root in g:
+		parent, depth, branch = truncated_bfs(g, root, None if max_length is None else max_length // 2)
+
+		for x in parent:
+			for y in g.neighbors(x):
+				if y not in parent or parent[x] == y or parent[y] == x:
+					continue # outside the search, or a tree edge
+				if max_length is not None and depth[x] + depth[y] + 1 > max_length:
+					continue
+				if x != root and y != root and branch[x] == branch[y]:
+					continue # the paths overlap beyond the root
+
+				cycle = tree_path(parent, x)[::-1] + tree_path(parent, y)
+				key = frozenset(frozenset(e) for e in vpath.edges(cycle))
+				if key not in seen:
+					seen.add(key)
+					yield cycle
+
+# Breadth-first search from ``root`` to a depth of ``radius`` (or unlimited, if None).
+# Returns dicts of the parent and depth of each vertex reached, and of the child of root
+#  through which it was reached.
+def truncated_bfs(g, root, radius):
+	parent = {root: None}
+	depth = {root: 0}
+	branch = {root: root}
+
+	frontier = [root]
+	d = 0
+	while frontier and (radius is None or d < radius):
+		d += 1
+		next_frontier = []
+		for u in frontier:
+			for w in g.neighbors(u):
+				if w not in parent:
+					parent[w] = u
+					depth[w] = d
+					branch[w] = w if u == root else branch[u]
+					next_frontier.append(w)
+		frontier = next_frontier
+
+	return parent, depth, branch
+
+# The path from v up to the root of a tree given by parent pointers.
+def tree_path(parent, v):
+	path = [v]
+	while parent[path[-1]] is not None:
+		path.append(parent[path[-1]])
+	return path
+
+# Greedily takes cycles in the order given, until the basis is complete.
+def add_in_order(builder, cycles, rank):
+	for start in range(0, len(cycles), BLOCK_SIZE):
+		if len(builder.cycles) >= rank:
+			break
+		builder.add_if_independent_many(cycles[start:start+BLOCK_SIZE])
+
+# Greedily takes the cycle of least weight, where each edge of a cycle weighs
+#  ``1 + overlap_penalty * n``, and ``n`` is the number of cycles already taken that use it.
+#
+# Two cycles that share an edge produce a nonzero off-diagonal element in the resistance
+#  matrix, so this trades a little length for less fill.
+def add_by_overlap(builder, cycles, rank, overlap_penalty):
+	usage = {}
+	def weight(edges):
+		return sum(1. + overlap_penalty * usage.get(e, 0) for e in edges)
+
+	edge_sets = [[frozenset(e) for e in vpath.edges(cycle)] for cycle in cycles]
+	heap = [(len(edges), i) for (i, edges) in enumerate(edge_sets)]
+	heapq.heapify(heap)
+
+	# Weights only ever increase, so a cycle whose weight is up to date when it reaches the
+	#  front of the queue is the lightest one.
+	while heap and len(builder.cycles) < rank:
+		old_weight, i = heapq.heappop(heap)
+		new_weight = weight(edge_sets[i])
+		if new_weight > old_weight:
+			heapq.heappush(heap, (new_weight, i))
+			continue
+
+		if builder.add_if_independent(cycles[i]):
+			for e in edge_sets[i]:
+				usage[e] = usage.get(e, 0) + 1
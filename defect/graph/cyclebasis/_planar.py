@@ -56,7 +56,8 @@ def planar_cycle_basis_nx(g, xs, ys):
 			result.extend(planar_cycle_basis_impl(subg))
 
 	# Restore some confidence in the result...
-	if len(result) != len(nx.cycle_basis(g)):
+	rank = g.number_of_edges() - g.number_of_nodes() + nx.number_connected_components(g)
+	if len(result) != rank:
 		raise RuntimeError(
 			'planar_cycle_basis produced a result of incorrect '
 			'length on the given graph! (does it have crossing edges?)'
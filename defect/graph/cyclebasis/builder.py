@@ -8,6 +8,11 @@
 #	import graph.cyclebasis.pyXorBasis as xorbasis
 
 from _defect import XorBasisBuilder # c++ version
+from _defect import PackedXorBasisBuilder # c++ version with bit-packed rows
+
+import itertools
+
+import numpy as np
 
 import defect.graph.path as vpath
 
@@ -15,37 +20,91 @@ from defect.util import assertRaises
 
 __all__ = [
 	'CycleBasisBuilder',
+	'choose_engine',
 ]
 
+# Packed rows make adding two rows a short loop over words, which is several times faster
+#  than merging sorted column lists for any basis of reasonable size.  However, a packed row
+#  takes memory in proportion to the span of its columns (which elimination tends to widen),
+#  and a packed aug in proportion to the span of its identities, so it is only used when the
+#  matrix would fit in this many bytes even if completely dense.
+PACKED_ENGINE_MAX_BYTES = 512 * 2**20
+
+def choose_engine(num_rows, num_columns, num_identities=None):
+	'''
+	Pick the XOR basis class for a cycle basis of ``num_rows`` cycles over ``num_columns`` edges.
+
+	``num_identities`` is the number of cycles that will ever be added to the basis, counting
+	those that are later removed (but not those rejected by ``add_if_linearly_independent``,
+	which consume no identity).  It defaults to ``num_rows``.  Identities beyond it are not
+	covered by the memory limit.
+
+	>>> choose_engine(10000, 20000) is PackedXorBasisBuilder
+	True
+	>>> choose_engine(10000, 20000, num_identities=10**6) is XorBasisBuilder
+	True
+	>>> choose_engine(10**6, 2*10**6) is XorBasisBuilder
+	True
+	'''
+	if num_identities is None:
+		num_identities = num_rows
+	words_per_row = (num_columns + 63) // 64 + (num_identities + 63) // 64
+	dense_bytes = num_rows * words_per_row * 8
+	if dense_bytes <= PACKED_ENGINE_MAX_BYTES:
+		return PackedXorBasisBuilder
+	return XorBasisBuilder
+
 class CycleBasisBuilder:
-	def __init__(self):
+	# engine - the class of the underlying bit matrix.  (see choose_engine)
+	def __init__(self, engine=XorBasisBuilder):
 		self.edge_mapper = EdgeIndexMapper()
 		self.cycles_by_id = {}
-		self.basis = XorBasisBuilder()
+		self.basis = engine()
+
+		# inverted indices, so that the cycles affected by a removal can be found without
+		#  scanning the whole basis:  vertex -> set of ids, and edge index -> set of ids
+		self.ids_by_vertex = {}
+		self.ids_by_edge = {}
 
 	@property
 	def cycles(self):
 		return self.cycles_by_id.values()
 
+	def copy(self):
+		''' Get an independent copy of the builder. '''
+		result = CycleBasisBuilder.__new__(CycleBasisBuilder)
+		result.edge_mapper = self.edge_mapper.copy()
+		result.cycles_by_id = dict(self.cycles_by_id) # (the cycles themselves are never modified)
+		result.basis = self.basis.copy()
+		result.ids_by_vertex = {v:set(ids) for (v,ids) in self.ids_by_vertex.items()}
+		result.ids_by_edge = {e:set(ids) for (e,ids) in self.ids_by_edge.items()}
+		return result
+
 	# Constructs a CycleBasisBuilder from a set of cycles known to be linearly independent.
 	# This computes the underlying matrix through a more efficient method than repeated calls
 	#  to add_if_linearly_independent will provide.
+	# The engine is chosen from the size of the basis, unless one is given.
 	@classmethod
-	def from_basis_cycles(cls, vcycles):
-
-		self = cls()
+	def from_basis_cycles(cls, vcycles, engine=None):
 
 		vcycles = list(vcycles)
 		if any(c[0] != c[-1] for c in vcycles):
 			raise RuntimeError('Expected cycles with repeated first vertex!')
-		ecycles = list(map(self.edge_mapper.map_path, vcycles))
-		identities = self.basis.add_many(ecycles)
+		edge_mapper = EdgeIndexMapper()
+		ecycles = list(map(edge_mapper.map_path, vcycles))
+
+		if engine is None:
+			engine = choose_engine(len(ecycles), len(edge_mapper.edges))
+		self = cls(engine=engine)
+		self.edge_mapper = edge_mapper
+
+		identities = self.basis.add_many_csr(*_as_csr(ecycles)).tolist()
 
 		if len(self.basis.get_zero_sums()) > 0:
 			raise RuntimeError("from_basis_cycles() was provided linearly dependent cycles!")
 
-		for identity,cycle in zip(identities, vcycles):
-			self.cycles_by_id[identity] = cycle
+		for identity,cycle,edgeids in zip(identities, vcycles, ecycles):
+			self.__insert_cycle(identity, cycle, edgeids)
 
 		assert len(vcycles) == len(self.cycles_by_id)
 		return self
@@ -54,6 +113,28 @@ class CycleBasisBuilder:
 	#  the cyclebasis, adds the cycle and returns True.
 	# Otherwise, returns False.
 	def add_if_independent(self, cycle):
+		return self.__add_if_independent(cycle) is not None
+
+	# Like add_if_independent, for many cycles at once.  Each cycle is tested against the
+	#  basis as it stands after the cycles before it, so the result is the same as calling
+	#  add_if_independent on each in order.  Returns a list of bools.
+	def add_if_independent_many(self, cycles):
+		cycles = [list(cycle) for cycle in cycles]
+		if not all(vpath.is_cycle(cycle) for cycle in cycles):
+			raise ValueError('CycleBasisBuilder was provided a non-cycle')
+		ecycles = [self.edge_mapper.map_path(cycle) for cycle in cycles]
+
+		successes, identities = self.basis.add_if_linearly_independent_csr(*_as_csr(ecycles))
+		successes = successes.tolist()
+
+		for success, identity, cycle, edgeids in zip(successes, identities.tolist(), cycles, ecycles):
+			if success:
+				self.__insert_cycle(identity, cycle, edgeids)
+		return successes
+
+	# Implementation of add_if_independent, which returns the new cycle's identity
+	#  (or None if it was not added)
+	def __add_if_independent(self, cycle):
 		if not vpath.is_cycle(cycle):
 			raise ValueError('CycleBasisBuilder was provided a non-cycle')
 		cycle = list(cycle)
@@ -61,56 +142,108 @@ class CycleBasisBuilder:
 
 		success, identity = self.basis.add_if_linearly_independent(edgeids)
 
-		if success:
-			assert identity not in self.cycles_by_id
-			self.cycles_by_id[identity] = cycle
-
-		return success
+		if not success:
+			return None
+
+		self.__insert_cycle(identity, cycle, edgeids)
+		return identity
+
+	def __insert_cycle(self, identity, cycle, edgeids):
+		assert identity not in self.cycles_by_id
+		self.cycles_by_id[identity] = cycle
+		for v in cycle[:-1]:
+			self.ids_by_vertex.setdefault(v, set()).add(identity)
+		for e in edgeids:
+			self.ids_by_edge.setdefault(e, set()).add(identity)
+
+	def __delete_cycle(self, identity):
+		cycle = self.cycles_by_id.pop(identity)
+		for v in cycle[:-1]:
+			self.__discard_from_index(self.ids_by_vertex, v, identity)
+		for e in self.edge_mapper.map_path(cycle):
+			self.__discard_from_index(self.ids_by_edge, e, identity)
+		return cycle
+
+	@staticmethod
+	def __discard_from_index(index, key, identity):
+		ids = index.get(key)
+		if ids is not None:
+			ids.discard(identity)
+			if not ids:
+				del index[key]
 
 	# Updates the cycle basis to account for the removal of a vertex from the graph.
+	# Returns a list of the identities of removed cycles, and a list of the identities
+	#  of added cycles.
 	def remove_vertex(self, v):
+		ids = self.ids_by_vertex.get(v, ())
+		return self.__replace_cycles(ids, lambda g: g.remove_node(v))
+
+	# Updates the cycle basis to account for the removal of an edge from the graph.
+	# Returns a list of the identities of removed cycles, and a list of the identities
+	#  of added cycles.
+	def remove_edge(self, s, t):
+		e = self.edge_mapper.edge_indices.get((s,t))
+		ids = self.ids_by_edge.get(e, ())
+		return self.__replace_cycles(ids, lambda g: g.remove_edge(s, t))
+
+	# Removes the cycles with the given ids, and replaces them with cycles from the
+	#  subgraph they cover, after applying ``modify`` to it.
+	def __replace_cycles(self, ids, modify):
 		import networkx as nx
 
-		badpaths = self.__pop_all_with_vertex(v)
+		removed, badpaths = self.__pop_all(ids)
 
 		if len(badpaths) == 0: # degenerate case
-			return
+			return [], []
 
 		g = nx.Graph()
 		for path in badpaths:
 			g.add_path(path)
 
-		g.remove_node(v)
+		modify(g)
 
+		added = []
 		rebuilt = nx.cycle_basis(g)
 		for cycle in rebuilt:
 			cycle.append(cycle[0])
-			self.add_if_independent(cycle)
-
-	# Removes all cycles with vertex v and returns them
-	def __pop_all_with_vertex(self, v):
-		invalidated = [(i,path) for (i,path) in self.cycles_by_id.items() if v in path]
+			identity = self.__add_if_independent(cycle)
+			if identity is not None:
+				added.append(identity)
+		return removed, added
 
-		if len(invalidated) == 0: # degenerate case for zip
-			return []
-
-		ids, paths = zip(*invalidated)
-
-		for i in ids:
-			del self.cycles_by_id[i]
+	# Removes the cycles with the given ids and returns their identities and the cycles.
+	# (in order of identity, which is also the order they were added in)
+	def __pop_all(self, ids):
+		ids = sorted(ids)
+		paths = [self.__delete_cycle(i) for i in ids]
 
 		# remove the corresponding rows from the rref bit matrix
-		self.basis.remove_ids(ids)
+		if ids:
+			self.basis.remove_ids(ids)
 
-		return paths
+		return ids, paths
 
 #----------------------
 
+# Flattens lists of columns into the CSR arrays accepted by XorBasisBuilder.add_many_csr.
+def _as_csr(rows):
+	offsets = np.zeros((len(rows) + 1,), dtype=np.intp)
+	np.cumsum(np.fromiter(map(len, rows), dtype=np.intp, count=len(rows)), out=offsets[1:])
+	columns = np.fromiter(itertools.chain.from_iterable(rows), dtype=np.uintc, count=offsets[-1])
+	return columns, offsets
+
 class EdgeIndexMapper:
 	def __init__(self):
 		self.edges = []
 		self.edge_indices = {}
 
+	def copy(self):
+		result = EdgeIndexMapper()
+		result.edges = list(self.edges)
+		result.edge_indices = dict(self.edge_indices)
+		return result
+
 	def map_path(self, path):
 		result = []
 		for s,t in vpath.edges(path):
@@ -127,5 +260,27 @@ assert _cbb1.add_if_independent('dcbd')
 assert not _cbb1.add_if_independent('acdba')
 assert not _cbb1.add_if_independent('abdca')
 
+_cbb4 = CycleBasisBuilder()
+assert _cbb4.add_if_independent_many(['abca', 'dcbd', 'acdba', 'abdca']) == [True, True, False, False]
+assert _cbb4.basis.__getstate__() == _cbb1.basis.__getstate__()
+
+_cbb2 = CycleBasisBuilder.from_basis_cycles(['abca', 'dcbd', 'daed'])
+assert _cbb2.remove_edge('b', 'e') == ([], [])
+assert _cbb2.remove_edge('d', 'c') == ([1], [])
+assert sorted(_cbb2.ids_by_vertex) == list('abcde')
+assert _cbb2.remove_vertex('e') == ([2], [])
+assert sorted(_cbb2.ids_by_vertex) == list('abc')
+
 # CycleBasisBuilder with degenerate cycle basis
 assertRaises(RuntimeError, CycleBasisBuilder.from_basis_cycles, ['1231', '4234', '42134'])
+
+_cbb3 = CycleBasisBuilder(engine=PackedXorBasisBuilder)
+assert _cbb3.add_if_independent('abca')
+assert _cbb3.add_if_independent('dcbd')
+assert not _cbb3.add_if_independent('acdba')
+assert not _cbb3.add_if_independent('abdca')
+assert _cbb3.basis.__getstate__() == _cbb1.basis.__getstate__()
+
+_xb = XorBasisBuilder()
+assert _xb.add_many_csr(*_as_csr([[0, 1], [], [1, 2]])).tolist() == [0, 1, 2]
+assert _xb.add_if_linearly_independent_csr(*_as_csr([[0, 2], [3]]))[0].tolist() == [False, True]
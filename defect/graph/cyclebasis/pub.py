@@ -4,9 +4,11 @@
 # (nothing interesting here; just delegates to implementations located elsewhere).
 
 from . import _planar
+from . import _minweight
 from defect.graph.cyclebasis.builder import CycleBasisBuilder
 import defect.filetypes.internal as fileio
 
+import copy
 import networkx as nx
 from defect.util import unzip_dict
 
@@ -55,9 +57,36 @@ def last_resort(g):
 		c.append(c[0]) # make loop
 	return cycles
 
+def minimum_weight(g, max_length=None, overlap_penalty=0.):
+	'''
+	Produce a cyclebasis of short cycles for an arbitrary graph.
+
+	This uses Horton's algorithm, which produces a minimum weight
+	cyclebasis.  Candidate cycles are considered in rounds of doubling
+	length, stopping once the basis is complete, so this is fast for
+	lattices and slow for graphs with few short cycles.  If a
+	``max_length`` is given, longer cycles are never considered, and
+	anything the shorter ones fail to span is filled in from
+	``last_resort``.
+
+	With a nonzero ``overlap_penalty``, each edge of a cycle costs
+	``1 + overlap_penalty * n`` instead of ``1``, where ``n`` is the
+	number of cycles already chosen that use it.  This discourages
+	overlapping cycles, which produce fill in the resistance matrix.
+	'''
+	return _minweight.minimum_weight_cycle_basis(g, max_length, overlap_penalty)
+
 #-----------------------------------------------------------
 
 # cbupdaters, which are provided to CurrentMeshSolver so it can... update the cbs.
+#
+# Each cbupdater associates an identity with each cycle (``get_cyclebasis_by_id``).
+# ``remove_vertex`` may return a pair of lists ``(removed, added)`` with the identities of
+#  the cycles it has changed, allowing the solver to patch only the affected parts of its
+#  equations; it may instead return ``None`` to indicate that anything may have changed.
+#
+# ``fork`` produces an independent cbupdater in the same state, for solvers that branch off
+#  from a common history.  (see ``MeshCurrentSolver.fork``)
 
 class planar_cbupdater:
 	'''
@@ -69,8 +98,13 @@ class planar_cbupdater:
 		self.cycles = cycles
 	def remove_vertex(self, g, v):
 		self.cycles = _planar.without_vertex(self.cycles, v)
+		return None # cycles are renumbered
 	def get_cyclebasis(self):
 		return self.cycles
+	def get_cyclebasis_by_id(self):
+		return dict(enumerate(self.cycles))
+	def fork(self):
+		return copy.copy(self) # (self.cycles is replaced rather than modified)
 
 class builder_cbupdater:
 	'''
@@ -81,10 +115,20 @@ class builder_cbupdater:
 	'''
 	def init(self, cycles):
 		self.builder = CycleBasisBuilder.from_basis_cycles(cycles)
+		self.shared = False
 	def remove_vertex(self, g, v):
-		self.builder.remove_vertex(v)
+		# copy-on-write; a builder shared with a fork is copied before it is modified
+		if self.shared:
+			self.builder = self.builder.copy()
+			self.shared = False
+		return self.builder.remove_vertex(v)
 	def get_cyclebasis(self):
 		return self.builder.cycles
+	def get_cyclebasis_by_id(self):
+		return self.builder.cycles_by_id
+	def fork(self):
+		self.shared = True
+		return copy.copy(self)
 
 class dummy_cbupdater:
 	'''
@@ -101,4 +145,8 @@ class dummy_cbupdater:
 		raise NotImplementedError("dummy_cbupdater")
 	def get_cyclebasis(self):
 		return self.cycles
+	def get_cyclebasis_by_id(self):
+		return dict(enumerate(self.cycles))
+	def fork(self):
+		return copy.copy(self)
 
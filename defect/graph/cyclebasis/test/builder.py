@@ -0,0 +1,68 @@
+import unittest
+import networkx as nx
+from defect.graph.cyclebasis.builder import CycleBasisBuilder
+import defect.graph.path as vpath
+
+#----------------------------------------------------
+
+class RemoveEdgeTests(unittest.TestCase):
+
+	def setUp(self):
+		self.g = nx.grid_2d_graph(4, 4)
+		self.builder = CycleBasisBuilder()
+
+		# the edge (0,0)-(0,1) is shared by the first three cycles
+		rects = [rectangle(0, 0, w, 1) for w in (1, 2, 3)]
+		faces = [rectangle(i, j, 1, 1) for i in range(3) for j in range(3)]
+		for cycle in rects + faces:
+			self.builder.add_if_independent(cycle)
+		self.assertEqual(len(self.builder.cycles), cycle_rank(self.g))
+
+	def test_shared_edge(self):
+		e = ((0,0), (0,1))
+		users = set(self.builder.ids_by_edge[self.builder.edge_mapper.edge_indices[e]])
+		self.assertEqual(len(users), 3)
+
+		removed, added = self.builder.remove_edge(*e)
+		self.assertEqual(set(removed), users)
+		self.assertEqual(len(added), 2)
+
+		self.g.remove_edge(*e)
+		cycles = list(self.builder.cycles)
+		self.assertEqual(len(cycles), cycle_rank(self.g))
+		for cycle in cycles:
+			self.assertTrue(all(self.g.has_edge(s, t) for (s, t) in vpath.edges(cycle)))
+		CycleBasisBuilder.from_basis_cycles(cycles) # raises if dependent
+		check_indices(self, self.builder)
+
+	def test_missing_edge(self):
+		before = sorted(map(tuple, self.builder.cycles))
+		for e in [((0,0), (1,1)), ((0,0), 'nowhere')]:
+			self.assertEqual(self.builder.remove_edge(*e), ([], []))
+		self.assertEqual(sorted(map(tuple, self.builder.cycles)), before)
+		check_indices(self, self.builder)
+
+	def test_indices_after_many_removals(self):
+		for e in [((1,1), (1,2)), ((2,2), (2,3)), ((0,0), (0,1)), ((1,1), (1,2))]:
+			self.builder.remove_edge(*e)
+			check_indices(self, self.builder)
+
+# The cycle around a w x h rectangle of the grid, with its first vertex repeated.
+def rectangle(i, j, w, h):
+	path = [(i+x, j) for x in range(w)] + [(i+w, j+y) for y in range(h)]
+	path += [(i+w-x, j+h) for x in range(w)] + [(i, j+h-y) for y in range(h)]
+	return path + path[:1]
+
+def cycle_rank(g):
+	return g.number_of_edges() - g.number_of_nodes() + nx.number_connected_components(g)
+
+# ids_by_vertex and ids_by_edge must describe exactly the cycles in the basis.
+def check_indices(test, builder):
+	by_vertex, by_edge = {}, {}
+	for identity, cycle in builder.cycles_by_id.items():
+		for v in cycle[:-1]:
+			by_vertex.setdefault(v, set()).add(identity)
+		for e in builder.edge_mapper.map_path(cycle):
+			by_edge.setdefault(e, set()).add(identity)
+	test.assertEqual(builder.ids_by_vertex, by_vertex)
+	test.assertEqual(builder.ids_by_edge, by_edge)
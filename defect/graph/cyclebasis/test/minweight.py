@@ -0,0 +1,58 @@
+
+import unittest
+import networkx as nx
+from defect.graph.cyclebasis._minweight import *
+from defect.graph.cyclebasis._minweight import horton_candidates
+from defect.graph.cyclebasis.builder import CycleBasisBuilder
+import defect.graph.path as vpath
+
+#----------------------------------------------------
+
+class MinimumWeightTests(unittest.TestCase):
+
+	def test_known_weights(self):
+		# (minimum weight cycle bases of these are made of their shortest cycles)
+		for g, lengths in [
+			(nx.complete_graph(4), [3]*3),
+			(nx.complete_bipartite_graph(3,3), [4]*4),
+			(nx.petersen_graph(), [5]*6),
+			(nx.cycle_graph(7), [7]),
+			(nx.path_graph(4), []),
+		]:
+			cb = check_cyclebasis(g, minimum_weight_cycle_basis(g))
+			self.assertEqual(sorted(len(c) - 1 for c in cb), lengths)
+
+	def test_grid_faces(self):
+		g = nx.grid_2d_graph(5, 6)
+		faces = [[(i,j), (i+1,j), (i+1,j+1), (i,j+1), (i,j)] for i in range(4) for j in range(5)]
+		for penalty in (0., 1.):
+			cb = check_cyclebasis(g, minimum_weight_cycle_basis(g, overlap_penalty=penalty))
+			self.assertEqual(vpath.canonicalize_cyclebasis(cb), vpath.canonicalize_cyclebasis(faces))
+
+	def test_max_length(self):
+		# too short to find anything but the triangles; the rest comes from the fallback
+		g = nx.disjoint_union(nx.complete_graph(4), nx.cycle_graph(9))
+		cb = check_cyclebasis(g, minimum_weight_cycle_basis(g, max_length=3))
+		self.assertEqual(sorted(len(c) - 1 for c in cb), [3, 3, 3, 9])
+
+	def test_overlap_penalty(self):
+		# a penalty only reorders the candidates; the result is still a basis
+		g = nx.random_regular_graph(3, 40, seed=0)
+		for penalty in (0., 0.5, 5.):
+			check_cyclebasis(g, minimum_weight_cycle_basis(g, overlap_penalty=penalty))
+
+	def test_candidates_unique(self):
+		g = nx.complete_graph(5)
+		keys = [frozenset(frozenset(e) for e in vpath.edges(c)) for c in horton_candidates(g)]
+		self.assertEqual(len(keys), len(set(keys)))
+		self.assertTrue(all(c[0] == c[-1] and len(set(c)) == len(c) - 1 for c in horton_candidates(g)))
+
+# Checks that the cycles form a cycle basis of g, and returns them.
+def check_cyclebasis(g, cycles):
+	rank = g.number_of_edges() - g.number_of_nodes() + nx.number_connected_components(g)
+	assert len(cycles) == rank
+	for cycle in cycles:
+		assert vpath.is_cycle(cycle)
+		assert all(g.has_edge(s, t) for (s, t) in vpath.edges(cycle))
+	CycleBasisBuilder.from_basis_cycles(cycles) # raises if dependent
+	return cycles
@@ -0,0 +1,79 @@
+import unittest
+import random
+import threading
+from functools import reduce
+
+from _defect import XorBasisBuilder, PackedXorBasisBuilder
+
+#----------------------------------------------------
+
+class ThreadingTests(unittest.TestCase):
+
+	# One builder shared by several threads should end up in a consistent state, as should
+	#  any copies and snapshots taken along the way.  Each thread works in its own range of
+	#  columns, so that the rows it keeps are the only ones it can know about.
+	def test_shared_builder(self):
+		for engine in (XorBasisBuilder, PackedXorBasisBuilder):
+			basis = engine()
+			kept_rows = {}
+			snapshots = []
+			errors = []
+			lock = threading.Lock()
+
+			def work(k):
+				try:
+					rng = random.Random(k)
+					def random_row():
+						return rng.sample(range(100*k, 100*k + 100), rng.randint(1, 6))
+
+					for _ in range(5):
+						rows = [random_row() for _ in range(40)]
+						ids = basis.add_many(rows)
+						ids.append(basis.add(rows[0])) # (a zero sum)
+						rows.append(rows[0])
+
+						success, _ = basis.add_if_linearly_independent(rows[1])
+						assert not success
+
+						removed = set(rng.sample(ids, len(ids) // 3))
+						basis.remove_ids(removed)
+
+						copied = basis.copy()
+						with lock:
+							kept_rows.update((i, row) for (i, row) in zip(ids, rows) if i not in removed)
+							snapshots.append(copied.__getstate__())
+							snapshots.append(basis.__getstate__())
+				except Exception as e:
+					errors.append(e)
+
+			threads = [threading.Thread(target=work, args=(k,)) for k in range(4)]
+			for t in threads: t.start()
+			for t in threads: t.join()
+			self.assertEqual(errors, [])
+
+			state = basis.__getstate__()
+			self.assertEqual(sorted(i for (i, _) in state['originals']), sorted(kept_rows))
+			for i, row in state['originals']:
+				self.assertEqual(sorted(row), sorted(kept_rows[i]))
+
+			# the same rank and number of zero sums as the kept rows added by one thread
+			fresh = engine()
+			fresh.add_many(kept_rows.values())
+			fresh_state = fresh.__getstate__()
+			self.assertEqual(count_nonempty(state['rows']), count_nonempty(fresh_state['rows']))
+			self.assertEqual(len(basis.get_zero_sums()), len(fresh.get_zero_sums()))
+
+			for snapshot in snapshots + [state]:
+				check_state(snapshot)
+				engine().__setstate__(snapshot) # raises if not in row echelon form
+
+def count_nonempty(rows):
+	return sum(1 for row in rows if row)
+
+# Every row must be the sum of the original rows named by its aug.
+def check_state(state):
+	originals = {i: frozenset(row) for (i, row) in state['originals']}
+	assert len(state['rows']) == len(state['augs']) == len(originals)
+	for row, aug in zip(state['rows'], state['augs']):
+		assert aug
+		assert frozenset(row) == reduce(frozenset.symmetric_difference, (originals[i] for i in aug))
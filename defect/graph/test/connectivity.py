@@ -0,0 +1,34 @@
+import unittest
+import random
+
+import numpy as np
+import networkx as nx
+
+from defect.graph.connectivity import *
+
+class DecrementalConnectivityTests(unittest.TestCase):
+	# Delete vertices from random graphs, checking against networkx after each one.
+	def test_random_deletions(self):
+		for _ in range(10):
+			g = nx.gnm_random_graph(40, random.choice([30, 45, 60, 90]))
+			edges = g.edges()
+
+			# CSR adjacency, in the form DecrementalConnectivity expects
+			ends   = np.array([s for (s,t) in edges] + [t for (s,t) in edges], dtype=int)
+			others = np.array([t for (s,t) in edges] + [s for (s,t) in edges], dtype=int)
+			eids   = np.concatenate([np.arange(len(edges))] * 2)
+			order  = np.argsort(ends, kind='mergesort')
+			ptr = np.zeros(len(g) + 1, dtype=int)
+			ptr[1:] = np.cumsum(np.bincount(ends, minlength=len(g)))
+
+			conn = DecrementalConnectivity(ptr, others[order], eids[order])
+
+			for v in random.sample(g.nodes(), len(g)):
+				self.assertEqual(conn.component_count(), nx.number_connected_components(g))
+				s, t = random.sample(g.nodes(), 2) if len(g) >= 2 else (v, v)
+				self.assertEqual(conn.connected(s, t), nx.has_path(g, s, t))
+
+				conn.remove_node(v)
+				g.remove_node(v)
+
+			self.assertEqual(conn.component_count(), 0)
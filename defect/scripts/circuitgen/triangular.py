@@ -86,8 +86,8 @@ def make_circuit(nrows, ncols):
 
 	# add circuit properties
 	builder = CircuitBuilder(g)
-	for s,t in resistors:
-		builder.make_resistor(s, t, 1.0)
+	src, dst = zip(*resistors)
+	builder.add_components(src, dst, resistance=1.0)
 
 	builder.make_battery(botv, topv, 1.0)
 
@@ -0,0 +1,38 @@
+import networkx as nx
+import unittest
+import random
+
+from defect.buildcb import build_cyclebasis
+import defect.graph.path as vpath
+
+class BuildCyclebasisTests(unittest.TestCase):
+	# Blocks only change how often progress is reported, never which cycles are taken.
+	def test_block_size(self):
+		g = nx.grid_2d_graph(12, 12)
+		faces = [[(i,j), (i+1,j), (i+1,j+1), (i,j+1)] for i in range(11) for j in range(11)]
+		pairs = [[(i,j), (i+1,j), (i+2,j), (i+2,j+1), (i+1,j+1), (i,j+1)] for i in range(10) for j in range(11)]
+		fallback = nx.cycle_basis(g)
+
+		rng = random.Random(0)
+		candidates = faces + pairs
+		rng.shuffle(candidates)
+
+		for thorough in (False, True):
+			def build(block_size):
+				copies = [list(c) for c in candidates]
+				return list(build_cyclebasis(copies, [list(c) for c in fallback],
+					thorough=thorough, block_size=block_size))
+
+			expected = build(1)
+			self.assertEqual(len(expected), len(fallback))
+			for block_size in (7, 1000):
+				self.assertEqual(build(block_size), expected)
+
+	# When not thorough, cycles beyond the first complete basis are never examined
+	#  (even if they are not in the graph at all).
+	def test_stop_when_complete(self):
+		g = nx.cycle_graph(4)
+		bogus = [0, 1, 'nowhere', 0]
+		for block_size in (1, 1000):
+			cb = build_cyclebasis([[0, 1, 2, 3], bogus], nx.cycle_basis(g), block_size=block_size)
+			self.assertEqual([vpath.canonicalize_cycle(c) for c in cb], [vpath.canonicalize_cycle([0, 1, 2, 3, 0])])
@@ -29,6 +29,57 @@ class MiscCurrentTests(unittest.TestCase):
 			assertNear(currents[s,t], +2.5)
 			assertNear(currents[t,s], -2.5)
 
+	# Loops hanging off of the battery's loop through a single vertex carry no current,
+	#  and are left out of the linear solve.
+	def test_unpowered_block(self):
+		g = nx.Graph()
+		g.add_path('abca')
+		g.add_path('cxyc')
+		g.add_edge('y', 'z')
+		builder = CircuitBuilder(g)
+		builder.make_battery('a', 'b', 5.0)
+		for s,t in ('bc', 'ca', 'cx', 'xy', 'yc', 'yz'):
+			builder.make_resistor(s, t, 1.0)
+		circuit = builder.build()
+
+		cycles = defect.graph.cyclebasis.last_resort(circuit)
+		solver = MeshCurrentSolver(circuit, cycles)
+		for s,t in ('ab', 'bc', 'ca'):
+			assertNear(solver.get_current(s,t), 2.5)
+		for s,t in ('cx', 'xy', 'yc', 'yz'):
+			self.assertEqual(solver.get_current(s,t), 0.0)
+
+		# resistance changes in either block
+		solver.assign_edge_resistance('x', 'y', 3.0)
+		solver.assign_edge_resistance('b', 'c', 4.0)
+		assertNear(solver.get_current('a','b'), 1.0)
+		self.assertEqual(solver.get_current('x','y'), 0.0)
+
+	# Both solvers track whether an edge still lies on a cycle as nodes are deleted.
+	def test_alternate_path(self):
+		g = nx.Graph()
+		g.add_path('abcda')
+		g.add_path('aefb')
+		builder = CircuitBuilder(g)
+		builder.make_battery('a', 'b', 5.0)
+		for s,t in g.edges():
+			if set((s,t)) != set('ab'):
+				builder.make_resistor(s, t, 1.0)
+		circuit = builder.build()
+
+		cycles = defect.graph.cyclebasis.last_resort(circuit)
+		for solver in [
+			MeshCurrentSolver(circuit, cycles, defect.graph.cyclebasis.builder_cbupdater()),
+			NodalCurrentSolver(circuit),
+		]:
+			self.assertTrue(solver.has_alternate_path('a', 'b'))
+			solver.delete_node('c')
+			self.assertTrue(solver.has_alternate_path('b', 'a'))
+			self.assertNotEqual(solver.get_current('a', 'b'), 0.)
+			solver.delete_node('e')
+			self.assertFalse(solver.has_alternate_path('a', 'b'))
+			self.assertEqual(solver.get_current('a', 'b'), 0.)
+
 	# A circuit with loops that share an edge.
 	# This is an extremely basic test for how the resistance matrix is generated;
 	#  even a simple circuit such as this has cycles which are "linearly dependent"
@@ -76,6 +127,415 @@ class MiscCurrentTests(unittest.TestCase):
 			assertNear(solver.get_current(s,t), currents[s,t])
 			assertNear(solver.get_current(t,s), currents[t,s])
 
+	# `get_all_currents_array` should line up with `get_edges`, and stay that way
+	#  after nodes are deleted
+	def test_currents_array_alignment(self):
+		g = nx.grid_2d_graph(4,4)
+		builder = CircuitBuilder(g)
+		for s,t in g.edges():
+			builder.make_component(s, t, resistance=random.random(), voltage=random.random())
+		circuit = builder.build()
+
+		cycles = defect.graph.cyclebasis.last_resort(circuit)
+		solver = MeshCurrentSolver(circuit, cycles, defect.graph.cyclebasis.builder_cbupdater())
+
+		for v in [None, (1,1), (2,3)]:
+			if v is not None:
+				solver.delete_node(v)
+			edges = solver.get_edges()
+			currents = solver.get_all_currents_array()
+			self.assertEqual(len(edges), len(currents))
+			self.assertEqual(set(edges) | set((t,s) for (s,t) in edges), set(solver.get_all_currents()))
+			for (s,t), current in zip(edges, currents):
+				assertNear(current, solver.get_current(s,t))
+				self.assertEqual(circuit_edge_sign(circuit, s, t), 1.0)
+
+	# Resistance changes are applied to an existing factorization as a low rank update
+	#  (up to a limit); results should match a solver built from scratch.
+	def test_resistance_update_consistency(self):
+		g = nx.gnm_random_graph(12,40)
+		builder = CircuitBuilder(g)
+		for s,t in g.edges():
+			builder.make_component(s, t, resistance=1.+random.random(), voltage=random.random())
+		circuit = builder.build()
+		cycles = defect.graph.cyclebasis.last_resort(circuit)
+
+		solver = MeshCurrentSolver(circuit, cycles, max_update_rank=4)
+		solver.get_current(*g.edges()[0]) # make sure there's a factorization to update
+
+		# enough modifications to exceed max_update_rank at least once,
+		#  including some repeated edges
+		for s,t in random.sample(g.edges(), 6) * 2:
+			if random.random() < 0.5:
+				solver.multiply_edge_resistance(s, t, 3.)
+			else:
+				solver.assign_edge_resistance(s, t, 5.)
+
+			expected = compute_circuit_currents(solver.circuit(), cycles)
+			for s,t in g.edges():
+				assertNear(solver.get_current(s,t), expected[s,t])
+
+	# After a node deletion, only the cycles replaced by the cbupdater are recomputed;
+	#  results should match a solver built from scratch.
+	def test_deletion_consistency(self):
+		g = nx.grid_2d_graph(6,6)
+		builder = CircuitBuilder(g)
+		for s,t in g.edges():
+			builder.make_component(s, t, resistance=1.+random.random(), voltage=random.random())
+		circuit = builder.build()
+		cycles = defect.graph.cyclebasis.last_resort(circuit)
+
+		solver = MeshCurrentSolver(circuit, cycles, defect.graph.cyclebasis.builder_cbupdater())
+		solver.get_all_currents() # make sure there's something to patch
+
+		for v in random.sample(g.nodes(), 20):
+			solver.delete_node(v)
+			expected = compute_circuit_currents(solver.circuit())
+			for (s,t),current in solver.get_all_currents().items():
+				assertNear(current, expected[s,t])
+
+	# Named sources are solved alongside the circuit's own voltages; each should match the
+	#  circuit with all other voltages set to zero and the other sources removed, in both solvers.
+	def test_named_sources(self):
+		from defect.circuit import EATTR_VOLTAGE
+
+		g = nx.grid_2d_graph(5,5)
+		builder = CircuitBuilder(g)
+		for s,t in g.edges():
+			builder.make_component(s, t, resistance=1.+random.random(), voltage=random.random())
+		builder.make_battery((0,0), (0,4), 1.0)
+		circuit = builder.build()
+		sources = {'x': ((0,4), (0,0), 2.0), 'r': ((2,2), (2,3), 0.5)}
+
+		def expected(circuit, name):
+			s, t, voltage = sources[name]
+			circuit = circuit.copy()
+			for a,b in circuit.edges():
+				circuit.edge[a][b][EATTR_VOLTAGE] = 0.
+			circuit.edge[s][t][EATTR_VOLTAGE] = circuit_edge_sign(circuit, s, t) * voltage
+
+			opened = [(a,b) for (other,(a,b,_)) in sources.items() if other != name]
+			circuit.remove_edges_from(opened)
+			currents = compute_circuit_currents(circuit)
+			for a,b in opened:
+				currents[a,b] = currents[b,a] = 0.
+			return currents
+
+		cycles = defect.graph.cyclebasis.last_resort(circuit)
+		for solver in [
+			MeshCurrentSolver(circuit, cycles, defect.graph.cyclebasis.builder_cbupdater(), sources=sources),
+			NodalCurrentSolver(circuit, sources=sources),
+		]:
+			self.assertEqual(sorted(solver.source_names()), ['r', 'x'])
+			for v in [None, (1,1), (3,2)]:
+				if v is not None:
+					solver.delete_node(v)
+					solver.multiply_edge_resistance((2,2), (2,3), 2.)
+
+				table = solver.get_all_source_currents_array()
+				for k, name in enumerate(solver.source_names()):
+					currents = expected(solver.circuit(), name)
+					for (s,t), current in zip(solver.get_edges(), table[:,k]):
+						assertNear(current, currents[s,t])
+						assertNear(solver.get_source_current(name, t, s), currents[t,s])
+
+	# Two batteries across one lattice, one horizontal and one vertical.  While either of
+	#  them drives the circuit, the other must not act as a short; its currents should match
+	#  those of the lattice with only the one battery.
+	def test_orthogonal_sources(self):
+		sources = {'horizontal': ((0,2), (5,2), 1.0), 'vertical': ((3,0), (3,5), 2.0)}
+		resistances = {}
+
+		def lattice(names):
+			g = nx.grid_2d_graph(6,6)
+			builder = CircuitBuilder(g)
+			for s,t in g.edges():
+				r = resistances.setdefault(frozenset([s,t]), 1.+random.random())
+				builder.make_component(s, t, resistance=r)
+			for name in names:
+				builder.make_battery(*sources[name])
+			return builder.build()
+
+		circuit = lattice(sources)
+		cycles = defect.graph.cyclebasis.last_resort(circuit)
+		for solver in [
+			MeshCurrentSolver(circuit, cycles, defect.graph.cyclebasis.builder_cbupdater(), sources=sources),
+			NodalCurrentSolver(circuit, sources=sources),
+		]:
+			table = solver.get_all_source_currents_array()
+			for k, name in enumerate(solver.source_names()):
+				(other,) = set(sources) - set([name])
+				expected = compute_circuit_currents(lattice([name]))
+				for (s,t), current in zip(solver.get_edges(), table[:,k]):
+					assertNear(current, expected.get((s,t), 0.))
+					assertNear(solver.get_source_current(name, t, s), expected.get((t,s), 0.))
+
+				s, t, _ = sources[other]
+				assertNear(solver.get_source_current(name, s, t), 0.)
+
+	# Effective resistances should match those computed from the pseudoinverse of the
+	#  Laplacian, including after modifications; the approximate mode should be close.
+	def test_effective_resistance(self):
+		import numpy as np
+		from defect.circuit import EATTR_RESISTANCE
+
+		g = nx.grid_2d_graph(5,5)
+		g.add_path(['x','y','z','x'])
+		builder = CircuitBuilder(g)
+		for s,t in g.edges():
+			builder.make_component(s, t, resistance=1.+random.random(), voltage=random.random())
+		circuit = builder.build()
+
+		def expected(circuit, pairs):
+			nodes = circuit.nodes()
+			index = {v:i for (i,v) in enumerate(nodes)}
+			laplacian = np.zeros((len(nodes),)*2)
+			for s,t in circuit.edges():
+				i, j = index[s], index[t]
+				conductance = 1. / circuit.edge[s][t][EATTR_RESISTANCE]
+				laplacian[[i,j],[i,j]] += conductance
+				laplacian[[i,j],[j,i]] -= conductance
+			pinv = np.linalg.pinv(laplacian)
+			result = []
+			for s,t in pairs:
+				if not nx.has_path(circuit, s, t):
+					result.append(float('inf'))
+					continue
+				x = np.zeros((len(nodes),))
+				x[index[s]] += 1.
+				x[index[t]] -= 1.
+				result.append(x.dot(pinv).dot(x))
+			return result
+
+		cycles = defect.graph.cyclebasis.last_resort(circuit)
+		solver = MeshCurrentSolver(circuit, cycles, defect.graph.cyclebasis.builder_cbupdater())
+		for v in [None, (1,1), (2,3)]:
+			if v is not None:
+				solver.delete_node(v)
+				solver.multiply_edge_resistance((0,0), (0,1), 3.)
+				solver.multiply_edge_resistance('x', 'y', 2.)
+
+			nodes = solver.circuit().nodes()
+			pairs = [tuple(random.sample(nodes, 2)) for _ in range(10)] + [((0,0), 'x'), ((0,0), (0,0))]
+			exact = solver.get_effective_resistances(pairs)
+			approx = solver.get_effective_resistances(pairs, approximate=True, dimension=4000, seed=0)
+			for (s,t), x, y, z in zip(pairs, exact, approx, expected(solver.circuit(), pairs)):
+				if z == float('inf'):
+					self.assertEqual(x, z)
+					self.assertEqual(y, z)
+				else:
+					assertNear(x, z)
+					self.assertLess(abs(y - z), 0.25 * z + 1e-7)
+			self.assertEqual(solver.get_effective_resistance((0,0), 'x'), float('inf'))
+			self.assertEqual(solver.get_effective_resistance((0,0), (0,0)), 0.)
+
+	# Currents computed through a series-parallel reduction should match a solve of the
+	#  full circuit, including chains, dangling trees, and loops that reduce away entirely.
+	def test_series_parallel_reduction(self):
+		g = nx.grid_2d_graph(4,4)
+		for s,t in g.edges()[:6]:
+			g.remove_edge(s,t)
+			g.add_path([s, (s,t,1), (s,t,2), t])
+		g.add_path([(0,0), 'tail1', 'tail2'])
+		g.add_path(['x', 'y', 'z', 'x'])
+		builder = CircuitBuilder(g)
+		for s,t in g.edges():
+			builder.make_component(s, t, resistance=1.+random.random(), voltage=random.random())
+		builder.make_battery((0,0), (0,1), 1.0)
+		circuit = builder.build()
+
+		reduction = reduce_circuit(circuit, keep=[(0,0), (0,1)])
+		self.assertLess(reduction.circuit.number_of_nodes(), 16)
+		self.assertTrue(reduction.circuit.has_edge((0,0), (0,1)))
+
+		expected = compute_circuit_currents(circuit, defect.graph.cyclebasis.last_resort(circuit))
+		for currents in [
+			compute_circuit_currents(circuit),
+			reduction.expand_currents(compute_circuit_currents(reduction.circuit)),
+		]:
+			self.assertEqual(set(currents), set(expected))
+			for (s,t), current in currents.items():
+				assertNear(current, expected[s,t])
+
+	# Batch results should match individual solves, whatever the form of the input.
+	def test_batch_currents(self):
+		import os
+		import tempfile
+
+		circuits = []
+		for _ in range(6):
+			g = nx.gnm_random_graph(8,20)
+			builder = CircuitBuilder(g)
+			for s,t in g.edges():
+				builder.make_component(s, t, resistance=1.+random.random(), voltage=random.random())
+			circuits.append(builder.build())
+
+		with tempfile.TemporaryDirectory() as tmp:
+			path = os.path.join(tmp, 'circuit.json')
+			save_circuit(circuits[0], path)
+			items = iter([
+				path,
+				circuits[1],
+				(circuits[2], None),
+				(circuits[3], defect.graph.cyclebasis.last_resort(circuits[3])),
+				(path, None),
+			] + circuits[4:])
+
+			results = dict(compute_circuit_currents_batch(items, processes=2, max_in_flight=3))
+
+		self.assertEqual(sorted(results), list(range(7)))
+		for index, circuit in enumerate([circuits[0]] + circuits[1:4] + circuits[:1] + circuits[4:]):
+			expected = compute_circuit_currents(circuit)
+			self.assertEqual(set(results[index]), set(expected))
+			for e, current in results[index].items():
+				assertNear(current, expected[e])
+
+	# Components given in bulk should produce the same circuit as individual calls to
+	#  make_component in the same order, down to the order of nodes and edges.
+	def test_add_components(self):
+		import numpy as np
+
+		g = nx.gnm_random_graph(20,60)
+		edges = [random.choice([(s,t), (t,s)]) for (s,t) in g.edges()]
+		edges += random.sample(edges, 10) # some repeated, possibly reversed
+		resistances = np.random.random(len(edges))
+
+		single = CircuitBuilder(g)
+		bulk = CircuitBuilder(g)
+		src, dst = np.array(edges).T
+		for builder in [single, bulk]:
+			builder.make_battery(edges[0][0], edges[0][1], 3.0)
+
+		for (s,t), r in zip(edges, resistances):
+			single.make_component(s, t, resistance=r, voltage=0.5)
+		bulk.add_components(src[:30], dst[:30], resistances[:30], voltage=0.5)
+		bulk.add_components(src[30:], dst[30:], resistances[30:], voltage=np.full((len(edges)-30,), 0.5))
+
+		for builder in [single, bulk]:
+			builder.make_battery(edges[1][1], edges[1][0], 2.0)
+			builder.make_resistor(100, 101, 1.0)
+			builder.add_node(102)
+
+		expected, actual = single.build(), bulk.build()
+		self.assertEqual(expected.nodes(), actual.nodes())
+		self.assertEqual(expected.edges(data=True), actual.edges(data=True))
+
+	# A forked solver and its parent should each follow their own modifications, with
+	#  results matching a solver built from scratch.
+	def test_fork(self):
+		g = nx.grid_2d_graph(5,5)
+		builder = CircuitBuilder(g)
+		for s,t in g.edges():
+			builder.make_component(s, t, resistance=1.+random.random(), voltage=random.random())
+		circuit = builder.build()
+		cycles = defect.graph.cyclebasis.last_resort(circuit)
+
+		for parent in [
+			MeshCurrentSolver(circuit, cycles, defect.graph.cyclebasis.builder_cbupdater()),
+			MeshCurrentSolver(circuit, cycles, defect.graph.cyclebasis.builder_cbupdater(),
+				method=MeshCurrentSolver.METHOD_CG, cg_options={'tol': 1e-12}),
+			NodalCurrentSolver(circuit),
+		]:
+			parent.delete_node((1,1))
+			parent.get_all_currents() # make sure there's something to share
+			child = parent.fork()
+
+			parent.delete_node((3,3))
+			child.delete_node((2,3))
+			child.multiply_edge_resistance((0,0), (0,1), 5.)
+			parent.multiply_edge_resistance((4,4), (4,3), 2.)
+
+			for solver in [child, parent, child.fork()]:
+				expected = compute_circuit_currents(solver.circuit())
+				for (s,t),current in solver.get_all_currents().items():
+					assertNear(current, expected[s,t])
+
+	# A solver restored by load_state should continue exactly where the saved one left off.
+	def test_save_state(self):
+		import os
+		import tempfile
+
+		g = nx.grid_2d_graph(5,5)
+		builder = CircuitBuilder(g)
+		for s,t in g.edges():
+			builder.make_component(s, t, resistance=1.+random.random(), voltage=random.random())
+		circuit = builder.build()
+		cycles = defect.graph.cyclebasis.last_resort(circuit)
+
+		solver = MeshCurrentSolver(circuit, cycles, defect.graph.cyclebasis.builder_cbupdater())
+		solver.delete_node((1,1))
+		solver.multiply_edge_resistance((0,0), (0,1), 5.)
+		solver.get_all_currents()
+
+		with tempfile.TemporaryDirectory() as tmp:
+			path = os.path.join(tmp, 'solver.pickle')
+			solver.save_state(path)
+			restored = MeshCurrentSolver.load_state(path)
+
+		for x in [solver, restored]:
+			x.delete_node((3,2))
+			x.multiply_edge_resistance((4,4), (4,3), 2.)
+		expected = compute_circuit_currents(solver.circuit())
+		for (s,t),current in restored.get_all_currents().items():
+			assertNear(current, expected[s,t])
+		self.assertEqual(restored.get_edges(), solver.get_edges())
+
+	# The resistance matrix is refreshed in-place from precomputed terms; it should match
+	#  the plain product C diag(r) C.T, even when some resistances are zero.
+	def test_resistance_matrix_pattern(self):
+		from defect.circuit import CircuitArrays, ResistanceMatrixPattern
+		from defect.circuit import compute_cycle_incidence, compute_resistance_matrix
+
+		g = nx.gnm_random_graph(12,40)
+		builder = CircuitBuilder(g)
+		for s,t in g.edges():
+			builder.make_component(s, t, resistance=random.choice([0., 1.+random.random()]))
+		circuit = builder.build()
+		cycles = defect.graph.cyclebasis.last_resort(circuit)
+
+		arrays = CircuitArrays.from_circuit(circuit)
+		incidence = compute_cycle_incidence(arrays, cycles)
+		pattern = ResistanceMatrixPattern.from_incidence(incidence)
+
+		expected = compute_resistance_matrix(arrays, incidence).toarray()
+		actual = pattern.matrix(arrays.resistance).toarray()
+		self.assertEqual(actual.shape, (len(cycles), len(cycles)))
+		for x, y in zip(actual.flat, expected.flat):
+			assertNear(x, y)
+
+	# NodalCurrentSolver should agree with MeshCurrentSolver, including after modifications
+	def test_nodal_consistency(self):
+		g = nx.gnm_random_graph(10,20)
+		builder = CircuitBuilder(g)
+		edges = g.edges()
+		builder.make_battery(*edges[0], 3.0)
+		for s,t in edges[1:]:
+			builder.make_component(s, t, resistance=1.+random.random(), voltage=random.random())
+		circuit = builder.build()
+
+		cycles = defect.graph.cyclebasis.last_resort(circuit)
+		mesh = MeshCurrentSolver(circuit, cycles, defect.graph.cyclebasis.builder_cbupdater())
+		nodal = NodalCurrentSolver(circuit)
+
+		def check():
+			expected = mesh.get_all_currents()
+			for (s,t),current in nodal.get_all_currents().items():
+				assertNear(current, expected[s,t])
+			for (s,t),current in zip(nodal.get_edges(), nodal.get_all_currents_array()):
+				assertNear(current, nodal.get_current(s,t))
+
+		check()
+		for s,t in edges[1:5]:
+			mesh.multiply_edge_resistance(s, t, 10.)
+			nodal.multiply_edge_resistance(s, t, 10.)
+		check()
+		for v in set(g) - set(edges[0]):
+			if len(nodal.circuit()) <= 4:
+				break
+			mesh.delete_node(v)
+			nodal.delete_node(v)
+			check()
+
 def assertNear(a,b,eps=1e-7):
 	assert abs(a-b) < eps
 
@@ -10,18 +10,30 @@ class Config:
 	therefore isn't part of the ``.circuit`` file).
 
 	Bit of a wart in the design at this point, really.
+
+	It may optionally name additional voltage sources, whose currents are recorded
+	alongside that of the measured edge (see ``TrialRunner.set_sources``).  Each is
+	a table under ``[sources]``::
+
+	    [sources.x]
+	    edge = ["left", "right"]
+	    voltage = 1.0  # optional; this is the default
 	'''
-	def __init__(self, measured_edge=None, no_defect=None):
+	def __init__(self, measured_edge=None, no_defect=None, sources=None):
 		self.__edge = None
 		self.__no_defect = None
+		self.__sources = {}
 		if measured_edge is not None: self.set_measured_edge(*measured_edge)
 		if no_defect is not None: self.set_no_defect(no_defect)
+		if sources is not None: self.set_sources(sources)
 
 	def set_measured_edge(self, s, t): self.__edge = [s,t]
 	def set_no_defect(self, d):     self.__no_defect = list(d)
+	def set_sources(self, d):       self.__sources = {name: list(x) for (name, x) in d.items()}
 
 	def get_measured_edge(self): return tuple(self.__edge)
 	def get_no_defect(self):  return list(self.__no_defect)
+	def get_sources(self):    return {name: tuple(x) for (name, x) in self.__sources.items()}
 
 	@classmethod
 	def from_file(cls, path):
@@ -39,7 +51,11 @@ class Config:
 		d = toml.loads(s)
 		measured_edge = tuple(d['general']['measured_edge'])
 		no_defect = list(d['general']['no_defect'])
-		return cls(measured_edge, no_defect)
+		sources = {}
+		for name, source in d.get('sources', {}).items():
+			s, t = source['edge']
+			sources[name] = (s, t, float(source.get('voltage', 1.0)))
+		return cls(measured_edge, no_defect, sources)
 
 	def serialize(self):
 		d = {
@@ -48,5 +64,8 @@ class Config:
 				'no_defect': self.__no_defect,
 			},
 		}
+		if self.__sources:
+			d['sources'] = {name: {'edge': [s,t], 'voltage': voltage}
+				for (name, (s, t, voltage)) in self.__sources.items()}
 		return toml.dumps(d)
 
@@ -73,12 +73,21 @@ def main():
 	parser.add_argument('--config', '-c', type=str, default=None,
 		help='Path to defect trial config TOML. Default is derived from circuit (BASENAME.defect.toml)')
 
+	parser.add_argument('--solver', type=str, default=TrialRunner.SOLVER_MESH, choices=TrialRunner.SOLVER_MODES,
+		help='Method used to compute currents.  "mesh" (the default) and "mesh-cg" require cyclebasis info;'
+		' "nodal" does not.  "mesh-cg" solves iteratively, and records iteration counts.')
+	parser.add_argument('--cg-tol', type=float, default=None,
+		help='Relative residual tolerance for "--solver mesh-cg".')
+
 	group = parser.add_mutually_exclusive_group()
 	group.add_argument('--cyclebasis-cycles', type=str, default=None,
 		help='Path to cyclebasis file. Default is derived from circuit (BASENAME.cycles)')
 	group.add_argument('--cyclebasis-planar', type=str, default=None,
 		help='Path to planar embedding info, which can be provided in place of a .cycles file for planar graphs.'
 		' Default is BASENAME.planar.gpos.')
+	group.add_argument('--cyclebasis-minimum-weight', action='store_true',
+		help='Generate a minimum weight cyclebasis instead of reading one.  This works for any circuit,'
+		' but can be very slow for large circuits.')
 
 	# output file options
 	parser.add_argument('--output-json', '-o', type=str, default=None,
@@ -124,7 +133,8 @@ def main():
 	config = Config.from_file(args.config)
 
 	g = load_circuit(args.input)
-	cycles = cyclebasis_from_args(g, basename, args)
+	if args.solver != TrialRunner.SOLVER_NODAL:
+		cycles = cyclebasis_from_args(g, basename, args)
 
 	selection_mode = SELECTION_MODES[args.selection_mode]
 	deletion_mode  = DELETION_MODES[args.deletion_mode](strength=args.Dstrength, radius=args.Dradius)
@@ -133,8 +143,13 @@ def main():
 	runner = TrialRunner()
 	runner.set_initial_circuit(g)
 	runner.set_initial_choices(set(g) - set(config.get_no_defect()))
-	runner.set_initial_cycles(cycles)
+	runner.set_solver_mode(args.solver)
+	if args.solver != TrialRunner.SOLVER_NODAL:
+		runner.set_initial_cycles(cycles)
+	if args.cg_tol is not None:
+		runner.set_cg_tolerance(args.cg_tol)
 	runner.set_measured_edge(*config.get_measured_edge())
+	runner.set_sources(config.get_sources())
 	runner.set_selection_mode(selection_mode)
 	runner.set_deletion_mode(deletion_mode)
 	if args.steps is not None:
@@ -173,6 +188,9 @@ def main():
 
 	info['selection_mode'] = selection_mode.info()
 	info['defect_mode'] = deletion_mode.info()
+	info['solver'] = args.solver
+	info['sources'] = {name: {'edge': [s,t], 'voltage': voltage}
+		for (name, (s, t, voltage)) in config.get_sources().items()}
 
 	info['process_count'] = args.jobs
 	info['profiling_enabled'] = (args.output_pstats is not None)
@@ -190,7 +208,7 @@ def main():
 
 def cyclebasis_from_args(g, basename, args):
 	# The order to check is
-	# User Cycles --> User Planar --> Auto Cycles --> Auto Planar --> "Nothing found"
+	# User Cycles --> User Planar --> User Minimum weight --> Auto Cycles --> Auto Planar --> "Nothing found"
 	def from_cycles(path): return gcb.from_file(path)
 	def from_planar(path): return gcb.planar.from_gpos(g, path)
 
@@ -202,6 +220,11 @@ def cyclebasis_from_args(g, basename, args):
 			die_if_not_readable(userpath)
 			return constructor(userpath)
 
+	if args.cyclebasis_minimum_weight:
+		if not args.quiet:
+			notice('Generating a minimum weight cyclebasis...')
+		return gcb.minimum_weight(g)
+
 	if not args.quiet:
 		notice('Note: "--cyclebasis-cycles" or "--cyclebasis-planar" not specified. Trying defaults...')
 	for autopath, constructor in [
@@ -213,8 +236,8 @@ def cyclebasis_from_args(g, basename, args):
 				notice('->Found possible cyclebasis info at %r', autopath)
 			die_if_not_readable(autopath)
 			return constructor(autopath)
-	die('Cannot find cyclebasis info. You need a .cycles or .planar.gpos file.\n'
-		'For more info search for "--cyclebasis" in the program help (-h).')
+	die('Cannot find cyclebasis info. You need a .cycles or .planar.gpos file,\n'
+		'or "--cyclebasis-minimum-weight".  For more info search for "--cyclebasis" in the program help (-h).')
 	sys.exit(1)
 
 def die_if_not_readable(path):
@@ -54,7 +54,7 @@ class Deleter(metaclass=ABCMeta):
 	@abstractmethod
 	def delete_one(self, solver, v, cannot_touch):
 		'''
-		Introduce a defect to a ``MeshCurrentSolver``.
+		Introduce a defect to a ``MeshCurrentSolver`` (or ``NodalCurrentSolver``).
 
 		``v`` is the event center.
 
@@ -181,13 +181,13 @@ def from_info(info):
 
 def _neighborhood(obj, v, maxdist, noentry):
 	from networkx import Graph
-	from defect.circuit import MeshCurrentSolver
+	from defect.circuit import MeshCurrentSolver, NodalCurrentSolver
 	''' Get all vertices up to ``maxdist`` edges from ``v``. '''
 	# FIXME faux polymorphism HACK;  also more evidence that it is silly to have MeshCurrentSolver
 	#        provide its own API for inspecting the graph
 	if isinstance(obj, Graph):
 		return _neighborhood_impl(obj.neighbors, v, maxdist, noentry)
-	elif isinstance(obj, MeshCurrentSolver):
+	elif isinstance(obj, (MeshCurrentSolver, NodalCurrentSolver)):
 		return _neighborhood_impl(obj.node_neighbors, v, maxdist, noentry)
 
 def _neighborhood_impl(nbrfunc, v, maxdist, noentry):
@@ -1,11 +1,13 @@
 
 from defect.trial.node_deletion import *
 from defect.trial.node_selection import *
-from defect.circuit import load_circuit, MeshCurrentSolver
+from defect.circuit import load_circuit, MeshCurrentSolver, NodalCurrentSolver, PreconditionedCGSolver
 
 import defect.graph.cyclebasis
 
+import copy
 import time
+from collections import OrderedDict
 
 class TrialRunner:
 	'''
@@ -27,17 +29,26 @@ class TrialRunner:
 	CHOICES_ALL = None
 	NOT_SET = None
 
+	# Values for ``set_solver_mode``
+	SOLVER_MESH    = 'mesh'    # MeshCurrentSolver; requires initial cycles
+	SOLVER_MESH_CG = 'mesh-cg' # MeshCurrentSolver with an iterative solve (records iterations)
+	SOLVER_NODAL   = 'nodal'   # NodalCurrentSolver
+	SOLVER_MODES = (SOLVER_MESH, SOLVER_MESH_CG, SOLVER_NODAL)
+
 	def __init__(self):
 		# Defaults
 		self.__selection_mode = uniform()
 		self.__deletion_mode  = self.NOT_SET
 		# here we store the class so we can generate fresh instances (cbupdater is stateful)
 		self.__cbupdater_cls  = defect.graph.cyclebasis.builder_cbupdater
+		self.__solver_mode    = self.SOLVER_MESH
+		self.__cg_tolerance   = PreconditionedCGSolver.DEFAULT_TOL
 
 		self.set_initial_choices(self.CHOICES_ALL)
 		self.__initial_circuit = self.NOT_SET
 		self.__initial_cycles  = self.NOT_SET
 		self.__measured_edge   = self.NOT_SET
+		self.__sources         = {}
 
 		self.set_end_on_disconnect(True)
 		self.set_defects_per_step(1)
@@ -53,12 +64,27 @@ class TrialRunner:
 	def set_measured_edge(self, s, t):
 		self.__measured_edge = (s, t)
 
+	# Additional voltage sources, as a dict of ``name: (s, t, voltage)``.
+	# The current through each one's own edge, under that source alone, is recorded each
+	#  step in ``source_currents``.  (see ``MeshCurrentSolver``)
+	def set_sources(self, sources):
+		self.__sources = {name: tuple(x) for (name, x) in sources.items()}
+
 	# FIXME take string modes and kw args
 	def set_selection_mode(self, obj):
 		self.__selection_mode = obj
 	def set_deletion_mode(self, obj):
 		self.__deletion_mode = obj
 
+	def set_solver_mode(self, mode):
+		if mode not in self.SOLVER_MODES:
+			raise ValueError('unknown solver mode: {}'.format(repr(mode)))
+		self.__solver_mode = mode
+
+	def set_cg_tolerance(self, tol):
+		assert tol > 0.
+		self.__cg_tolerance = tol
+
 	def set_end_on_disconnect(self, val):
 		assert isinstance(val, bool)
 		self.__end_on_disconnect = val
@@ -91,14 +117,19 @@ class TrialRunner:
 	# Running the trial
 
 	def _validate_ready(self):
-		for (var, name) in [
+		required = [
 			(self.__initial_circuit, 'initial circuit'),
-			(self.__initial_cycles, 'initial cycles'),
 			(self.__measured_edge, 'measured edge'),
 			(self.__deletion_mode, 'deletion mode'),
 			(self.__selection_mode, 'selection mode'),
-			(self.__cbupdater_cls, 'cyclebasis updater class'),
-		]:
+		]
+		if self.__solver_mode in (self.SOLVER_MESH, self.SOLVER_MESH_CG):
+			required += [
+				(self.__initial_cycles, 'initial cycles'),
+				(self.__cbupdater_cls, 'cyclebasis updater class'),
+			]
+
+		for (var, name) in required:
 			if var == self.NOT_SET:
 				raise RuntimeError('{} is not set'.format(name))
 
@@ -106,6 +137,17 @@ class TrialRunner:
 			if v not in self.__initial_circuit:
 				raise RuntimeError('Measured edge contains node {} not in graph!'.format(repr(v)))
 
+		for name, (s, t, _) in self.__sources.items():
+			if not self.__initial_circuit.has_edge(s, t):
+				raise RuntimeError('Source {} is not an edge in the graph!'.format(repr(name)))
+
+	# Vertices that must never be touched by a defect.
+	def _battery_nodes(self):
+		result = set(self.__measured_edge)
+		for (s, t, _) in self.__sources.values():
+			result.update([s, t])
+		return result
+
 	# This method does NOT mutate any members of TrialRunner.
 	# It runs a full trial from scratch.
 	def run_trial(self, verbose=False):
@@ -116,7 +158,84 @@ class TrialRunner:
 		# Initial graph is given directly to some object's constructors
 		#  (the expectation being that they'll make a copy if they plan to modify it)
 		g = self.__initial_circuit
+		choices = self._initial_choice_set()
 
+		result = {}
+		result['graph'] = self._graph_info(g, choices)
+		result['steps'] = self._run_trial_steps(
+			verbose=verbose,
+			solver=self._make_solver(g),
+			deleter=self.__deletion_mode.deleter(g),
+			selector=self.__selection_mode.selector(g),
+			choice_set=choices,
+		)
+		return result
+
+	# This method does NOT mutate any members of TrialRunner.
+	# It runs one trial for each of several fixed deletion orders (flat sequences of
+	#  vertices, as taken by ``fixed_order``) and returns a list of their results.  Each
+	#  result is the same as what ``run_trial`` produces with ``fixed_order(order)`` as
+	#  the selection mode.  (the runner's own selection mode is ignored)
+	#
+	# The orders are arranged into a prefix tree with one level per step, and each step
+	#  is run only once no matter how many orders share it.  Where orders diverge, the
+	#  state of the trial is forked (see ``MeshCurrentSolver.fork``) rather than rebuilt
+	#  by replaying the prefix.  The deleter is shared by every branch, so it must not
+	#  carry state from one defect to the next (none of the provided deletion modes do).
+	def run_trial_tree(self, orders, verbose=False):
+		self._validate_ready()
+
+		g = self.__initial_circuit
+		choices = self._initial_choice_set()
+		graph_info = self._graph_info(g, choices)
+		deleter = self.__deletion_mode.deleter(g)
+
+		# each order split into the defects of each step
+		n = self.__substeps
+		orders = [list(order) for order in orders]
+		chunks = [[order[i:i+n] for i in range(0, len(order), n)] for order in orders]
+
+		results = [None] * len(orders)
+		root = _TrialState(self._make_solver(g), None, choices, self._new_step_info())
+
+		# Each entry is a state that is about to run step ``depth`` (of defects ``chunk``)
+		#  for the orders in ``members``.  A branch that must fork from its parent is always
+		#  popped before the branch that takes over the parent's state, so that the parent
+		#  is still intact when the fork is made.  (this also limits the number of states
+		#  alive at once to one per branch point on the current path)
+		stack = [(root, 0, list(range(len(orders))), None, False)]
+		while stack:
+			state, depth, members, chunk, needs_fork = stack.pop()
+			if needs_fork:
+				state = state.fork()
+			if chunk is not None:
+				state.selector = fixed_order(chunk).selector(g)
+
+			self._run_trial_step(state, depth, deleter, verbose=verbose)
+
+			# Orders that stop here get a snapshot; the others continue by their next step.
+			branches = OrderedDict()
+			if (self._trial_is_stuck(state)
+				or (self.__steps is not self.STEPS_UNLIMITED and depth >= self.__steps)
+			):
+				finished = members
+			else:
+				finished = [k for k in members if len(chunks[k]) == depth]
+				for k in members:
+					if len(chunks[k]) > depth:
+						branches.setdefault(tuple(chunks[k][depth]), []).append(k)
+
+			for k in finished:
+				results[k] = {'graph': dict(graph_info), 'steps': copy.deepcopy(state.step_info)}
+
+			branches = list(branches.items())
+			for i, (chunk, branch_members) in enumerate(branches):
+				# the first pushed is the last popped; it may take over the state
+				stack.append((state, depth + 1, branch_members, list(chunk), i > 0))
+
+		return results
+
+	def _initial_choice_set(self):
 		if self.__initial_choices is self.CHOICES_ALL:
 			choices = set(self.__initial_circuit)
 		else:
@@ -125,35 +244,39 @@ class TrialRunner:
 		# battery vertices can never have defects
 		for v in self.__measured_edge:
 			choices.remove(v)
+		for (s, t, _) in self.__sources.values():
+			choices -= set([s, t])
+		return choices
 
-		result = {}
-		result['graph'] = {
+	def _graph_info(self, g, choices):
+		return {
 			'num_deletable': len(choices),
 			'num_vertices': g.number_of_nodes(),
 			'num_edges': g.number_of_edges(),
 		}
-		result['steps'] = self._run_trial_steps(
-			verbose=verbose,
-			solver=MeshCurrentSolver(g, self.__initial_cycles, self.__cbupdater_cls()),
-			deleter=self.__deletion_mode.deleter(g),
-			selector=self.__selection_mode.selector(g),
-			choice_set=choices,
-		)
-		return result
 
-	# This method does NOT mutate any members of TrialRunner.
-	# Any mutable arguments passed to this method are consumed; do not reuse them.
-	def _run_trial_steps(self, verbose=False, *, solver, deleter, selector, choice_set):
+	def _make_solver(self, g):
+		if self.__solver_mode == self.SOLVER_NODAL:
+			return NodalCurrentSolver(g, sources=self.__sources)
+		elif self.__solver_mode == self.SOLVER_MESH_CG:
+			return MeshCurrentSolver(g, self.__initial_cycles, self.__cbupdater_cls(),
+				method=MeshCurrentSolver.METHOD_CG, cg_options={'tol': self.__cg_tolerance},
+				sources=self.__sources)
+		else:
+			return MeshCurrentSolver(g, self.__initial_cycles, self.__cbupdater_cls(), sources=self.__sources)
 
-		# output
+	def _new_step_info(self):
 		step_info = {'runtime':[], 'current':[], 'deleted':[]}
+		if self.__solver_mode == self.SOLVER_MESH_CG:
+			step_info['iterations'] = []
+		if self.__sources:
+			step_info['source_currents'] = {name: [] for name in self.__sources}
+		return step_info
 
-		max_defects = len(choice_set)
-
-		def trial_should_end():
-			return (len(choice_set) == 0 # no defects possible
-				or selector.is_done() # e.g. a replay ended
-				or (self.__end_on_disconnect and current == 0.))
+	# This method does NOT mutate any members of TrialRunner.
+	# Any mutable arguments passed to this method are consumed; do not reuse them.
+	def _run_trial_steps(self, verbose=False, *, solver, deleter, selector, choice_set):
+		state = _TrialState(solver, selector, choice_set, self._new_step_info())
 
 		if self.__steps is self.STEPS_UNLIMITED:
 			stepiter = unlimited_range()
@@ -163,39 +286,93 @@ class TrialRunner:
 			stepiter = range(self.__steps + 1)
 
 		for step in stepiter:
-			t = time.time()
-
-			# introduce defects
-			defects = []
-			if step > 0:  # first step is initial state
-
-				if trial_should_end():
-					break  # we're done, period (the final step has already been recorded)
-
-				# Each substep introduces a defect.
-				for _ in range(self.__substeps):
-					if trial_should_end():
-						break  # stop adding defects (but do record this final step)
-
-					vcenter = selector.select_one(choice_set)
-					choice_set.remove(vcenter)
-					defects.append(vcenter)
-
-					deleter.delete_one(solver, vcenter, cannot_touch=self.__measured_edge)
-
+			if not self._run_trial_step(state, step, deleter, verbose=verbose):
+				break  # we're done, period (the final step has already been recorded)
+
+		return state.step_info
+
+	# True when no further defects can be introduced, regardless of the selector.
+	def _trial_is_stuck(self, state):
+		return (len(state.choice_set) == 0 # no defects possible
+			or (self.__end_on_disconnect and state.disconnected))
+
+	def _trial_should_end(self, state):
+		return (self._trial_is_stuck(state)
+			or state.selector.is_done()) # e.g. a replay ended
+
+	# Runs a single step of a trial, updating ``state``.
+	# Returns False (and does nothing) if the trial has already ended.
+	def _run_trial_step(self, state, step, deleter, verbose=False):
+		solver = state.solver
+		t = time.time()
+
+		# introduce defects
+		defects = []
+		if step > 0:  # first step is initial state
+
+			if self._trial_should_end(state):
+				return False
+
+			# Each substep introduces a defect.
+			for _ in range(self.__substeps):
+				if self._trial_should_end(state):
+					break  # stop adding defects (but do record this final step)
+
+				vcenter = state.selector.select_one(state.choice_set)
+				state.choice_set.remove(vcenter)
+				defects.append(vcenter)
+
+				deleter.delete_one(solver, vcenter, cannot_touch=self._battery_nodes())
+
+		# Once the battery is no longer part of any cycle, the current is exactly zero
+		#  and the solve can be skipped.  (the solver also avoids solving again when
+		#  nothing has changed in the part of the circuit that carries current)
+		state.disconnected = disconnected = not solver.has_alternate_path(*self.__measured_edge)
+		if disconnected:
+			current = 0.
+		else:
 			# the big heavy calculation!
 			current = solver.get_current(*self.__measured_edge)
 
-			runtime = time.time() - t
-
-			step_info['runtime'].append(runtime)
-			step_info['current'].append(current)
-			step_info['deleted'].append(defects)
-
-			if verbose:
-				notice('step: %s   time: %s   current: %s', step, runtime, current)
-
-		return step_info
+		# every named source is solved at once, sharing the work done above
+		source_currents = {}
+		for name, (a, b, _) in self.__sources.items():
+			if solver.has_alternate_path(a, b):
+				source_currents[name] = solver.get_source_current(name, a, b)
+			else:
+				source_currents[name] = 0.
+
+		runtime = time.time() - t
+
+		step_info = state.step_info
+		step_info['runtime'].append(runtime)
+		step_info['current'].append(current)
+		step_info['deleted'].append(defects)
+		if 'iterations' in step_info:
+			step_info['iterations'].append(0 if disconnected else solver.last_iteration_count())
+		for name, x in source_currents.items():
+			step_info['source_currents'][name].append(x)
+
+		if verbose:
+			notice('step: %s   time: %s   current: %s', step, runtime, current)
+
+		return True
+
+# The mutable parts of a trial in progress.
+class _TrialState:
+	def __init__(self, solver, selector, choice_set, step_info):
+		self.solver = solver
+		self.selector = selector
+		self.choice_set = choice_set
+		self.step_info = step_info
+		self.disconnected = False
+
+	# An independent copy for exploring another branch.  The selector is not copied;
+	#  the new branch is expected to be given its own.
+	def fork(self):
+		result = _TrialState(self.solver.fork(), self.selector, set(self.choice_set), copy.deepcopy(self.step_info))
+		result.disconnected = self.disconnected
+		return result
 
 def unlimited_range(start=0, step=1):
 	i = start
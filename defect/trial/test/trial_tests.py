@@ -240,6 +240,83 @@ class TrialTests(unittest.TestCase):
 		self.runner.set_end_on_disconnect(True)
 		self.do_it()
 
+	def test_remove_nodal(self):
+		# tests consistency of results between solvers
+		self.set_input('square10', 'square10.planar.gpos')
+		self.set_order('square10-general.order')
+		self.set_output('square10-rem-disconnect.output')
+		self.runner.set_deletion_mode(
+			node_deletion.annihilation(radius=1)
+		)
+		self.runner.set_solver_mode(TrialRunner.SOLVER_NODAL)
+		self.runner.set_end_on_disconnect(True)
+		self.do_it()
+
+	def test_multiply_cg(self):
+		# tests consistency of results between linear solve methods
+		self.set_input('square10', 'square10.planar.gpos')
+		self.set_order('square10-general.order')
+		self.set_output('square10-m100.output')
+		self.runner.set_deletion_mode(
+			node_deletion.multiply_resistance(factor=100., idempotent=False, radius=1)
+		)
+		self.runner.set_solver_mode(TrialRunner.SOLVER_MESH_CG)
+		self.runner.set_cg_tolerance(1e-12)
+		self.do_it()
+
+	def test_sources(self):
+		# a named source identical to the battery must reproduce the measured current
+		from defect.circuit import load_circuit, EATTR_VOLTAGE, circuit_edge_sign
+		self.set_input('square10', 'square10.planar.gpos')
+		self.set_order('square10-general.order')
+		self.set_output('square10-rem-disconnect.output')
+		self.runner.set_deletion_mode(
+			node_deletion.annihilation(radius=1)
+		)
+
+		g = load_circuit(RESOURCE('square10.circuit'))
+		s, t = Config.from_file(RESOURCE('square10.defect.toml')).get_measured_edge()
+		voltage = circuit_edge_sign(g, s, t) * g.edge[s][t][EATTR_VOLTAGE]
+		self.runner.set_sources({'copy': (s, t, voltage)})
+
+		steps = self.runner.run_trial()['steps']
+		self.assertEqual(len(steps['source_currents']['copy']), len(steps['current']))
+		for expected, actual in zip(steps['current'], steps['source_currents']['copy']):
+			self.assertAlmostEqual(expected, actual, delta=1e-7 * abs(expected))
+		self.do_it()
+
+	def test_tree(self):
+		# orders explored together as a prefix tree must match separate replays
+		import json
+		import random
+		self.set_input('square10', 'square10.planar.gpos')
+		self.runner.set_deletion_mode(
+			node_deletion.annihilation(radius=1)
+		)
+		self.runner.set_defects_per_step(2)
+		self.runner.set_end_on_disconnect(False)
+
+		with open(RESOURCE('square10-general.order')) as f:
+			base = list(flat(json.load(f)))
+		rng = random.Random(0)
+		orders = [base, base[:7], base[:30]]
+		for i in (5, 6, 20, 20):
+			tail = base[i:]
+			rng.shuffle(tail)
+			orders.append(base[:i] + tail)
+
+		results = self.runner.run_trial_tree(orders)
+		self.assertEqual(len(results), len(orders))
+		for order, result in zip(orders, results):
+			self.runner.set_selection_mode(node_selection.fixed_order(order))
+			expected = self.runner.run_trial()
+			self.assertEqual(result['graph'], expected['graph'])
+			self.assertEqual(result['steps']['deleted'], expected['steps']['deleted'])
+			self.assertEqual(len(result['steps']['current']), len(expected['steps']['current']))
+			for o, n in zip(expected['steps']['current'], result['steps']['current']):
+				self.assertAlmostEqual(o, n, delta=1e-7 * abs(o))
+		self.test_has_run = True
+
 def flat(it):
 	for x in it:
 		yield from x